@@ -0,0 +1,125 @@
+"""
+Load-test the AI routes offline against the local Perplexity mock.
+
+Starts benchmarks.perplexity_mock in-process, points the app at it and fires
+concurrent requests at /extract-benefits-ai and/or /analyze-with-perplexity
+through the Flask test client. Reports throughput and latency percentiles
+per route, plus what the mock served. The app runs in a temporary working
+directory, so uploads, downloads and caches are thrown away afterwards. The
+response cache is bypassed unless --use-cache is given, so every request
+reaches the mock.
+
+Usage:
+    python -m benchmarks.ai_endpoint_benchmark [--requests 40] [--concurrency 8]
+        [--latency lognormal:0.8,0.4] [--error-rate 0.05] [--route extract-benefits-ai]
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from benchmarks.perplexity_mock import MockPerplexityServer
+
+ROUTES = ['extract-benefits-ai', 'analyze-with-perplexity']
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+def run_route(app, route: str, pdf_bytes: bytes, filename: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    def call(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        if route == 'extract-benefits-ai':
+            response = client.post(f'/{route}', data={'pdf_file': (io.BytesIO(pdf_bytes), filename)},
+                                   content_type='multipart/form-data')
+        else:
+            response = client.post(f'/{route}', json={'filename': filename, 'query': "Summarize the key benefits"})
+        payload = response.get_json() or {}
+        ai_used = payload.get('sources', {}).get('ai') == 'used' if route == 'extract-benefits-ai' \
+            else 'error' not in payload.get('analysis', {})
+        return time.perf_counter() - start, bool(payload.get('success')) and ai_used
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    return {
+        'requests': requests,
+        'ai_ok': sum(1 for _, ok in results if ok),
+        'throughput': requests / elapsed,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'max': max(latencies)
+    }
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--route', choices=ROUTES + ['all'], default='all')
+    parser.add_argument('--requests', type=int, default=40, help="Requests per route")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+    parser.add_argument('--latency', default='lognormal:0.8,0.4', help="Mock latency distribution spec")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of mock responses that are 5xx")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of mock responses that are 429")
+    parser.add_argument('--pdf', default=os.path.join('attached_assets', 'CNDK_BENEFIT_SUMMARY.pdf'))
+    parser.add_argument('--use-cache', action='store_true', help="Keep the Perplexity response cache enabled")
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help="App-wide Perplexity requests per minute (0, the default, measures the mock unpaced)")
+    args = parser.parse_args(argv)
+    pdf_path = os.path.abspath(args.pdf)
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+
+    workdir = tempfile.mkdtemp(prefix='ai_benchmark_')
+    os.chdir(workdir)
+    try:
+        return run(args, pdf_path)
+    finally:
+        os.chdir(repo_root)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run(args, pdf_path: str) -> int:
+    """Run the benchmark from the current (temporary) working directory."""
+    with MockPerplexityServer(latency=args.latency, error_rate=args.error_rate,
+                              throttle_rate=args.throttle_rate) as mock:
+        # The shared client reads these when it is first created
+        os.environ['PERPLEXITY_API_URL'] = mock.url
+        os.environ['PERPLEXITY_API_KEY'] = 'mock'
+        os.environ['AI_RATE_LIMIT_RPM'] = str(args.rate_limit)
+
+        import main as app_module
+        logging.getLogger().setLevel(logging.WARNING)
+        if not args.use_cache:
+            app_module.response_cache = None
+
+        filename = os.path.basename(pdf_path)
+        shutil.copy2(pdf_path, os.path.join(app_module.app.config['UPLOAD_FOLDER'], filename))
+        with open(pdf_path, 'rb') as f:
+            pdf_bytes = f.read()
+
+        # Parse once up front so the runs measure the AI path, not the first PDF parse
+        run_route(app_module.app, 'extract-benefits-ai', pdf_bytes, filename, 1, 1)
+
+        routes = ROUTES if args.route == 'all' else [args.route]
+        failed = False
+        for route in routes:
+            result = run_route(app_module.app, route, pdf_bytes, filename, args.requests, args.concurrency)
+            failed = failed or result['ai_ok'] == 0
+            print(f"{route:26s} {result['requests']:4d} req  {result['ai_ok']:4d} AI ok  "
+                  f"{result['throughput']:6.2f} req/s  p50 {result['p50']:.2f}s  p95 {result['p95']:.2f}s  "
+                  f"p99 {result['p99']:.2f}s  max {result['max']:.2f}s")
+        print(f"mock served: {dict(mock.stats)}")
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
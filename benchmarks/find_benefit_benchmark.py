@@ -0,0 +1,93 @@
+"""
+Benchmark find_benefit / find_percentage on adversarial 1-5 MB texts.
+
+Each generator produces text where the fallback keywords appear many times
+but amounts are missing or far away - the inputs that made the old
+'(?:.*?)keyword(.*?)amount' DOTALL patterns scan quadratically. The run fails
+if time per MB grows with the input size.
+
+Usage:
+    python -m benchmarks.find_benefit_benchmark [--sizes 1 2 3 4 5] [--max-ratio 2.5]
+"""
+import sys
+import time
+import argparse
+from typing import Callable, Dict, List
+
+from utils.benefit_extractor import find_benefit, find_percentage
+
+MB = 1024 * 1024
+
+def keywords_without_amounts(size: int) -> str:
+    """Keywords everywhere, no amount anywhere."""
+    chunk = "individual deductible applies to covered services in network coinsurance "
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+def amount_at_the_end(size: int) -> str:
+    """Keywords everywhere, a single amount after the last byte of filler."""
+    text = keywords_without_amounts(size - 16)
+    return text + " family $1,500 20%"
+
+def near_miss_amounts(size: int) -> str:
+    """Dollar signs and digits without a valid amount shape next to keywords."""
+    chunk = "specialist $ , . 12 primary care % $, emergency room pcp "
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+def long_prose(size: int) -> str:
+    """Legal prose with a keyword once at the start and nothing after it."""
+    chunk = "the plan administrator may amend these terms at any time without notice "
+    return "inpatient " + (chunk * (size // len(chunk) + 1))[:size]
+
+GENERATORS: Dict[str, Callable[[int], str]] = {
+    'keywords_without_amounts': keywords_without_amounts,
+    'amount_at_the_end': amount_at_the_end,
+    'near_miss_amounts': near_miss_amounts,
+    'long_prose': long_prose,
+}
+
+def run_fallback_extraction(text: str):
+    """The same calls simple_extract_benefit_information makes in main.py."""
+    find_benefit(text, ["individual deductible", "deductible individual"])
+    find_benefit(text, ["family deductible", "deductible family"])
+    find_benefit(text, ["individual out-of-pocket", "out-of-pocket individual"])
+    find_benefit(text, ["family out-of-pocket", "out-of-pocket family"])
+    find_percentage(text, ["coinsurance", "co-insurance"])
+    find_benefit(text, ["primary care", "pcp"])
+    find_benefit(text, ["specialist", "specialty care"])
+    find_benefit(text, ["urgent care"])
+    find_benefit(text, ["emergency room", "emergency department", "er visit"])
+    find_benefit(text, ["inpatient", "hospital", "hospitalization"])
+
+def time_per_mb(text: str, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run_fallback_extraction(text)
+        best = min(best, time.perf_counter() - start)
+    return best / (len(text) / MB)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 3, 4, 5], help="Text sizes in MB")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per size; the fastest is kept")
+    parser.add_argument('--max-ratio', type=float, default=2.5,
+                        help="Fail if seconds/MB at the largest size exceeds this multiple of the smallest")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, generate in GENERATORS.items():
+        rates = []
+        for size in args.sizes:
+            rate = time_per_mb(generate(size * MB), args.repeats)
+            rates.append(rate)
+            print(f"{name:26s} {size:3d} MB  {rate * 1000:8.1f} ms/MB")
+
+        ratio = rates[-1] / rates[0] if rates[0] else 1.0
+        linear = ratio <= args.max_ratio
+        failed = failed or not linear
+        print(f"{name:26s} scaling ratio {ratio:.2f} -> {'linear' if linear else 'NON-LINEAR'}\n")
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Local stand-in for the Perplexity chat completions API.
+
+Serves POST /chat/completions with the same request and response shape as
+https://api.perplexity.ai, answering with canned benefit JSON after a
+configurable latency, and failing a configurable share of requests with
+5xx or 429 responses. Requests with "stream": true get the content as
+server-sent events: the sampled latency is the time to the first chunk, and
+the rest follows every --stream-interval seconds. GET /stats reports what
+was served. Point the app at it with PERPLEXITY_API_URL:
+
+    python -m benchmarks.perplexity_mock --port 8787 --latency lognormal:0.8,0.4 --error-rate 0.02
+    PERPLEXITY_API_URL=http://127.0.0.1:8787 PERPLEXITY_API_KEY=mock python main.py
+
+Latency distributions (seconds):
+    fixed:S             always S
+    uniform:LO,HI       uniform between LO and HI
+    normal:MEAN,SD      normal, clamped at 0
+    lognormal:MEDIAN,SIGMA
+                        log-normal with the given median; a long right tail like real APIs
+"""
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Any, Optional
+
+# Benefits returned when no payload file is given, in the mass upload prompt's format
+SAMPLE_BENEFITS = {
+    "carrier_name": "Mock Health",
+    "plan_name": "Mock PPO 1500",
+    "deductible": {
+        "individual_in_network": "1500",
+        "family_in_network": "3000",
+        "individual_out_network": "3000",
+        "family_out_network": "6000"
+    },
+    "coinsurance": {"in_network": "20", "out_network": "40"},
+    "out_of_pocket": {
+        "individual_in_network": "5000",
+        "family_in_network": "10000",
+        "individual_out_network": "10000",
+        "family_out_network": "20000"
+    },
+    "office_visits": {"primary_care": "$25", "specialist": "$50", "urgent_care": "$75"},
+    "emergency_room": "$250",
+    "preventive_services": {"in_network": "0%", "out_network": "40% after deductible"},
+    "outpatient_surgery": "20% after deductible",
+    "hospitalization": "20% after deductible",
+    "imaging": "Freestanding: $100 / Hospital: 20% after deductible",
+    "prescription": {
+        "deductible": None,
+        "tier_1": "$10",
+        "tier_2": "$35",
+        "tier_3": "$70",
+        "tier_4": "20%",
+        "tier_5": None,
+        "mail_order": "$20 / $70 / $140"
+    },
+    "network_type": "PPO",
+    "network_name": "Mock Choice Plus",
+    "deductible_type": "Embedded",
+    "member_website": "www.mockhealth.example",
+    "customer_service": "1-800-555-0100"
+}
+
+ERROR_STATUSES = [500, 502, 503]
+
+# Content fragments per streamed response
+STREAM_CHUNKS = 20
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Turn a 'kind:params' latency spec into a sampler returning seconds."""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal' and len(values) == 2:
+        return lambda: max(random.gauss(values[0], values[1]), 0.0)
+    if kind == 'lognormal' and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+class MockPerplexityServer:
+    """
+    Threaded HTTP server implementing the chat completions contract.
+
+    payloads are the JSON objects returned as message content, cycled
+    through in order. error_rate and throttle_rate are the shares of
+    requests answered with a 5xx or a 429; rate_limit additionally answers
+    429 to every request beyond that many in any 60 seconds. stream_interval
+    is the delay between chunks of a streamed response.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: str = 'fixed:0',
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, rate_limit: int = 0,
+                 payloads: Optional[List[Dict[str, Any]]] = None, stream_interval: float = 0.02):
+        self.sample_latency = parse_latency(latency)
+        self.stream_interval = stream_interval
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.payloads = payloads or [SAMPLE_BENEFITS]
+        self.stats = collections.Counter()
+        self.accepted = collections.deque()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockPerplexityServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockPerplexityServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _outcome(self) -> int:
+        """Pick the status for the next request and record it."""
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            if self.rate_limit:
+                while self.accepted and now - self.accepted[0] >= 60:
+                    self.accepted.popleft()
+                if len(self.accepted) >= self.rate_limit:
+                    self.stats['429'] += 1
+                    return 429
+            roll = random.random()
+            if roll < self.error_rate:
+                status = random.choice(ERROR_STATUSES)
+            elif roll < self.error_rate + self.throttle_rate:
+                status = 429
+            else:
+                status = 200
+                if self.rate_limit:
+                    self.accepted.append(now)
+            self.stats[str(status)] += 1
+            return status
+
+    def _completion(self, model: str) -> Dict[str, Any]:
+        with self._lock:
+            payload = self.payloads[self.stats['200'] % len(self.payloads)]
+        content = json.dumps(payload)
+        return {
+            "id": f"mock-{random.getrandbits(64):016x}",
+            "model": model,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "citations": [],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // 4, "total_tokens": len(content) // 4}
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, completion: Dict[str, Any]):
+                content = completion["choices"][0]["message"]["content"]
+                size = max(len(content) // STREAM_CHUNKS, 1)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                for start in range(0, len(content), size):
+                    chunk = {
+                        "id": completion["id"],
+                        "model": completion["model"],
+                        "object": "chat.completion.chunk",
+                        "created": completion["created"],
+                        "citations": completion["citations"],
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop" if start + size >= len(content) else None,
+                            "delta": {"role": "assistant", "content": content[start:start + size]}
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(server.stream_interval)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def do_GET(self):
+                if self.path.rstrip('/') != '/stats':
+                    return self._send(404, {"error": {"message": "Not found"}})
+                with server._lock:
+                    stats = dict(server.stats)
+                self._send(200, stats)
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/chat/completions':
+                    return self._send(404, {"error": {"message": "Not found"}})
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except ValueError:
+                    return self._send(400, {"error": {"message": "Invalid JSON body"}})
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self._send(401, {"error": {"message": "Missing API key"}})
+                if not isinstance(request.get('messages'), list) or not request.get('model'):
+                    return self._send(400, {"error": {"message": "model and messages are required"}})
+
+                time.sleep(server.sample_latency())
+                status = server._outcome()
+                if status == 429:
+                    return self._send(429, {"error": {"message": "Rate limit exceeded"}}, {'Retry-After': '1'})
+                if status != 200:
+                    return self._send(status, {"error": {"message": "Mock server error"}})
+                if request.get('stream'):
+                    return self._send_stream(server._completion(request['model']))
+                self._send(200, server._completion(request['model']))
+
+        return Handler
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', default='lognormal:0.8,0.4', help="Latency distribution spec")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 5xx")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument('--rate-limit', type=int, default=0, help="Requests accepted per minute (0 for no limit)")
+    parser.add_argument('--stream-interval', type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument('--payload', action='append', default=[],
+                        help="JSON file with a benefits object to return; repeat to cycle through several")
+    args = parser.parse_args(argv)
+
+    payloads = []
+    for path in args.payload:
+        with open(path) as f:
+            payloads.append(json.load(f))
+
+    server = MockPerplexityServer(args.host, args.port, args.latency, args.error_rate, args.throttle_rate,
+                                  args.rate_limit, payloads, args.stream_interval)
+    print(f"Mock Perplexity API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,34 @@
 import os
 import json
+import time
 import tempfile
 import logging
 import uuid
 import io
 import requests
 import shutil
+import zipfile
 import pandas as pd
 from datetime import datetime
 from typing import Dict, List, Any, Tuple
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session, redirect, url_for, Response, stream_with_context
 from werkzeug.utils import secure_filename
 
 # Import utility modules
 from utils.api_keys import load_api_keys, save_api_key, delete_api_key
-from utils.perplexity_api import analyze_text_with_perplexity
+from utils.perplexity_api import analyze_text_with_perplexity, stream_text_with_perplexity, set_rate_limit
 from utils.pdf_processor import PDFProcessor
 from utils.benefit_extractor import BenefitExtractor, find_benefit, find_percentage, create_benefit_excel
 from utils.mass_upload_formatter import format_benefit_excel
+from utils.extraction_cache import ExtractionCache, ResponseCache
+from utils.template_cache import TemplateCache
+from utils.benefit_export import export_plans, EXPORT_FORMATS, FILE_EXTENSIONS
+from utils.batch_extractor import save_batch_files, extract_plans
+from utils.mass_upload_formatter import format_benefits_workbook
+from utils.job_queue import JobStore, JobQueue
+from utils.ai_batch import extract_plans_ai
+from utils.section_retrieval import BENEFIT_FIELD_QUERIES
+from utils.ai_extraction import extract_benefits_map_reduce, parse_benefits_json, hedged_extract, set_hedge_workers, escalate_low_confidence, MASS_UPLOAD_PROMPT
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -29,6 +40,7 @@ app.secret_key = os.environ.get("SESSION_SECRET", "pdf-scraper-secret-key")
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 DOWNLOAD_FOLDER = 'downloads'
+CACHE_FOLDER = 'cache'
 ALLOWED_EXTENSIONS = {'pdf'}
 
 # Ensure necessary directories exist
@@ -40,11 +52,103 @@ if not os.path.exists(DOWNLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['DOWNLOAD_FOLDER'] = DOWNLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
+app.config['BATCH_MAX_CONTENT_LENGTH'] = 256 * 1024 * 1024  # 256MB max for batch uploads
 app.config['API_KEYS_FILE'] = 'api_keys.json'
+# Process pool size for page-parallel PDF extraction of long documents (0 disables it)
+app.config['EXTRACTION_WORKERS'] = int(os.environ.get('EXTRACTION_WORKERS', os.cpu_count() or 1))
+# Text engine of text-only extraction: 'both' (pdfplumber text, PyPDF2 alongside) or opt-in 'adaptive',
+# which runs pdfplumber only on pages where PyPDF2 text fails the quality check
+app.config['TEXT_ENGINE'] = os.environ.get('TEXT_ENGINE', 'both')
+app.config['CACHE_FOLDER'] = CACHE_FOLDER
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('EXTRACTION_CACHE_MAX_MB', 512)) * 1024 * 1024
+# Disk cache of Perplexity analyses
+app.config['RESPONSE_CACHE_FOLDER'] = os.path.join(CACHE_FOLDER, 'responses')
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_MB', 64)) * 1024 * 1024
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL_HOURS', 168)) * 3600
+# Characters of best-matching document sections sent with AI extraction prompts
+app.config['AI_CONTEXT_CHARS'] = int(os.environ.get('AI_CONTEXT_CHARS', 12000))
+# Documents with at least this many pages are extracted section by section (map-reduce)
+app.config['AI_MAP_REDUCE_MIN_PAGES'] = int(os.environ.get('AI_MAP_REDUCE_MIN_PAGES', 40))
+# Map-reduce sends at most this many BM25-ranked sections, all at once, so latency stays at
+# about one call (paced by the rate limit) whatever the booklet length
+app.config['AI_MAP_MAX_SECTIONS'] = int(os.environ.get('AI_MAP_MAX_SECTIONS', 8))
+# Upper bound on concurrent section-level Perplexity calls in map-reduce mode
+app.config['AI_MAP_WORKERS'] = int(os.environ.get('AI_MAP_WORKERS', 8))
+# Seconds /extract-benefits-ai waits for the AI before answering with the regex results; the AI
+# calls' rate limiter wait counts against it
+app.config['AI_HEDGE_DEADLINE'] = float(os.environ.get('AI_HEDGE_DEADLINE', 30))
+# AI calls of /extract-benefits-ai requests that may run at once; late calls keep their slot until done
+app.config['AI_HEDGE_WORKERS'] = int(os.environ.get('AI_HEDGE_WORKERS', 8))
+# /extract-benefits with ai_escalation sends fields below this regex confidence to the AI
+app.config['AI_ESCALATION_THRESHOLD'] = float(os.environ.get('AI_ESCALATION_THRESHOLD', 0.5))
+# Perplexity provider rate limit, shared by every AI call and split evenly across the server
+# processes (gunicorn's WEB_CONCURRENCY workers). Each process may send a burst of calls at once,
+# taken out of its share of the steady rate
+app.config['AI_RATE_LIMIT_RPM'] = float(os.environ.get('AI_RATE_LIMIT_RPM', 50))
+# The default burst covers one map-reduce, whose sections all go out at once
+app.config['AI_RATE_LIMIT_BURST'] = int(os.environ.get('AI_RATE_LIMIT_BURST', app.config['AI_MAP_MAX_SECTIONS']))
+app.config['AI_RATE_LIMIT_PROCESSES'] = int(os.environ.get('AI_RATE_LIMIT_PROCESSES', os.environ.get('WEB_CONCURRENCY', 1)))
+# AI batch extraction: maximum documents in flight
+app.config['AI_BATCH_CONCURRENCY'] = int(os.environ.get('AI_BATCH_CONCURRENCY', 8))
+# Persist per-page parse snapshots next to uploads so re-extraction skips PDF parsing
+app.config['PAGE_SNAPSHOTS'] = os.environ.get('PAGE_SNAPSHOTS', 'true').lower() == 'true'
+# Background jobs: SQLite job store and the number of jobs processed at once
+app.config['JOB_DB'] = os.environ.get('JOB_DB', 'jobs.db')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+# Seconds without a heartbeat from its worker process before a job is failed as abandoned
+app.config['JOB_LEASE_SECONDS'] = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+# Parsed Excel templates kept in memory, keyed by file contents
+app.config['TEMPLATE_CACHE_ENTRIES'] = int(os.environ.get('TEMPLATE_CACHE_ENTRIES', 8))
+
+# Content-addressed cache of extraction results shared by all routes
+extraction_cache = ExtractionCache(app.config['CACHE_FOLDER'], max_bytes=app.config['CACHE_MAX_BYTES'])
+
+# Cache of Perplexity responses, keyed by model, query, temperature and document text
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_FOLDER'], max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+                               ttl=app.config['RESPONSE_CACHE_TTL'])
+
+# Uploaded templates are parsed once and cloned for every workbook written from them
+template_cache = TemplateCache(max_entries=app.config['TEMPLATE_CACHE_ENTRIES'])
+
+# One Perplexity rate limit for every AI call this process makes
+set_rate_limit(app.config['AI_RATE_LIMIT_RPM'], app.config['AI_RATE_LIMIT_BURST'],
+               processes=app.config['AI_RATE_LIMIT_PROCESSES'])
+
+# Pool the hedged AI calls run on
+set_hedge_workers(app.config['AI_HEDGE_WORKERS'])
+
+# Background job queue; handlers are registered once the processing functions are defined
+job_queue = JobQueue(JobStore(app.config['JOB_DB']), workers=app.config['JOB_WORKERS'],
+                     lease_seconds=app.config['JOB_LEASE_SECONDS'])
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def wants_async():
+    """True when the client asked for the request to run as a background job."""
+    return request.form.get('async', 'false').lower() == 'true'
+
+def requested_export_format():
+    """Bulk export format asked for with the export_format form field, or None."""
+    return request.form.get('export_format', '').lower() or None
+
+def export_batch(results, export_format):
+    """Write a batch's extracted plans as a CSV/JSONL/Parquet download. Returns the filename."""
+    export_filename = f"batch_plans_{uuid.uuid4().hex[:8]}{FILE_EXTENSIONS[export_format]}"
+    export_plans(results, os.path.join(app.config['DOWNLOAD_FOLDER'], export_filename), export_format)
+    return export_filename
+
+def submit_job(kind, **params):
+    """Queue a background job and return the JSON payload pointing at it."""
+    job_id = job_queue.submit(kind, **params)
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for('job_status', job_id=job_id),
+        "result_url": url_for('job_result', job_id=job_id)
+    }
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -81,6 +185,67 @@ def delete_api_key_route(key_name):
     else:
         return jsonify({"success": False, "error": "Failed to delete API key"})
 
+def process_upload(file_path, filename, use_perplexity=False):
+    """
+    Extract text, tables and metadata from a saved PDF, write the download
+    files, and optionally analyze the text with Perplexity.
+    Returns the JSON payload of the /upload route.
+    """
+    # Process the PDF file using the unified processor
+    try:
+        # Create processor instance
+        processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                 text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
+
+        # Extract all PDF data
+        processor.extract_all()
+
+        # Save extracted text to a file for download
+        text_filename = filename.replace('.pdf', '_extracted.txt')
+        processor.save_text_to_file(os.path.join(app.config['DOWNLOAD_FOLDER'], text_filename))
+
+        # If tables were found, save to Excel
+        if processor.tables:
+            excel_filename = filename.replace('.pdf', '_tables.xlsx')
+            excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+            processor.save_tables_to_excel(excel_path)
+        else:
+            excel_filename = None
+
+        if use_perplexity:
+            api_keys = load_api_keys()
+            perplexity_key = api_keys.get('perplexity')
+
+            if perplexity_key:
+                try:
+                    perplexity_analysis = processor.analyze_with_perplexity(perplexity_key, response_cache=response_cache)
+                except Exception as e:
+                    perplexity_analysis = {"error": f"Perplexity analysis failed: {str(e)}"}
+            else:
+                perplexity_analysis = {"error": "No Perplexity API key found in settings"}
+        else:
+            perplexity_analysis = None
+
+        # Return results as JSON
+        result = processor.to_json()
+        result["perplexity_analysis"] = perplexity_analysis
+        result["text_file"] = text_filename
+
+        if processor.tables:
+            result["excel_file"] = excel_filename
+
+        return {
+            "success": True,
+            "result": result
+        }
+
+    except Exception as e:
+        logger.error(f"Error processing PDF: {str(e)}")
+        return {
+            "success": False,
+            "error": f"Error processing PDF: {str(e)}"
+        }
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
@@ -99,62 +264,14 @@ def upload_file():
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(file_path)
 
-            # Process the PDF file using the unified processor
-            try:
-                # Create processor instance
-                processor = PDFProcessor(file_path)
-
-                # Extract all PDF data
-                processor.extract_all()
-
-                # Save extracted text to a file for download
-                text_filename = filename.replace('.pdf', '_extracted.txt')
-                processor.save_text_to_file(os.path.join(app.config['DOWNLOAD_FOLDER'], text_filename))
-
-                # If tables were found, save to Excel
-                if processor.tables:
-                    excel_filename = filename.replace('.pdf', '_tables.xlsx')
-                    excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
-                    processor.save_tables_to_excel(excel_path)
-                else:
-                    excel_filename = None
-
-                # Check if we should analyze with Perplexity
-                use_perplexity = request.form.get('use_perplexity', 'false').lower() == 'true'
-
-                if use_perplexity:
-                    api_keys = load_api_keys()
-                    perplexity_key = api_keys.get('perplexity')
-
-                    if perplexity_key:
-                        try:
-                            perplexity_analysis = processor.analyze_with_perplexity(perplexity_key)
-                        except Exception as e:
-                            perplexity_analysis = {"error": f"Perplexity analysis failed: {str(e)}"}
-                    else:
-                        perplexity_analysis = {"error": "No Perplexity API key found in settings"}
-                else:
-                    perplexity_analysis = None
-
-                # Return results as JSON
-                result = processor.to_json()
-                result["perplexity_analysis"] = perplexity_analysis
-                result["text_file"] = text_filename
-
-                if processor.tables:
-                    result["excel_file"] = excel_filename
-
-                return jsonify({
-                    "success": True,
-                    "result": result
-                })
-
-            except Exception as e:
-                logger.error(f"Error processing PDF: {str(e)}")
-                return jsonify({
-                    "success": False,
-                    "error": f"Error processing PDF: {str(e)}"
-                })
+            # Check if we should analyze with Perplexity
+            use_perplexity = request.form.get('use_perplexity', 'false').lower() == 'true'
+
+            if wants_async():
+                return jsonify(submit_job('upload', file_path=file_path, filename=filename,
+                                          use_perplexity=use_perplexity))
+
+            return jsonify(process_upload(file_path, filename, use_perplexity))
 
         return jsonify({"success": False, "error": "Invalid file format"})
 
@@ -169,7 +286,8 @@ def view_results(filename):
             return redirect(url_for('index'))
 
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        processor = PDFProcessor(file_path)
+        processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                 text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
 
         # Extract basic info
         result = processor.extract_all()
@@ -212,10 +330,117 @@ def view_results(filename):
 def download_file(filename):
     return send_from_directory(app.config['DOWNLOAD_FOLDER'], filename, as_attachment=True)
 
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify({
+        "extraction": extraction_cache.stats(),
+        "perplexity": response_cache.stats()
+    })
+
 @app.route('/benefit-extraction')
 def benefit_extraction():
     return render_template('benefit_extraction.html')
 
+def process_benefit_extraction(file_path, filename, template_path=None, use_mass_format=False, escalate=False):
+    """
+    Extract benefits from a saved PDF and write the benefits workbook.
+    Returns the JSON payload of the /extract-benefits route.
+
+    With escalate, only the fields the regex extractor is not confident about
+    are sent to Perplexity, together with the text around their anchors.
+    """
+    # Process the PDF file
+    try:
+        # Create extractor
+        extractor = BenefitExtractor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                     snapshot=app.config['PAGE_SNAPSHOTS'])
+        
+        # Extract benefits
+        benefit_info = extractor.extract_benefits()
+        
+        # Resolve low-confidence fields with small targeted AI prompts
+        escalation = None
+        if escalate:
+            perplexity_key = load_api_keys().get('perplexity')
+            if perplexity_key:
+                try:
+                    escalation = escalate_low_confidence(perplexity_key, extractor, benefit_info,
+                                                         threshold=app.config['AI_ESCALATION_THRESHOLD'],
+                                                         cache=response_cache)
+                    benefit_info = escalation["benefits"]
+                except Exception as e:
+                    logger.error(f"AI escalation error: {str(e)}")
+
+        # Create an Excel file with the extracted data
+        if use_mass_format:
+            # Use a more descriptive filename for mass upload format
+            excel_filename = f"{os.path.splitext(filename)[0]}_mass_upload_{uuid.uuid4().hex[:8]}.xlsx"
+        else:
+            excel_filename = f"benefits_{uuid.uuid4().hex[:8]}.xlsx"
+            
+        excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+        
+        # Create Excel with benefits data, in a copy of the template if provided,
+        # using the mass upload formatter for special formatting if enabled
+        if use_mass_format:
+            format_benefit_excel(benefit_info, excel_path, template_path, template_cache)
+        else:
+            create_benefit_excel(benefit_info, excel_path, template_path, template_cache)
+
+        result = {
+            "success": True,
+            "result": benefit_info,
+            "excel_file": excel_filename,
+            "format": "mass_upload_template" if use_mass_format else "standard",
+            "table_stats": extractor.table_stats,
+            "confidence": extractor.confidence
+        }
+        if escalation is not None:
+            result["escalated_fields"] = escalation["escalated"]
+            result["resolved_fields"] = escalation["resolved"]
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error extracting benefits: {str(e)}")
+        # Try simplified extraction as a fallback
+        try:
+            processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                     text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
+            text_content = processor.extract_text()[1]  # Use pdfplumber text
+            
+            # Simple benefit extraction
+            benefit_info = simple_extract_benefit_information(text_content)
+            
+            # Create Excel
+            if use_mass_format:
+                # Use a more descriptive filename for mass upload format
+                excel_filename = f"{os.path.splitext(filename)[0]}_mass_upload_simple_{uuid.uuid4().hex[:8]}.xlsx"
+            else:
+                excel_filename = f"benefits_simple_{uuid.uuid4().hex[:8]}.xlsx"
+                
+            excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+            
+            # Create Excel with benefits data, in a copy of the template if provided,
+            # using the mass upload formatter for special formatting if enabled
+            if use_mass_format:
+                format_benefit_excel(benefit_info, excel_path, template_path, template_cache)
+            else:
+                create_benefit_excel(benefit_info, excel_path, template_path, template_cache)
+            
+            return {
+                "success": True,
+                "result": benefit_info,
+                "excel_file": excel_filename,
+                "warning": "Used simplified extraction due to error in primary extraction."
+            }
+            
+        except Exception as inner_e:
+            logger.error(f"Error in simplified extraction: {str(inner_e)}")
+            return {
+                "success": False,
+                "error": f"Failed to extract benefits: {str(e)}"
+            }
+
 @app.route('/extract-benefits', methods=['POST'])
 def extract_benefits():
     try:
@@ -226,6 +451,7 @@ def extract_benefits():
         file = request.files['pdf_file']
         template_file = request.files['template_file'] if 'template_file' in request.files else None
         use_mass_format = request.form.get('use_mass_format', 'false').lower() == 'true'
+        escalate = request.form.get('ai_escalation', 'false').lower() == 'true'
 
         # If user does not select file, browser also submits an empty part without filename
         if file.filename == '':
@@ -243,84 +469,12 @@ def extract_benefits():
                 template_path = os.path.join(app.config['UPLOAD_FOLDER'], template_filename)
                 template_file.save(template_path)
 
-            # Process the PDF file
-            try:
-                # Create extractor
-                extractor = BenefitExtractor(file_path)
-                
-                # Extract benefits
-                benefit_info = extractor.extract_benefits()
-
-                # Create an Excel file with the extracted data
-                if use_mass_format:
-                    # Use a more descriptive filename for mass upload format
-                    excel_filename = f"{os.path.splitext(filename)[0]}_mass_upload_{uuid.uuid4().hex[:8]}.xlsx"
-                else:
-                    excel_filename = f"benefits_{uuid.uuid4().hex[:8]}.xlsx"
-                    
-                excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
-                
-                # Create Excel with benefits data
-                if template_path:
-                    # Copy template first if it exists
-                    shutil.copy2(template_path, excel_path)
-                
-                # Use the mass upload formatter for special formatting if enabled
-                if use_mass_format:
-                    format_benefit_excel(benefit_info, excel_path)
-                else:
-                    create_benefit_excel(benefit_info, excel_path)
-
-                return jsonify({
-                    "success": True,
-                    "result": benefit_info,
-                    "excel_file": excel_filename,
-                    "format": "mass_upload_template" if use_mass_format else "standard"
-                })
-                
-            except Exception as e:
-                logger.error(f"Error extracting benefits: {str(e)}")
-                # Try simplified extraction as a fallback
-                try:
-                    processor = PDFProcessor(file_path)
-                    text_content = processor.extract_text()[1]  # Use pdfplumber text
-                    
-                    # Simple benefit extraction
-                    benefit_info = simple_extract_benefit_information(text_content)
-                    
-                    # Create Excel
-                    if use_mass_format:
-                        # Use a more descriptive filename for mass upload format
-                        excel_filename = f"{os.path.splitext(filename)[0]}_mass_upload_simple_{uuid.uuid4().hex[:8]}.xlsx"
-                    else:
-                        excel_filename = f"benefits_simple_{uuid.uuid4().hex[:8]}.xlsx"
-                        
-                    excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
-                    
-                    # Create Excel with benefits data
-                    if template_path:
-                        # Copy template first if it exists
-                        shutil.copy2(template_path, excel_path)
-                    
-                    # Use the mass upload formatter for special formatting if enabled
-                    if use_mass_format:
-                        format_benefit_excel(benefit_info, excel_path)
-                    else:
-                        create_benefit_excel(benefit_info, excel_path)
-                    
-                    return jsonify({
-                        "success": True,
-                        "result": benefit_info,
-                        "excel_file": excel_filename,
-                        "warning": "Used simplified extraction due to error in primary extraction."
-                    })
-                    
-                except Exception as inner_e:
-                    logger.error(f"Error in simplified extraction: {str(inner_e)}")
-                    return jsonify({
-                        "success": False,
-                        "error": f"Failed to extract benefits: {str(e)}"
-                    })
+            if wants_async():
+                return jsonify(submit_job('extract-benefits', file_path=file_path, filename=filename,
+                                          template_path=template_path, use_mass_format=use_mass_format,
+                                          escalate=escalate))
+
+            return jsonify(process_benefit_extraction(file_path, filename, template_path, use_mass_format, escalate))
 
         return jsonify({"success": False, "error": "Invalid file format"})
 
@@ -328,6 +482,81 @@ def extract_benefits():
         logger.error(f"Benefit extraction error: {str(e)}")
         return jsonify({"success": False, "error": f"Benefit extraction error: {str(e)}"})
 
+def process_batch_extraction(pdf_paths, template_path=None, export_format=None):
+    """
+    Extract benefits from many saved plan PDFs concurrently and write every
+    plan into one mass upload workbook, plus a bulk export file when
+    export_format is given.
+    Returns the JSON payload of the /extract-benefits-batch route.
+    """
+    # Extract all plans concurrently
+    results = extract_plans(pdf_paths, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                            snapshot=app.config['PAGE_SNAPSHOTS'])
+    plans = [result["result"] for result in results if result["success"]]
+
+    if not plans:
+        return {"success": False, "error": "No plans could be extracted", "results": results}
+
+    excel_filename = f"batch_mass_upload_{uuid.uuid4().hex[:8]}.xlsx"
+    excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+
+    # One workbook open and one save for every plan in the batch
+    if not format_benefits_workbook(plans, excel_path, template_path, template_cache):
+        return {"success": False, "error": "Failed to write the mass upload workbook", "results": results}
+
+    result = {
+        "success": True,
+        "results": results,
+        "plan_count": len(plans),
+        "excel_file": excel_filename,
+        "format": "mass_upload_template"
+    }
+    if export_format:
+        result["export_file"] = export_batch(results, export_format)
+    return result
+
+@app.route('/extract-benefits-batch', methods=['POST'])
+def extract_benefits_batch():
+    """
+    Extract benefits from many plan PDFs (uploaded as pdf_files and/or a
+    zip_file) concurrently, and write every plan into one mass upload workbook.
+    """
+    try:
+        # Batches are larger than single uploads; must be set before reading the form
+        request.max_content_length = app.config['BATCH_MAX_CONTENT_LENGTH']
+
+        pdf_files = request.files.getlist('pdf_files')
+        zip_file = request.files.get('zip_file')
+        template_file = request.files.get('template_file')
+        export_format = requested_export_format()
+        if export_format and export_format not in EXPORT_FORMATS:
+            return jsonify({"success": False, "error": f"Unsupported export format: {export_format}"})
+
+        try:
+            pdf_paths = save_batch_files(pdf_files, zip_file, app.config['UPLOAD_FOLDER'])
+        except zipfile.BadZipFile:
+            return jsonify({"success": False, "error": "Invalid zip file"})
+
+        if not pdf_paths:
+            return jsonify({"success": False, "error": "No PDF files provided"})
+
+        # Use template if provided
+        template_path = None
+        if template_file and template_file.filename != '':
+            template_filename = secure_filename(template_file.filename)
+            template_path = os.path.join(app.config['UPLOAD_FOLDER'], template_filename)
+            template_file.save(template_path)
+
+        if wants_async():
+            return jsonify(submit_job('extract-benefits-batch', pdf_paths=pdf_paths, template_path=template_path,
+                                      export_format=export_format))
+
+        return jsonify(process_batch_extraction(pdf_paths, template_path, export_format))
+
+    except Exception as e:
+        logger.error(f"Batch benefit extraction error: {str(e)}")
+        return jsonify({"success": False, "error": f"Batch extraction error: {str(e)}"})
+
 def simple_extract_benefit_information(text_content):
     """
     Simplified extraction as a fallback method.
@@ -376,7 +605,8 @@ def analyze_with_perplexity():
         if not os.path.exists(file_path):
             return jsonify({"success": False, "error": "File not found"})
             
-        processor = PDFProcessor(file_path)
+        processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                 text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
         processor.extract_text()
         
         api_keys = load_api_keys()
@@ -385,7 +615,7 @@ def analyze_with_perplexity():
         if not perplexity_key:
             return jsonify({"success": False, "error": "No Perplexity API key found in settings"})
             
-        analysis = processor.analyze_with_perplexity(perplexity_key, custom_query=query)
+        analysis = processor.analyze_with_perplexity(perplexity_key, custom_query=query, response_cache=response_cache)
         
         return jsonify({
             "success": True,
@@ -396,6 +626,158 @@ def analyze_with_perplexity():
         logger.error(f"Perplexity analysis error: {str(e)}")
         return jsonify({"success": False, "error": f"Analysis error: {str(e)}"})
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/analyze-with-perplexity/stream')
+def analyze_with_perplexity_stream():
+    """
+    Server-sent events version of /analyze-with-perplexity for EventSource
+    clients. Emits 'status' events while the PDF is read, 'delta' events with
+    each fragment of the analysis as Perplexity generates it, then a final
+    'done' event with the full analysis and citations, or an 'error' event.
+    """
+    filename = request.args.get('filename')
+    query = request.args.get('query') or 'Analyze this document and provide key insights'
+
+    def generate():
+        # Sent before any slow work so the browser gets its first byte at once
+        yield sse_event('status', {"stage": "extracting"})
+        try:
+            if not filename:
+                yield sse_event('error', {"error": "No filename provided"})
+                return
+
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+            if not os.path.exists(file_path):
+                yield sse_event('error', {"error": "File not found"})
+                return
+
+            perplexity_key = load_api_keys().get('perplexity')
+            if not perplexity_key:
+                yield sse_event('error', {"error": "No Perplexity API key found in settings"})
+                return
+
+            processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                                     text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
+            processor.extract_text()
+            text = processor.pdfplumber_text if processor.pdfplumber_text else processor.pypdf_text
+            if not text:
+                yield sse_event('error', {"error": "No text could be extracted from the PDF"})
+                return
+
+            yield sse_event('status', {"stage": "analyzing"})
+            for event in stream_text_with_perplexity(perplexity_key, text, query, cache=response_cache):
+                yield sse_event(event.pop("type"), event)
+
+        except Exception as e:
+            logger.error(f"Perplexity streaming error: {str(e)}")
+            yield sse_event('error', {"error": f"Analysis error: {str(e)}"})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def process_ai_extraction(file_path, filename, template_path=None, map_reduce=None):
+    """
+    Extract benefits from a saved PDF with Perplexity AI and write the mass
+    upload workbook. Returns the JSON payload of the /extract-benefits-ai route.
+
+    map_reduce extracts the document section by section with concurrent calls;
+    None enables it for documents of at least AI_MAP_REDUCE_MIN_PAGES pages.
+    """
+    # Process the PDF file
+    processor = PDFProcessor(file_path, workers=app.config['EXTRACTION_WORKERS'], cache=extraction_cache,
+                             text_engine=app.config['TEXT_ENGINE'], snapshot=app.config['PAGE_SNAPSHOTS'])
+    # Parse once; both extractors work from the same text and tables
+    processor.extract_all()
+    text = processor.pdfplumber_text if processor.pdfplumber_text else processor.pypdf_text
+    
+    # Get Perplexity API key
+    api_keys = load_api_keys()
+    perplexity_key = api_keys.get('perplexity')
+    
+    if not perplexity_key:
+        return {"success": False, "error": "No Perplexity API key found in settings"}
+    
+    # Prompt tailored to the mass upload template format
+    prompt = MASS_UPLOAD_PROMPT
+    
+    if map_reduce is None:
+        map_reduce = processor.page_count >= app.config['AI_MAP_REDUCE_MIN_PAGES']
+    map_info = {}
+    
+    # The AI calls get the hedge deadline, rate limiter wait included, so none outlives the response
+    ai_give_up_at = time.monotonic() + app.config['AI_HEDGE_DEADLINE']
+    
+    def run_ai():
+        ai_deadline = max(ai_give_up_at - time.monotonic(), 0.1)
+        if map_reduce:
+            # Extract the most relevant sections concurrently and merge the partial results
+            mapped = extract_benefits_map_reduce(perplexity_key, text, prompt, workers=app.config['AI_MAP_WORKERS'],
+                                                 cache=response_cache, max_sections=app.config['AI_MAP_MAX_SECTIONS'],
+                                                 deadline=ai_deadline)
+            map_info.update(sections=mapped["sections"], sections_sent=mapped["sections_sent"],
+                            failed_sections=mapped["failed_sections"])
+            return mapped["benefits"]
+        
+        # Only the sections that best match the requested fields are sent
+        analysis = analyze_text_with_perplexity(perplexity_key, text, prompt, cache=response_cache,
+                                                field_queries=BENEFIT_FIELD_QUERIES,
+                                                context_chars=app.config['AI_CONTEXT_CHARS'],
+                                                deadline=ai_deadline)
+        if "error" in analysis:
+            raise Exception(analysis["error"])
+        
+        benefits = parse_benefits_json(analysis.get("content", ""))
+        if not benefits:
+            raise Exception("Perplexity response wasn't valid JSON")
+        return benefits
+    
+    def run_regex():
+        extractor = BenefitExtractor(file_path)
+        return extractor.extract_benefits_from_parsed(text, processor.tables)
+    
+    # Run both extractors at once and answer by the deadline with whatever is ready
+    hedged = hedged_extract(run_ai, run_regex, deadline=app.config['AI_HEDGE_DEADLINE'])
+    benefits = hedged["benefits"]
+    sources = hedged["sources"]
+    
+    if not benefits:
+        return {"success": False, "error": "Failed to extract benefits with AI and standard extraction"}
+    
+    if sources["ai"] == "used":
+        extraction_method = "perplexity_ai_map_reduce" if map_reduce else "perplexity_ai"
+        excel_suffix = "ai_extraction"
+    else:
+        extraction_method = "standard_fallback"
+        excel_suffix = "fallback"
+    
+    # Create Excel file with the mass upload template format
+    excel_filename = f"{os.path.splitext(filename)[0]}_{excel_suffix}_{uuid.uuid4().hex[:8]}.xlsx"
+    excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+    
+    # Create Excel with the special formatting tailored for mass upload, in a copy of the template if provided
+    format_benefit_excel(benefits, excel_path, template_path, template_cache)
+    
+    result = {
+        "success": True,
+        "result": benefits,
+        "excel_file": excel_filename,
+        "format": "mass_upload_template",
+        "extraction_method": extraction_method,
+        "sources": sources,
+        "field_sources": hedged["counts"]
+    }
+    result.update(map_info)
+    if sources["ai"] == "timeout":
+        result["warning"] = "AI extraction did not finish before the deadline, used standard extraction"
+    elif sources["ai"] == "failed":
+        result["warning"] = "AI extraction failed, used standard extraction"
+    elif sources["ai"] == "rejected":
+        result["warning"] = "No AI value passed validation, used standard extraction"
+    return result
+
 @app.route('/extract-benefits-ai', methods=['POST'])
 def extract_benefits_ai():
     """
@@ -426,149 +808,130 @@ def extract_benefits_ai():
                 template_path = os.path.join(app.config['UPLOAD_FOLDER'], template_filename)
                 template_file.save(template_path)
 
-            # Process the PDF file
-            processor = PDFProcessor(file_path)
-            text, _ = processor.extract_text()
-            
-            # Get Perplexity API key
-            api_keys = load_api_keys()
-            perplexity_key = api_keys.get('perplexity')
-            
-            if not perplexity_key:
-                return jsonify({"success": False, "error": "No Perplexity API key found in settings"})
-            
-            # Construct a prompt tailored to the mass upload template format
-            prompt = """
-            Extract health insurance benefit information from the following document, 
-            and format it according to these specific rules:
-            
-            1. For non-HSA plans, simple copay amounts should just be the dollar amount (e.g., "$15")
-            2. For HSA plans, add "after deductible" after dollar amounts (e.g., "$15 after deductible")
-            3. For percentage values, always add "after deductible" (e.g., "20% after deductible")
-            4. For services with different costs at different facilities, format as "Freestanding: X / Hospital: Y"
-            5. For per occurrence deductibles, format as "$X, then Y% after deductible"
-            6. For mail order prescriptions with multiple tiers, format as "Tier1 / Tier2 / Tier3" (e.g., "$10 / $20 / $40")
-            7. For preventive services in-network, always use "0%"
-            8. Emergency room out-of-network should match the in-network value
-            9. Hospital newborn delivery should match inpatient hospitalization
-            
-            Provide the following specific data points, following the formatting rules above:
-            
-            - carrier_name: The insurance carrier name (e.g., UnitedHealthcare, Aetna, etc.)
-            - plan_name: The specific plan name mentioned
-            - deductible: 
-                - individual_in_network: The in-network individual deductible amount (number only, e.g., 1500)
-                - family_in_network: The in-network family deductible amount (number only, e.g., 3000)
-                - individual_out_network: The out-of-network individual deductible amount (number only, e.g., 3000)
-                - family_out_network: The out-of-network family deductible amount (number only, e.g., 6000)
-            - coinsurance:
-                - in_network: The in-network coinsurance percentage (number only, e.g., 20)
-                - out_network: The out-of-network coinsurance percentage (number only, e.g., 40)
-            - out_of_pocket:
-                - individual_in_network: The in-network individual OOP max (number only, e.g., 5000)
-                - family_in_network: The in-network family OOP max (number only, e.g., 10000)
-                - individual_out_network: The out-of-network individual OOP max (number only, e.g., 10000)
-                - family_out_network: The out-of-network family OOP max (number only, e.g., 20000)
-            - office_visits:
-                - primary_care: The PCP visit cost (with proper HSA formatting)
-                - specialist: The specialist visit cost (with proper HSA formatting)
-                - urgent_care: The urgent care visit cost (with proper HSA formatting)
-            - emergency_room: The emergency room cost (with proper HSA formatting)
-            - preventive_services: 
-                - in_network: Always "0%"
-                - out_network: The out-of-network preventive services cost
-            - outpatient_surgery: The outpatient surgery cost (noting any facility differences)
-            - hospitalization: The inpatient hospitalization cost
-            - imaging: The CT/MRI/PT scan cost (noting any facility differences)
-            - prescription:
-                - deductible: Rx deductible if separate from medical
-                - tier_1: Generic medication cost
-                - tier_2: Preferred brand medication cost
-                - tier_3: Non-preferred medication cost
-                - tier_4: Specialty medication cost
-                - tier_5: Specialty (level 5) medication cost if available
-                - mail_order: Mail order prescription costs
-            - network_type: Plan network type (PPO, HMO, EPO, POS, etc.)
-            - network_name: Name of the provider network if mentioned
-            - deductible_type: "Embedded" or "Aggregate"
-            - member_website: Website for member access
-            - customer_service: Customer service phone number
-            
-            Return the data as a JSON object.
-            """
-            
-            try:
-                # Use Perplexity API for detailed extraction with specific formatting
-                analysis = analyze_text_with_perplexity(perplexity_key, text, prompt)
-                
-                benefits = {}
-                if analysis and "choices" in analysis and analysis["choices"] and "message" in analysis["choices"][0]:
-                    content = analysis["choices"][0]["message"]["content"]
-                    
-                    # Try to parse the response as JSON
-                    try:
-                        benefits = json.loads(content)
-                    except json.JSONDecodeError:
-                        # If not valid JSON, try to extract structured data from the content
-                        logger.warning("Perplexity response wasn't valid JSON, extracting manually")
-                        # Fallback to extractor
-                        extractor = BenefitExtractor(file_path)
-                        benefits = extractor.extract_benefits()
-                else:
-                    # If analysis doesn't have the expected structure, fallback to extractor
-                    extractor = BenefitExtractor(file_path)
-                    benefits = extractor.extract_benefits()
-                
-                # Create Excel file with the mass upload template format
-                excel_filename = f"{os.path.splitext(filename)[0]}_ai_extraction_{uuid.uuid4().hex[:8]}.xlsx"
-                excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
-                
-                # Use template if provided
-                if template_path:
-                    shutil.copy2(template_path, excel_path)
-                
-                # Create Excel with the special formatting tailored for mass upload
-                format_benefit_excel(benefits, excel_path)
-                
-                return jsonify({
-                    "success": True,
-                    "result": benefits,
-                    "excel_file": excel_filename,
-                    "format": "mass_upload_template",
-                    "extraction_method": "perplexity_ai"
-                })
-                
-            except Exception as e:
-                logger.error(f"AI extraction error: {str(e)}")
-                # Fall back to regular extraction
-                extractor = BenefitExtractor(file_path)
-                benefits = extractor.extract_benefits()
-                
-                # Create Excel file with the mass upload template format
-                excel_filename = f"{os.path.splitext(filename)[0]}_fallback_{uuid.uuid4().hex[:8]}.xlsx"
-                excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
-                
-                # Use template if provided
-                if template_path:
-                    shutil.copy2(template_path, excel_path)
-                
-                # Create Excel with the special formatting tailored for mass upload
-                format_benefit_excel(benefits, excel_path)
-                
-                return jsonify({
-                    "success": True,
-                    "result": benefits,
-                    "excel_file": excel_filename,
-                    "format": "mass_upload_template",
-                    "extraction_method": "standard_fallback",
-                    "warning": "AI extraction failed, used standard extraction"
-                })
-        
+            # 'true' or 'false' forces map-reduce mode on or off; otherwise it depends on page count
+            map_reduce = request.form.get('map_reduce', '').lower()
+            map_reduce = None if map_reduce not in ('true', 'false') else map_reduce == 'true'
+
+            if wants_async():
+                return jsonify(submit_job('extract-benefits-ai', file_path=file_path, filename=filename,
+                                          template_path=template_path, map_reduce=map_reduce))
+
+            return jsonify(process_ai_extraction(file_path, filename, template_path, map_reduce))
+
         return jsonify({"success": False, "error": "Invalid file format"})
         
     except Exception as e:
         logger.error(f"AI benefit extraction error: {str(e)}")
         return jsonify({"success": False, "error": f"Extraction error: {str(e)}"})
 
+def process_ai_batch_extraction(pdf_paths, template_path=None, export_format=None):
+    """
+    Extract benefits from many saved plan PDFs with rate-limited Perplexity
+    calls and write every plan into one mass upload workbook, plus a bulk
+    export file when export_format is given.
+    Returns the JSON payload of the /extract-benefits-ai-batch route.
+    """
+    perplexity_key = load_api_keys().get('perplexity')
+    if not perplexity_key:
+        return {"success": False, "error": "No Perplexity API key found in settings"}
+
+    batch = extract_plans_ai(pdf_paths, perplexity_key,
+                             max_concurrency=app.config['AI_BATCH_CONCURRENCY'],
+                             response_cache=response_cache, extraction_cache=extraction_cache,
+                             snapshot=app.config['PAGE_SNAPSHOTS'],
+                             context_chars=app.config['AI_CONTEXT_CHARS'])
+    results = batch["results"]
+    plans = [result["result"] for result in results if result["success"]]
+
+    if not plans:
+        return {"success": False, "error": "No plans could be extracted", "results": results, "stats": batch["stats"]}
+
+    excel_filename = f"batch_ai_extraction_{uuid.uuid4().hex[:8]}.xlsx"
+    excel_path = os.path.join(app.config['DOWNLOAD_FOLDER'], excel_filename)
+    if not format_benefits_workbook(plans, excel_path, template_path, template_cache):
+        return {"success": False, "error": "Failed to write the mass upload workbook", "results": results,
+                "stats": batch["stats"]}
+
+    result = {
+        "success": True,
+        "results": results,
+        "plan_count": len(plans),
+        "excel_file": excel_filename,
+        "format": "mass_upload_template",
+        "extraction_method": "perplexity_ai_batch",
+        "stats": batch["stats"]
+    }
+    if export_format:
+        result["export_file"] = export_batch(results, export_format)
+    return result
+
+@app.route('/extract-benefits-ai-batch', methods=['POST'])
+def extract_benefits_ai_batch():
+    """
+    AI extraction for a whole employer group: many plan PDFs (pdf_files and/or
+    a zip_file), extracted with Perplexity under the configured rate limit.
+    """
+    try:
+        # Batches are larger than single uploads; must be set before reading the form
+        request.max_content_length = app.config['BATCH_MAX_CONTENT_LENGTH']
+
+        template_file = request.files.get('template_file')
+        export_format = requested_export_format()
+        if export_format and export_format not in EXPORT_FORMATS:
+            return jsonify({"success": False, "error": f"Unsupported export format: {export_format}"})
+
+        try:
+            pdf_paths = save_batch_files(request.files.getlist('pdf_files'), request.files.get('zip_file'),
+                                         app.config['UPLOAD_FOLDER'])
+        except zipfile.BadZipFile:
+            return jsonify({"success": False, "error": "Invalid zip file"})
+
+        if not pdf_paths:
+            return jsonify({"success": False, "error": "No PDF files provided"})
+
+        template_path = None
+        if template_file and template_file.filename != '':
+            template_filename = secure_filename(template_file.filename)
+            template_path = os.path.join(app.config['UPLOAD_FOLDER'], template_filename)
+            template_file.save(template_path)
+
+        if wants_async():
+            return jsonify(submit_job('extract-benefits-ai-batch', pdf_paths=pdf_paths, template_path=template_path,
+                                      export_format=export_format))
+
+        return jsonify(process_ai_batch_extraction(pdf_paths, template_path, export_format))
+
+    except Exception as e:
+        logger.error(f"AI batch extraction error: {str(e)}")
+        return jsonify({"success": False, "error": f"AI batch extraction error: {str(e)}"})
+
+job_queue.register('upload', process_upload)
+job_queue.register('extract-benefits', process_benefit_extraction)
+job_queue.register('extract-benefits-ai', process_ai_extraction)
+job_queue.register('extract-benefits-batch', process_batch_extraction)
+job_queue.register('extract-benefits-ai-batch', process_ai_batch_extraction)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"})
+    return jsonify({"success": True, "job": job})
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.result(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"})
+
+    if job["status"] == "completed":
+        # The stored payload is exactly what the synchronous route would have returned
+        return jsonify(job["result"])
+
+    if job["status"] == "failed":
+        return jsonify({"success": False, "status": job["status"], "error": job["error"]})
+
+    return jsonify({"success": False, "status": job["status"], "error": "Job has not finished yet"})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,63 @@
+/**
+ * Stream a Perplexity analysis of an uploaded PDF from
+ * /analyze-with-perplexity/stream (server-sent events).
+ *
+ * handlers:
+ *   onStatus(stage)          'extracting' or 'analyzing'
+ *   onDelta(text, content)   each new fragment, and everything received so far
+ *   onDone(analysis)         the full analysis: content, model, citations
+ *   onError(message)
+ *
+ * Returns the EventSource; it is closed once the analysis ends.
+ */
+function streamAnalysis(filename, query, handlers) {
+    const params = new URLSearchParams({ filename: filename });
+    if (query) {
+        params.set('query', query);
+    }
+
+    const source = new EventSource('/analyze-with-perplexity/stream?' + params.toString());
+    let content = '';
+    let finished = false;
+
+    function finish() {
+        finished = true;
+        // Without this the browser would reconnect and run the analysis again
+        source.close();
+    }
+
+    source.addEventListener('status', function(event) {
+        if (handlers.onStatus) {
+            handlers.onStatus(JSON.parse(event.data).stage);
+        }
+    });
+
+    source.addEventListener('delta', function(event) {
+        const text = JSON.parse(event.data).content;
+        content += text;
+        if (handlers.onDelta) {
+            handlers.onDelta(text, content);
+        }
+    });
+
+    source.addEventListener('done', function(event) {
+        finish();
+        if (handlers.onDone) {
+            handlers.onDone(JSON.parse(event.data));
+        }
+    });
+
+    // Fires both for 'error' events sent by the server (with data) and for dropped connections
+    source.addEventListener('error', function(event) {
+        if (finished) {
+            return;
+        }
+        finish();
+        const message = event.data ? JSON.parse(event.data).error : 'Connection to the server was lost';
+        if (handlers.onError) {
+            handlers.onError(message);
+        }
+    });
+
+    return source;
+}
@@ -0,0 +1,58 @@
+import pytest
+
+from utils import job_queue
+from utils.job_queue import JobStore, QUEUED, FAILED
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(job_queue, "time", clock)
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def test_jobs_within_their_lease_are_kept(store, clock):
+    job_id = store.create("upload", {}, owner="a")
+    clock.advance(59)
+    assert store.fail_expired(lease_seconds=60) == 0
+    assert store.get(job_id)["status"] == QUEUED
+
+
+def test_expired_queued_and_running_jobs_are_failed(store, clock):
+    queued = store.create("upload", {}, owner="a")
+    running = store.create("upload", {}, owner="a")
+    store.mark_running(running, "a")
+    clock.advance(61)
+    assert store.fail_expired(lease_seconds=60, error="gone") == 2
+    for job_id in (queued, running):
+        job = store.get(job_id)
+        assert job["status"] == FAILED
+        assert job["error"] == "gone"
+
+
+def test_heartbeat_renews_only_the_owners_jobs(store, clock):
+    live = store.create("upload", {}, owner="a")
+    dead = store.create("upload", {}, owner="b")
+    clock.advance(50)
+    assert store.heartbeat("a") == 1
+    clock.advance(20)
+    assert store.fail_expired(lease_seconds=60) == 1
+    assert store.get(live)["status"] == QUEUED
+    assert store.get(dead)["status"] == FAILED
+
+
+def test_finished_jobs_never_expire(store, clock):
+    job_id = store.create("upload", {}, owner="a")
+    store.mark_running(job_id, "a")
+    store.mark_completed(job_id, "a", {"success": True})
+    clock.advance(3600)
+    assert store.fail_expired(lease_seconds=60) == 0
+    assert store.get(job_id, include_result=True)["result"] == {"success": True}
+
+
+def test_expired_job_stays_failed_when_its_worker_finishes(store, clock):
+    job_id = store.create("upload", {}, owner="a")
+    store.mark_running(job_id, "a")
+    clock.advance(61)
+    store.fail_expired(lease_seconds=60)
+    store.mark_completed(job_id, "a", {"success": True})
+    assert store.get(job_id)["status"] == FAILED
@@ -0,0 +1,125 @@
+import pytest
+
+from utils import perplexity_api
+from utils.perplexity_api import CircuitBreaker, RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(perplexity_api, "time", clock)
+    return clock
+
+
+class TestRateLimiter:
+    def test_burst_goes_through_without_waiting(self, clock):
+        limiter = RateLimiter(requests_per_minute=60, burst=3)
+        assert all(limiter.acquire() for _ in range(3))
+        assert clock.sleeps == []
+
+    def test_calls_past_the_burst_are_paced_at_the_rate(self, clock):
+        limiter = RateLimiter(requests_per_minute=60, burst=2)
+        for _ in range(5):
+            assert limiter.acquire()
+        # Two burst tokens, then one call per second
+        assert clock.now == pytest.approx(1003.0)
+
+    def test_tokens_refill_up_to_the_burst(self, clock):
+        limiter = RateLimiter(requests_per_minute=60, burst=2)
+        limiter.acquire()
+        limiter.acquire()
+        clock.advance(60)
+        assert limiter.acquire()
+        assert limiter.acquire()
+        assert clock.sleeps == []
+        assert limiter.acquire()
+        assert clock.sleeps == [pytest.approx(1.0)]
+
+    def test_gives_up_when_no_slot_frees_before_the_timeout(self, clock):
+        limiter = RateLimiter(requests_per_minute=6, burst=1)
+        assert limiter.acquire()
+        # The next token is 10 seconds away
+        assert not limiter.acquire(timeout=5)
+        assert clock.sleeps == []
+        assert limiter.acquire(timeout=15)
+
+    def test_pause_holds_every_call(self, clock):
+        limiter = RateLimiter(requests_per_minute=60, burst=5)
+        limiter.pause(30)
+        assert not limiter.acquire(timeout=10)
+        assert limiter.acquire()
+        assert clock.now >= 1030.0
+
+    def test_zero_rate_disables_the_limit(self, clock):
+        limiter = RateLimiter(requests_per_minute=0, burst=1)
+        assert all(limiter.acquire(timeout=0) for _ in range(100))
+
+
+class TestSetRateLimit:
+    def test_burst_comes_out_of_the_process_share(self, monkeypatch):
+        limiter = RateLimiter()
+        monkeypatch.setattr(perplexity_api, "_rate_limiter", limiter)
+        perplexity_api.set_rate_limit(50, 8, processes=1)
+        assert limiter.capacity == 8
+        assert limiter.rate * 60 == pytest.approx(42)
+
+    def test_burst_is_capped_below_a_small_share(self, monkeypatch):
+        limiter = RateLimiter()
+        monkeypatch.setattr(perplexity_api, "_rate_limiter", limiter)
+        perplexity_api.set_rate_limit(20, 8, processes=4)
+        assert limiter.capacity == 4
+        assert limiter.rate * 60 == pytest.approx(1)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_the_failure_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+    def test_half_open_lets_a_single_probe_through(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        clock.advance(30)
+        assert breaker.state == "half-open"
+        assert breaker.allow()
+        assert not breaker.allow()
+
+    def test_successful_probe_closes(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        clock.advance(30)
+        breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self, clock):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        for _ in range(5):
+            breaker.record_failure()
+        clock.advance(30)
+        breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+    def test_released_probe_lets_the_next_call_probe(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        clock.advance(30)
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.state == "half-open"
+        assert breaker.allow()
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import random
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from .perplexity_api import (analyze_text_with_perplexity, get_client, get_rate_limiter, set_rate_limit,
+                             PerplexityClient, CircuitBreaker, RETRY_STATUSES, BACKOFF_BASE, BACKOFF_MAX,
+                             DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_BURST)
+from .extraction_cache import ExtractionCache, ResponseCache
+from .section_retrieval import BENEFIT_FIELD_QUERIES, DEFAULT_CONTEXT_CHARS
+from .ai_extraction import MASS_UPLOAD_PROMPT, parse_benefits_json
+from .pdf_processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on documents in flight; halved on every 429 and regrown one at a time
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Attempts per document before it is reported as failed
+MAX_ATTEMPTS = 5
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit with additive increase and multiplicative decrease: the
+    limit halves on every throttled response and grows by one after a full
+    limit's worth of successes, never leaving [min_limit, max_limit].
+    """
+
+    def __init__(self, max_limit: int = DEFAULT_MAX_CONCURRENCY, min_limit: int = 1):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def record(self, throttled: bool):
+        async with self._condition:
+            if throttled:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.successes = 0
+                return
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self._condition.notify_all()
+
+class _BatchClient:
+    """
+    PerplexityClient wrapper handed to analyze_text_with_perplexity from a
+    worker thread. The client makes a single attempt per call, so a 429 would
+    count against its circuit breaker; throttling is handled by the rate
+    limiter and concurrency limit instead, so it counts as the API being up.
+    """
+
+    def __init__(self, client: PerplexityClient):
+        self.client = client
+
+    def chat(self, api_key: str, payload: Dict[str, Any], deadline: Optional[float] = None):
+        response = self.client.chat(api_key, payload, deadline)
+        if response.status_code == 429:
+            self.client.breaker.record_success()
+        return response
+
+class BatchAIClient:
+    """
+    Asyncio driver for many Perplexity analyses at once.
+
+    Requests draw from the process-wide Perplexity rate limiter, shared with
+    every other batch and interactive call (see perplexity_api.set_rate_limit),
+    with an adaptive number of documents in flight. Throttled and transient
+    failures are retried by the driver itself, each retry waiting for its own
+    request slot; the underlying client makes a single attempt per call.
+
+        async with BatchAIClient(api_key) as batch:
+            futures = {name: batch.submit(name, text, query) for name, text in docs.items()}
+            results = {name: await future for name, future in futures.items()}
+    """
+
+    def __init__(self, api_key: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 cache: Optional[ResponseCache] = None, client: Optional[PerplexityClient] = None,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.max_attempts = max_attempts
+        # Retries happen here, where each one waits for a request slot, so the client makes one attempt
+        shared = client or get_client()
+        self.client = PerplexityClient(base_url=shared.base_url, timeout=shared.timeout, deadline=shared.deadline,
+                                       max_retries=0, breaker=CircuitBreaker(), pool_size=max(max_concurrency, 1),
+                                       rate_limiter=shared.rate_limiter or get_rate_limiter())
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0}
+
+    async def __aenter__(self) -> "BatchAIClient":
+        self.loop = asyncio.get_running_loop()
+        self.concurrency = AdaptiveConcurrency(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max(self.max_concurrency, 1), thread_name_prefix='ai-batch')
+        self.batch_client = _BatchClient(self.client)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=True)
+
+    def submit(self, doc_id: str, text: str, query: Optional[str] = None, **analyze_options) -> asyncio.Future:
+        """
+        Schedule the analysis of one document and return its future. The
+        future resolves to the analyze_text_with_perplexity() result dict.
+        """
+        return asyncio.ensure_future(self._analyze(doc_id, text, query, analyze_options))
+
+    async def _analyze(self, doc_id: str, text: str, query: Optional[str], analyze_options: Dict[str, Any]) -> Dict[str, Any]:
+        analysis = {}
+        for attempt in range(self.max_attempts):
+            async with self.concurrency:
+                analysis = await self.loop.run_in_executor(
+                    self.executor,
+                    lambda: analyze_text_with_perplexity(self.api_key, text, query, client=self.batch_client,
+                                                         cache=self.cache, **analyze_options)
+                )
+            if not analysis.get("cached"):
+                self.stats["requests"] += 1
+
+            status = analysis.get("status")
+            throttled = status == 429
+            await self.concurrency.record(throttled)
+            if throttled:
+                self.stats["throttled"] += 1
+
+            retryable = "error" in analysis and not analysis.get("circuit_open") and \
+                (status is None or status in RETRY_STATUSES)
+            if not retryable or attempt + 1 >= self.max_attempts:
+                return analysis
+
+            self.stats["retries"] += 1
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+            logger.warning(f"Batch analysis of {doc_id} failed ({analysis['error']}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        return analysis
+
+def _plan_text(pdf_path: str, cache: Optional[ExtractionCache], snapshot: bool) -> str:
+    processor = PDFProcessor(pdf_path, workers=0, cache=cache, snapshot=snapshot)
+    processor.extract_all()
+    return processor.pdfplumber_text if processor.pdfplumber_text else processor.pypdf_text
+
+async def extract_plans_ai_async(pdf_paths: List[str], api_key: str, prompt: str = MASS_UPLOAD_PROMPT,
+                                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                 response_cache: Optional[ResponseCache] = None,
+                                 extraction_cache: Optional[ExtractionCache] = None, snapshot: bool = False,
+                                 context_chars: int = DEFAULT_CONTEXT_CHARS) -> Dict[str, Any]:
+    """
+    Extract benefits from many plan PDFs with Perplexity, paced by the
+    process-wide rate limiter.
+    Each PDF is parsed on a background thread and its API call is queued as
+    soon as its text is ready. Returns per-plan 'results' in pdf_paths order
+    and the batch 'stats'.
+    """
+    async with BatchAIClient(api_key, max_concurrency=max_concurrency, cache=response_cache) as batch:
+        parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-batch-parse')
+
+        async def extract(pdf_path: str) -> Dict[str, Any]:
+            filename = os.path.basename(pdf_path)
+            try:
+                text = await batch.loop.run_in_executor(parse_executor, _plan_text, pdf_path, extraction_cache, snapshot)
+                analysis = await batch.submit(filename, text, prompt, field_queries=BENEFIT_FIELD_QUERIES,
+                                              context_chars=context_chars)
+                if "error" in analysis:
+                    raise Exception(analysis["error"])
+                benefits = parse_benefits_json(analysis.get("content", ""))
+                if not benefits:
+                    raise Exception("Perplexity response wasn't valid JSON")
+                return {"filename": filename, "success": True, "result": benefits,
+                        "cached": bool(analysis.get("cached"))}
+            except Exception as e:
+                logger.error(f"AI extraction failed for {filename}: {str(e)}")
+                return {"filename": filename, "success": False, "error": str(e)}
+
+        try:
+            results = await asyncio.gather(*(extract(path) for path in pdf_paths))
+        finally:
+            parse_executor.shutdown(wait=False)
+
+        stats = dict(batch.stats, concurrency=batch.concurrency.limit)
+    return {"results": list(results), "stats": stats}
+
+def extract_plans_ai(pdf_paths: List[str], api_key: str, **options) -> Dict[str, Any]:
+    """Synchronous entry point for extract_plans_ai_async(), e.g. from a job handler."""
+    return asyncio.run(extract_plans_ai_async(pdf_paths, api_key, **options))
+
+if __name__ == '__main__':
+    # Extract a folder of plans: python -m utils.ai_batch uploads/ --rpm 50 --out results.json
+    from .api_keys import load_api_keys
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rate-limited AI benefit extraction for a folder of plan PDFs")
+    parser.add_argument('folder', nargs='?', default='uploads')
+    parser.add_argument('--rpm', type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="requests per minute")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument('--out', help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    api_key = load_api_keys().get('perplexity')
+    if not api_key:
+        sys.exit("No Perplexity API key found (set PERPLEXITY_API_KEY or add one on the API Keys page)")
+
+    set_rate_limit(args.rpm, args.burst)
+    paths = [os.path.join(args.folder, name) for name in sorted(os.listdir(args.folder)) if name.lower().endswith('.pdf')]
+    output = extract_plans_ai(paths, api_key, max_concurrency=args.concurrency, response_cache=ResponseCache())
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
@@ -0,0 +1,401 @@
+import re
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional, Callable
+from .perplexity_api import analyze_text_with_perplexity
+from .extraction_cache import ResponseCache
+from .section_retrieval import chunk_document, rank_chunks, BENEFIT_FIELD_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# Characters of document text sent with each section-level call
+SECTION_CHARS = 12000
+
+# Most sections sent per document, picked by BM25 relevance to the benefit fields,
+# so a long booklet costs one round of calls rather than one per few pages
+DEFAULT_MAX_SECTIONS = 8
+
+# Upper bound on section-level calls in flight at once; the pool is sized to the sections sent
+DEFAULT_MAP_WORKERS = 8
+
+# Values that mean a section did not contain the field
+EMPTY_VALUES = {"", "not found", "not specified", "n/a", "na", "none", "unknown", "null"}
+
+SECTION_INSTRUCTIONS = (
+    "\n\nThe document text below is only one section of a longer document. "
+    "Use null for any field that does not appear in this section."
+)
+
+# Benefit extraction prompt tailored to the mass upload template format
+MASS_UPLOAD_PROMPT = """
+    Extract health insurance benefit information from the following document, 
+    and format it according to these specific rules:
+    
+    1. For non-HSA plans, simple copay amounts should just be the dollar amount (e.g., "$15")
+    2. For HSA plans, add "after deductible" after dollar amounts (e.g., "$15 after deductible")
+    3. For percentage values, always add "after deductible" (e.g., "20% after deductible")
+    4. For services with different costs at different facilities, format as "Freestanding: X / Hospital: Y"
+    5. For per occurrence deductibles, format as "$X, then Y% after deductible"
+    6. For mail order prescriptions with multiple tiers, format as "Tier1 / Tier2 / Tier3" (e.g., "$10 / $20 / $40")
+    7. For preventive services in-network, always use "0%"
+    8. Emergency room out-of-network should match the in-network value
+    9. Hospital newborn delivery should match inpatient hospitalization
+    
+    Provide the following specific data points, following the formatting rules above:
+    
+    - carrier_name: The insurance carrier name (e.g., UnitedHealthcare, Aetna, etc.)
+    - plan_name: The specific plan name mentioned
+    - deductible: 
+        - individual_in_network: The in-network individual deductible amount (number only, e.g., 1500)
+        - family_in_network: The in-network family deductible amount (number only, e.g., 3000)
+        - individual_out_network: The out-of-network individual deductible amount (number only, e.g., 3000)
+        - family_out_network: The out-of-network family deductible amount (number only, e.g., 6000)
+    - coinsurance:
+        - in_network: The in-network coinsurance percentage (number only, e.g., 20)
+        - out_network: The out-of-network coinsurance percentage (number only, e.g., 40)
+    - out_of_pocket:
+        - individual_in_network: The in-network individual OOP max (number only, e.g., 5000)
+        - family_in_network: The in-network family OOP max (number only, e.g., 10000)
+        - individual_out_network: The out-of-network individual OOP max (number only, e.g., 10000)
+        - family_out_network: The out-of-network family OOP max (number only, e.g., 20000)
+    - office_visits:
+        - primary_care: The PCP visit cost (with proper HSA formatting)
+        - specialist: The specialist visit cost (with proper HSA formatting)
+        - urgent_care: The urgent care visit cost (with proper HSA formatting)
+    - emergency_room: The emergency room cost (with proper HSA formatting)
+    - preventive_services: 
+        - in_network: Always "0%"
+        - out_network: The out-of-network preventive services cost
+    - outpatient_surgery: The outpatient surgery cost (noting any facility differences)
+    - hospitalization: The inpatient hospitalization cost
+    - imaging: The CT/MRI/PT scan cost (noting any facility differences)
+    - prescription:
+        - deductible: Rx deductible if separate from medical
+        - tier_1: Generic medication cost
+        - tier_2: Preferred brand medication cost
+        - tier_3: Non-preferred medication cost
+        - tier_4: Specialty medication cost
+        - tier_5: Specialty (level 5) medication cost if available
+        - mail_order: Mail order prescription costs
+    - network_type: Plan network type (PPO, HMO, EPO, POS, etc.)
+    - network_name: Name of the provider network if mentioned
+    - deductible_type: "Embedded" or "Aggregate"
+    - member_website: Website for member access
+    - customer_service: Customer service phone number
+    
+    Return the data as a JSON object.
+    """
+
+JSON_OBJECT_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+
+# Default seconds to wait for the AI before answering with what is ready
+DEFAULT_HEDGE_DEADLINE = 30.0
+
+# Sections whose values must be amounts or percentages
+NUMERIC_SECTIONS = {'deductible', 'out_of_pocket', 'coinsurance'}
+
+# Longer AI values are prose rather than a benefit value
+MAX_AI_VALUE_CHARS = 200
+
+# Default number of AI calls of hedged extractions that may run at once
+DEFAULT_HEDGE_WORKERS = 8
+
+# AI calls of every hedged extraction; calls that miss the deadline finish here in the background.
+# The regex extractor runs in the caller's thread so it never queues behind them.
+_hedge_executor = ThreadPoolExecutor(max_workers=DEFAULT_HEDGE_WORKERS, thread_name_prefix='hedge')
+
+def set_hedge_workers(workers: int):
+    """Resize the shared hedge pool; AI calls already running finish on the old pool."""
+    global _hedge_executor
+    old_executor = _hedge_executor
+    _hedge_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='hedge')
+    old_executor.shutdown(wait=False)
+
+def split_sections(text: str, section_chars: int = SECTION_CHARS) -> List[str]:
+    """Pack consecutive page/section chunks into sections of at most section_chars."""
+    sections = []
+    current = []
+    size = 0
+    for chunk in chunk_document(text):
+        if current and size + len(chunk['text']) > section_chars:
+            sections.append("\n\n".join(current))
+            current = []
+            size = 0
+        current.append(chunk['text'])
+        size += len(chunk['text']) + 2
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+def parse_benefits_json(content: str) -> Optional[Dict[str, Any]]:
+    """Parse the JSON object in a model response, tolerating code fences and surrounding prose."""
+    if not content:
+        return None
+    try:
+        value = json.loads(content)
+    except json.JSONDecodeError:
+        match = JSON_OBJECT_PATTERN.search(content)
+        if not match:
+            return None
+        try:
+            value = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+    return value if isinstance(value, dict) else None
+
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in EMPTY_VALUES
+    if isinstance(value, dict):
+        return all(_is_empty(v) for v in value.values())
+    return False
+
+def merge_benefits(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge section-level results into one benefits dict. Nested fields are
+    merged key by key; for each field the first non-empty value in document
+    order wins.
+    """
+    merged: Dict[str, Any] = {}
+    for partial in partials:
+        for key, value in partial.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = merge_benefits([merged[key], value])
+            elif key not in merged or (_is_empty(merged[key]) and not _is_empty(value)):
+                merged[key] = value
+    return merged
+
+def select_sections(sections: List[str], max_sections: int = DEFAULT_MAX_SECTIONS,
+                    field_queries: Dict[str, str] = BENEFIT_FIELD_QUERIES) -> List[str]:
+    """
+    Keep at most max_sections sections, ranked with BM25 against the benefit
+    fields (the best section for every field first), in document order.
+    """
+    if len(sections) <= max_sections:
+        return sections
+    ranked = rank_chunks([{'text': section} for section in sections], field_queries)
+    if not ranked:
+        # Nothing matches any field (e.g. unusual wording); send the start of the document
+        return sections[:max_sections]
+    return [sections[i] for i in sorted(ranked[:max_sections])]
+
+def extract_benefits_map_reduce(api_key: str, text: str, prompt: str, workers: int = DEFAULT_MAP_WORKERS,
+                                cache: Optional[ResponseCache] = None,
+                                section_chars: int = SECTION_CHARS,
+                                max_sections: int = DEFAULT_MAX_SECTIONS,
+                                deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Split a long document into sections, keep the max_sections most relevant
+    ones, run the extraction prompt on them concurrently, and merge the
+    partial JSON results.
+
+    Returns a dict with the merged 'benefits', the number of 'sections' in
+    the document, the number sent ('sections_sent') and the number of
+    'failed_sections'. With workers >= max_sections every call starts at
+    once, and with a rate limiter burst of at least max_sections none waits
+    for a request slot, so latency is roughly one call whatever the document
+    length. deadline bounds every section call, rate limiter wait included.
+    """
+    give_up_at = time.monotonic() + deadline if deadline is not None else None
+    all_sections = split_sections(text, section_chars)
+    sections = select_sections(all_sections, max_sections)
+    section_prompt = prompt + SECTION_INSTRUCTIONS
+
+    def extract_section(section: str) -> Optional[Dict[str, Any]]:
+        try:
+            remaining = max(give_up_at - time.monotonic(), 0.1) if give_up_at is not None else None
+            analysis = analyze_text_with_perplexity(api_key, section, section_prompt, cache=cache, deadline=remaining)
+        except Exception as e:
+            logger.warning(f"Section extraction failed: {str(e)}")
+            return None
+        if "error" in analysis:
+            logger.warning(f"Section extraction failed: {analysis['error']}")
+            return None
+        return parse_benefits_json(analysis.get("content", ""))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sections)))) as executor:
+        partials = list(executor.map(extract_section, sections))
+
+    succeeded = [partial for partial in partials if partial]
+    return {
+        "benefits": merge_benefits(succeeded),
+        "sections": len(all_sections),
+        "sections_sent": len(sections),
+        "failed_sections": len(sections) - len(succeeded)
+    }
+
+def validate_ai_value(path: List[str], value: Any) -> bool:
+    """
+    Check that an AI value for the field at path is usable: not empty, not a
+    paragraph of prose, and containing a number for amount fields.
+    """
+    if _is_empty(value) or isinstance(value, (dict, list)):
+        return False
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    value = str(value)
+    if len(value) > MAX_AI_VALUE_CHARS:
+        return False
+    if path[0] in NUMERIC_SECTIONS:
+        return any(c.isdigit() for c in value)
+    return True
+
+def merge_validated(regex_benefits: Dict[str, Any], ai_benefits: Dict[str, Any],
+                    path: Optional[List[str]] = None, counts: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Merge regex and AI results field by field. AI values win where they
+    validate; otherwise the regex value is kept. Fields only the AI knows
+    about are added when they validate. counts tallies the source of each field.
+    """
+    path = path or []
+    counts = counts if counts is not None else {"ai": 0, "regex": 0}
+    merged: Dict[str, Any] = {}
+
+    for key in list(regex_benefits.keys()) + [k for k in ai_benefits.keys() if k not in regex_benefits]:
+        regex_value = regex_benefits.get(key)
+        ai_value = ai_benefits.get(key)
+        field_path = path + [key]
+
+        if isinstance(regex_value, dict) or isinstance(ai_value, dict):
+            merged[key] = merge_validated(regex_value if isinstance(regex_value, dict) else {},
+                                          ai_value if isinstance(ai_value, dict) else {},
+                                          field_path, counts)
+        elif validate_ai_value(field_path, ai_value):
+            merged[key] = ai_value
+            counts["ai"] += 1
+        elif key in regex_benefits:
+            merged[key] = regex_value
+            counts["regex"] += 1
+
+    return merged
+
+def hedged_extract(ai_fn: Callable[[], Dict[str, Any]], regex_fn: Callable[[], Dict[str, Any]],
+                   deadline: float = DEFAULT_HEDGE_DEADLINE) -> Dict[str, Any]:
+    """
+    Run the AI and regex extractors concurrently and merge their results.
+
+    The AI call runs on the shared hedge pool while the regex extractor runs
+    in the calling thread. The AI result is used only if it is ready within
+    deadline seconds of the call; otherwise the response carries the regex
+    result alone and the late AI call still fills the response cache.
+
+    Returns a dict with the merged 'benefits', the 'sources' status of each
+    extractor ('used', 'failed' or 'timeout', or 'rejected' when the AI
+    answered but none of its values validated) and per-source field 'counts'.
+    """
+    started = time.monotonic()
+    ai_future = _hedge_executor.submit(ai_fn)
+
+    results = {}
+    sources = {}
+    try:
+        results["regex"] = regex_fn()
+        sources["regex"] = "used" if results["regex"] else "failed"
+    except Exception as e:
+        logger.warning(f"regex extraction failed: {str(e)}")
+        sources["regex"] = "failed"
+
+    remaining = max(0.0, deadline - (time.monotonic() - started))
+    try:
+        results["ai"] = ai_future.result(timeout=remaining)
+        sources["ai"] = "used" if results["ai"] else "failed"
+    except FutureTimeoutError:
+        sources["ai"] = "timeout"
+    except Exception as e:
+        logger.warning(f"ai extraction failed: {str(e)}")
+        sources["ai"] = "failed"
+
+    counts = {"ai": 0, "regex": 0}
+    benefits = merge_validated(results.get("regex") or {}, results.get("ai") or {}, counts=counts)
+    # The AI only counts as used when at least one of its values made it into the result
+    if sources["ai"] == "used" and counts["ai"] == 0:
+        sources["ai"] = "rejected"
+    return {
+        "benefits": benefits,
+        "sources": sources,
+        "counts": counts
+    }
+
+# Fields whose regex confidence is below this are sent to the AI
+DEFAULT_ESCALATION_THRESHOLD = 0.5
+
+# Confidence recorded for a field resolved by escalation
+CONFIDENCE_AI = 0.8
+
+ESCALATION_PROMPT = (
+    "Extract health insurance benefit values from the numbered excerpts of a "
+    "Summary of Benefits and Coverage. For each field below, read only the "
+    "excerpts listed next to it. Return a JSON object mapping each field name, "
+    "exactly as written, to its value as stated in the document (e.g. \"$1,500\", "
+    "\"20%\", \"$30 copay\"), or null if the excerpts do not state it.\n\nFields:\n"
+)
+
+def _get_path(values: Dict[str, Any], path: List[str]) -> Any:
+    for key in path:
+        if not isinstance(values, dict):
+            return None
+        values = values.get(key)
+    return values
+
+def escalate_low_confidence(api_key: str, extractor, benefits: Dict[str, Any],
+                            threshold: float = DEFAULT_ESCALATION_THRESHOLD,
+                            cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """
+    Ask the AI about only the fields the regex extractor resolved with low
+    confidence, sending just the text windows around each field's anchors.
+
+    extractor is the BenefitExtractor that produced benefits; its confidence is
+    updated for every field the AI resolves. Returns a dict with the updated
+    'benefits' and the 'escalated' and 'resolved' field names. No call is made
+    when every field is confident.
+    """
+    low_fields = [field for field, confidence in extractor.confidence.items() if confidence < threshold]
+    if not low_fields:
+        return {"benefits": benefits, "escalated": [], "resolved": []}
+
+    # Fields often share anchors, so each distinct window is sent once
+    excerpts: List[str] = []
+    excerpt_ids: Dict[str, int] = {}
+    field_lines = []
+    for field in low_fields:
+        ids = []
+        for window in extractor.field_windows(field):
+            if window not in excerpt_ids:
+                excerpts.append(window)
+                excerpt_ids[window] = len(excerpts)
+            ids.append(excerpt_ids[window])
+        if ids:
+            field_lines.append(f"- {field} (excerpts {', '.join(str(i) for i in ids)})")
+
+    if not excerpts:
+        return {"benefits": benefits, "escalated": low_fields, "resolved": []}
+
+    query = ESCALATION_PROMPT + "\n".join(field_lines)
+    text = "\n\n".join(f"Excerpt {i}:\n{excerpt}" for i, excerpt in enumerate(excerpts, start=1))
+    analysis = analyze_text_with_perplexity(api_key, text, query, cache=cache)
+    if "error" in analysis:
+        raise Exception(analysis["error"])
+    values = parse_benefits_json(analysis.get("content", "")) or {}
+
+    updated = json.loads(json.dumps(benefits))
+    resolved = []
+    for field in low_fields:
+        path = field.split('.')
+        value = values.get(field, _get_path(values, path))
+        if not validate_ai_value(path, value):
+            continue
+        target = updated
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+        extractor.confidence[field] = CONFIDENCE_AI
+        resolved.append(field)
+
+    return {"benefits": updated, "escalated": low_fields, "resolved": resolved}
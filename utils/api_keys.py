@@ -1,77 +1,141 @@
 import os
 import json
+import logging
+import threading
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are still atomic, but not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+API_KEYS_FILE = 'api_keys.json'
+
+class APIKeyStore:
+    """
+    Process-wide cache of the API keys file.
+
+    Reads are served from memory and the file is re-parsed only when its
+    mtime, size or inode change, so edits made by other worker processes
+    are picked up on the next read. Writes take an exclusive lock file,
+    re-read the file, and replace it atomically through a temporary file,
+    so concurrent writers never lose each other's keys and readers never
+    see a half-written file.
+    """
+
+    def __init__(self, path: str = API_KEYS_FILE):
+        self.path = path
+        self._keys: Dict[str, str] = {}
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _read_file(self) -> Dict[str, str]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self) -> Dict[str, str]:
+        """Return a copy of the stored keys, re-reading the file only if it changed."""
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                try:
+                    self._keys = self._read_file() if stamp is not None else {}
+                    self._stamp = stamp
+                except Exception as e:
+                    # Keep serving the last good copy; the next read tries again
+                    logger.error(f"Error loading API keys: {str(e)}")
+            return dict(self._keys)
+
+    def update(self, change: Callable[[Dict[str, str]], bool]) -> bool:
+        """
+        Apply change to the keys on disk and write them back atomically.
+        change edits the dict in place and returns False to skip the write.
+        """
+        lock_path = self.path + '.lock'
+        with self._lock, open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Re-read under the lock so changes from other processes are kept
+                keys = self._read_file()
+                if not change(keys):
+                    return False
+                keys["updated_at"] = datetime.now().isoformat()
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                try:
+                    with open(tmp_path, 'w') as f:
+                        json.dump(keys, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+
+                self._keys = keys
+                self._stamp = self._file_stamp()
+                return True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+_store = APIKeyStore()
 
 def load_api_keys() -> Dict[str, str]:
     """
     Load API keys from the JSON file.
     If the file doesn't exist, return an empty dictionary.
     """
-    api_keys_file = 'api_keys.json'
-    
     # Check if the environment variable exists first
     perplexity_key = os.environ.get('PERPLEXITY_API_KEY')
     if perplexity_key:
         return {"perplexity": perplexity_key, "updated_at": datetime.now().isoformat()}
-    
-    # Otherwise check the file
-    try:
-        if os.path.exists(api_keys_file):
-            with open(api_keys_file, 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        print(f"Error loading API keys: {str(e)}")
-        return {}
+
+    # Otherwise use the cached copy of the file
+    return _store.load()
 
 def save_api_key(name: str, value: str) -> bool:
     """
     Save an API key to the JSON file.
     """
-    api_keys_file = 'api_keys.json'
-    
-    try:
-        # Load existing keys
-        api_keys = load_api_keys()
-        
-        # Update with new key
+    def change(api_keys: Dict[str, str]) -> bool:
         api_keys[name] = value
-        api_keys["updated_at"] = datetime.now().isoformat()
-        
-        # Save to file
-        with open(api_keys_file, 'w') as f:
-            json.dump(api_keys, f)
-        
         return True
+
+    try:
+        return _store.update(change)
     except Exception as e:
-        print(f"Error saving API key: {str(e)}")
+        logger.error(f"Error saving API key: {str(e)}")
         return False
 
 def delete_api_key(name: str) -> bool:
     """
     Delete an API key from the JSON file.
     """
-    api_keys_file = 'api_keys.json'
-    
+    def change(api_keys: Dict[str, str]) -> bool:
+        if name not in api_keys:
+            return False
+        del api_keys[name]
+        return True
+
     try:
-        # Load existing keys
-        api_keys = load_api_keys()
-        
-        # Delete key if it exists
-        if name in api_keys:
-            del api_keys[name]
-            api_keys["updated_at"] = datetime.now().isoformat()
-            
-            # Save to file
-            with open(api_keys_file, 'w') as f:
-                json.dump(api_keys, f)
-            
-            return True
-        
-        return False
+        return _store.update(change)
     except Exception as e:
-        print(f"Error deleting API key: {str(e)}")
+        logger.error(f"Error deleting API key: {str(e)}")
         return False
 
 def get_api_key(name: str) -> Optional[str]:
@@ -84,7 +148,7 @@ def get_api_key(name: str) -> Optional[str]:
         env_key = os.environ.get('PERPLEXITY_API_KEY')
         if env_key:
             return env_key
-    
+
     # Otherwise check the file
     api_keys = load_api_keys()
     return api_keys.get(name)
@@ -0,0 +1,111 @@
+import os
+import zipfile
+import logging
+from typing import Dict, List, Any, Optional
+from werkzeug.utils import secure_filename
+from .benefit_extractor import BenefitExtractor
+from .extraction_cache import ExtractionCache
+from .pdf_document import get_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Largest uncompressed PDF accepted from a zip archive
+MAX_ZIP_MEMBER_BYTES = 64 * 1024 * 1024
+
+def _unique_path(folder: str, filename: str, used: set) -> str:
+    """Return a path in folder for filename that no other file in this batch uses."""
+    base, ext = os.path.splitext(filename)
+    candidate = filename
+    counter = 1
+    while candidate in used:
+        candidate = f"{base}_{counter}{ext}"
+        counter += 1
+    used.add(candidate)
+    return os.path.join(folder, candidate)
+
+def save_batch_files(pdf_files, zip_file, upload_folder: str,
+                     max_member_bytes: int = MAX_ZIP_MEMBER_BYTES) -> List[str]:
+    """
+    Save uploaded PDFs, and the PDFs inside an optional zip archive, to the
+    upload folder. Returns the saved paths in upload order.
+    """
+    paths = []
+    used = set()
+
+    for file in pdf_files:
+        if not file or not file.filename or not file.filename.lower().endswith('.pdf'):
+            continue
+        filename = secure_filename(file.filename)
+        if not filename:
+            continue
+        path = _unique_path(upload_folder, filename, used)
+        file.save(path)
+        paths.append(path)
+
+    if zip_file and zip_file.filename:
+        with zipfile.ZipFile(zip_file.stream) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith('.pdf'):
+                    continue
+                if member.file_size > max_member_bytes:
+                    logger.warning(f"Skipping {member.filename} in zip: {member.file_size} bytes is too large")
+                    continue
+                filename = secure_filename(os.path.basename(member.filename))
+                if not filename:
+                    continue
+                with archive.open(member) as source:
+                    data = source.read(max_member_bytes + 1)
+                if len(data) > max_member_bytes:
+                    logger.warning(f"Skipping {member.filename} in zip: too large")
+                    continue
+                path = _unique_path(upload_folder, filename, used)
+                with open(path, 'wb') as target:
+                    target.write(data)
+                paths.append(path)
+
+    return paths
+
+def extract_plan(pdf_path: str, cache: Optional[ExtractionCache] = None, snapshot: bool = False) -> Dict[str, Any]:
+    """
+    Extract the benefits of a single plan document.
+    Runs inside a pool worker, so it never starts a nested page pool.
+    """
+    filename = os.path.basename(pdf_path)
+    try:
+        extractor = BenefitExtractor(pdf_path, workers=0, cache=cache, snapshot=snapshot)
+        return {
+            "filename": filename,
+            "success": True,
+            "result": extractor.extract_benefits()
+        }
+    except Exception as e:
+        logger.error(f"Error extracting benefits from {filename}: {str(e)}")
+        return {
+            "filename": filename,
+            "success": False,
+            "error": str(e)
+        }
+
+def extract_plans(pdf_paths: List[str], workers: int = 0, cache: Optional[ExtractionCache] = None,
+                  snapshot: bool = False) -> List[Dict[str, Any]]:
+    """
+    Extract benefits from many plan documents concurrently on a process pool.
+    Results are returned in the same order as pdf_paths.
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        return [extract_plan(path, cache, snapshot) for path in pdf_paths]
+
+    pool = get_process_pool(workers)
+    futures = [pool.submit(extract_plan, path, cache, snapshot) for path in pdf_paths]
+    results = []
+    for path, future in zip(pdf_paths, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Batch worker failed on {path}: {str(e)}")
+            results.append({
+                "filename": os.path.basename(path),
+                "success": False,
+                "error": str(e)
+            })
+    return results
@@ -0,0 +1,218 @@
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from .excel_renderer import NOT_FOUND
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is only offered when pyarrow is installed
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Benefit fields in export column order; nested fields are dotted paths
+BENEFIT_FIELDS = [
+    "carrier_name",
+    "plan_name",
+    "network_type",
+    "network_name",
+    "deductible_type",
+    "deductible.individual_in_network",
+    "deductible.family_in_network",
+    "deductible.individual_out_network",
+    "deductible.family_out_network",
+    "coinsurance.in_network",
+    "coinsurance.out_network",
+    "out_of_pocket.individual_in_network",
+    "out_of_pocket.family_in_network",
+    "out_of_pocket.individual_out_network",
+    "out_of_pocket.family_out_network",
+    "office_visits.primary_care",
+    "office_visits.specialist",
+    "office_visits.urgent_care",
+    "office_visits.primary_care_out_network",
+    "office_visits.specialist_out_network",
+    "office_visits.urgent_care_out_network",
+    "emergency_room",
+    "preventive_services.in_network",
+    "preventive_services.out_network",
+    "outpatient_surgery",
+    "outpatient_surgery_out_network",
+    "hospitalization",
+    "hospitalization_out_network",
+    "imaging",
+    "imaging_out_network",
+    "prescription.deductible",
+    "prescription.tier_1",
+    "prescription.tier_2",
+    "prescription.tier_3",
+    "prescription.tier_4",
+    "prescription.tier_5",
+    "prescription.mail_order",
+    "member_website",
+    "customer_service",
+]
+
+# Fixed columnar schema: the source document, then one column per benefit field
+EXPORT_COLUMNS = ["source_file"] + [path.replace('.', '_') for path in BENEFIT_FIELDS]
+
+_FIELD_KEYS = [tuple(path.split('.')) for path in BENEFIT_FIELDS]
+
+FILE_EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+EXPORT_FORMATS = ['csv', 'jsonl'] + (['parquet'] if pyarrow is not None else [])
+
+# Rows per Parquet row group
+PARQUET_BATCH_ROWS = 1000
+
+# PDFs extracted at a time by the command line exporter
+EXTRACT_CHUNK = 32
+
+def _export_value(value: Any) -> Optional[str]:
+    """Column value: text, with missing and 'Not found' values as null."""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    text = str(value).strip()
+    if not text or text == NOT_FOUND:
+        return None
+    return text
+
+def _lookup(plan: Dict[str, Any], keys: tuple) -> Any:
+    value = plan
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def plan_row(plan: Dict[str, Any], source_file: Optional[str] = None) -> List[Optional[str]]:
+    """Flatten one plan's benefits dict into a row of EXPORT_COLUMNS."""
+    return [source_file] + [_export_value(_lookup(plan, keys)) for keys in _FIELD_KEYS]
+
+def plan_rows(results: Iterable[Dict[str, Any]]) -> Iterator[List[Optional[str]]]:
+    """
+    Rows for batch results ({"filename", "success", "result"}, failures
+    skipped) or bare benefits dicts, generated one at a time.
+    """
+    for entry in results:
+        if "success" in entry:
+            if not entry["success"]:
+                continue
+            yield plan_row(entry.get("result") or {}, entry.get("filename"))
+        else:
+            yield plan_row(entry)
+
+def write_csv(rows: Iterable[List[Optional[str]]], output_path: str) -> int:
+    count = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_jsonl(rows: Iterable[List[Optional[str]]], output_path: str) -> int:
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
+            count += 1
+    return count
+
+def _parquet_table(rows: List[List[Optional[str]]], schema) -> "pyarrow.Table":
+    return pyarrow.Table.from_arrays([list(column) for column in zip(*rows)], schema=schema)
+
+def write_parquet(rows: Iterable[List[Optional[str]]], output_path: str) -> int:
+    """Write rows as Parquet, one row group per PARQUET_BATCH_ROWS rows."""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = pyarrow.schema([(column, pyarrow.string()) for column in EXPORT_COLUMNS])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(output_path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                writer.write_table(_parquet_table(batch, schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(_parquet_table(batch, schema))
+            count += len(batch)
+    return count
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+def export_format_for(output_path: str) -> Optional[str]:
+    """Export format implied by a file extension, if any."""
+    extension = os.path.splitext(output_path)[1].lower()
+    for export_format, format_extension in FILE_EXTENSIONS.items():
+        if extension == format_extension:
+            return export_format
+    return None
+
+def export_plans(results: Iterable[Dict[str, Any]], output_path: str, export_format: Optional[str] = None) -> int:
+    """
+    Stream plans into a CSV, JSON Lines or Parquet file with the fixed
+    EXPORT_COLUMNS schema. The format defaults to the file extension.
+    Returns the number of plans written.
+    """
+    export_format = export_format or export_format_for(output_path)
+    if export_format not in EXPORT_FORMATS:
+        requested = export_format or os.path.splitext(output_path)[1] or output_path
+        raise ValueError(f"Unsupported export format: {requested} (available: {', '.join(EXPORT_FORMATS)})")
+    return WRITERS[export_format](plan_rows(results), output_path)
+
+def _load_json_results(path: str) -> List[Dict[str, Any]]:
+    """Results from a JSON file: batch output with "results", a list, or one benefits dict."""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        return data["results"]
+    if isinstance(data, list):
+        return data
+    return [data]
+
+def _iter_inputs(inputs: List[str], workers: int, cache=None) -> Iterator[Dict[str, Any]]:
+    """Batch results for the given PDFs, folders of PDFs and JSON result files, in chunks."""
+    from .batch_extractor import extract_plans
+
+    pdf_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            pdf_paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                             if name.lower().endswith('.pdf'))
+        elif path.lower().endswith('.json'):
+            yield from _load_json_results(path)
+        else:
+            pdf_paths.append(path)
+
+    for start in range(0, len(pdf_paths), EXTRACT_CHUNK):
+        yield from extract_plans(pdf_paths[start:start + EXTRACT_CHUNK], workers=workers, cache=cache)
+
+if __name__ == '__main__':
+    # Export a folder of plans: python -m utils.benefit_export uploads/ --out plans.csv
+    from .extraction_cache import ExtractionCache
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export extracted plan benefits as CSV, JSON Lines or Parquet")
+    parser.add_argument('inputs', nargs='+', help="plan PDFs, folders of PDFs, or JSON results (e.g. from utils.ai_batch)")
+    parser.add_argument('--out', required=True, help="output file; the extension picks the format")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, help="override the format implied by --out")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes extracting PDFs")
+    args = parser.parse_args()
+
+    try:
+        count = export_plans(_iter_inputs(args.inputs, args.workers, ExtractionCache()), args.out, args.format)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Exported {count} plans to {args.out}")
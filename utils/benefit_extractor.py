@@ -1,506 +1,510 @@
 import os
 import re
 import PyPDF2
-import pdfplumber
 import pandas as pd
 import logging
 from typing import Dict, List, Any, Optional, Tuple, Union
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
+from datetime import datetime
+from .pdf_document import PDFDocument, PAGE_SEPARATOR
+from .extraction_cache import ExtractionCache, file_digest
+from .page_snapshot import load_or_build_snapshot
+from .template_cache import TemplateCache
+from .excel_renderer import (
+    Cell, PlanContext, Rule, Formatter, field, const, amount, percent, carrier, after_deductible, format_benefit,
+    render_workbook, PLAN_COLUMN, IN_NETWORK_COLUMN, OUT_NETWORK_COLUMN, NOT_FOUND, PLAN_EXPLANATION,
+    COPAY_PATTERN, SKIP
+)
 
 logger = logging.getLogger(__name__)
 
+BENEFIT_AMOUNT_PATTERN = re.compile(r'\$[\d,]+(?:\.\d+)?|\d+%|covered 100%|not covered')
+PERCENTAGE_PATTERN = re.compile(r'(\d+(?:\.\d+)?%)')
+MAX_VALUE_CHARS = 32
+PHONE_DIGIT_PATTERN = re.compile(r'\d')
+
+def _find_after_keywords(text: str, keywords: List[str], value_pattern, window_chars: int):
+    """
+    Return the first value_pattern match within window_chars after a keyword.
+
+    Keyword occurrences are located with a plain word-bounded search and each
+    is followed by a bounded forward window, so there is no backtracking over
+    the whole document. Regions already scanned without a match are not
+    scanned again, which keeps the total work linear in the text length.
+    """
+    for keyword in keywords:
+        # Leading with the literal keeps the regex engine's fast literal search;
+        # the leading word boundary is checked by hand below
+        keyword_pattern = re.compile(re.escape(keyword.lower()) + r'\b')
+        scanned_to = 0
+        for keyword_match in keyword_pattern.finditer(text):
+            start = keyword_match.start()
+            if start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+                continue
+            window_start = max(keyword_match.end(), scanned_to)
+            window_end = min(len(text), keyword_match.end() + window_chars)
+            if window_start >= window_end:
+                continue
+            # Let a value that starts inside the window run past its end
+            match = value_pattern.search(text, window_start, window_end + MAX_VALUE_CHARS)
+            if match and match.start() < window_end:
+                return value_pattern.match(text, match.start())
+            scanned_to = window_end
+    return None
+
 def find_benefit(text: str, keywords: List[str], context_chars: int = 200) -> str:
     """
     Find a benefit value in the text based on keywords.
-    Returns the first match, surrounded by context.
+    Returns the first dollar amount, percentage or coverage phrase found
+    within context_chars after a keyword.
     """
     text = text.lower()
-    for keyword in keywords:
-        pattern = r'(?i)(?:.*?)\b' + re.escape(keyword.lower()) + r'\b(.*?)(?:\$[\d,]+(?:\.\d+)?|(?:\d+)%|not covered|covered 100%)'
-        match = re.search(pattern, text, re.DOTALL)
-        if match:
-            start_pos = max(0, match.start() - context_chars)
-            end_pos = min(len(text), match.end() + context_chars)
-            context = text[start_pos:end_pos]
-            
-            # Find the dollar amount or percentage in the context
-            amount_match = re.search(r'\$[\d,]+(?:\.\d+)?|\d+%|covered 100%|not covered', context, re.IGNORECASE)
-            if amount_match:
-                return amount_match.group(0)
+    match = _find_after_keywords(text, keywords, BENEFIT_AMOUNT_PATTERN, context_chars)
+    if match:
+        return match.group(0)
     
     return "Not found"
 
-def find_percentage(text: str, keywords: List[str]) -> str:
+def find_percentage(text: str, keywords: List[str], context_chars: int = 200) -> str:
     """
     Find a percentage value in the text based on keywords.
     """
     text = text.lower()
-    for keyword in keywords:
-        pattern = r'(?i)(?:.*?)\b' + re.escape(keyword.lower()) + r'\b.*?(\d+(?:\.\d+)?%)'
-        match = re.search(pattern, text, re.DOTALL)
-        if match:
-            return match.group(1)
+    match = _find_after_keywords(text, keywords, PERCENTAGE_PATTERN, context_chars)
+    if match:
+        return match.group(1)
     
     return "Not found"
 
-def create_benefit_excel(data: Dict[str, Any], output_path: str) -> bool:
-    """Create an Excel file with the extracted benefits."""
-    try:
-        # Check if we're updating an existing template or creating a new file
-        try:
-            workbook = openpyxl.load_workbook(output_path)
-            sheet = workbook["HEALTH"]
-        except (FileNotFoundError, KeyError):
-            # Create a new file with the required structure
-            workbook = openpyxl.Workbook()
-            sheet = workbook.active
-            sheet.title = "HEALTH"
-            
-            # Set up basic structure and headers for the template
-            sheet['A1'] = "ITEM"
-            sheet['B1'] = "FEATURE"
-            sheet['C1'] = "DESCRIPTION"
-            sheet['D1'] = "Plan 1"
-            sheet['E1'] = "In Network"
-            sheet['F1'] = "Out of Network"
-            sheet['G1'] = "Plan 2"
-            sheet['H1'] = "In Network"
-            sheet['I1'] = "Out of Network"
-            
-            # Set up row labels
-            sheet['A4'] = "Carrier Name"
-            sheet['A5'] = "Plan Name"
-            sheet['A6'] = "Page Name"
-            sheet['A7'] = "Plan Explanation"
-            sheet['A9'] = "Single Deductible"
-            sheet['A10'] = "Family Deductible"
-            sheet['A12'] = "Coinsurance"
-            sheet['A14'] = "Single Out of Pocket Max"
-            sheet['A15'] = "Family Out of Pocket Max"
-            sheet['A17'] = "Primary Care Office Visit"
-            sheet['A18'] = "Specialist Office Visit"
-            sheet['A19'] = "Urgent Care"
-            sheet['A20'] = "Emergency Room"
-            sheet['A22'] = "Preventive Services"
-            sheet['A24'] = "Outpatient Surgery"
-            sheet['A25'] = "Inpatient Hospitalization"
-            sheet['A26'] = "CT Scan, PT Scan, MRI"
-            sheet['A27'] = "Hospital Newborn Delivery"
-            sheet['A29'] = "Prescription Deductible"
-            sheet['A30'] = "Generic (Tier 1)"
-            sheet['A31'] = "Brand Name (Tier 2)"
-            sheet['A32'] = "Non-Preferred (Tier 3)"
-            sheet['A33'] = "Specialty (Tier 4)"
-            sheet['A34'] = "Specialty (Tier 5)"
-            sheet['A35'] = "Mail Order (90 day supply)"
-            sheet['A37'] = "Plan Year"
-            sheet['A38'] = "Deductible Period"
-            sheet['A39'] = "Deductible Explanation"
-            sheet['A40'] = "Network Type"
-            sheet['A41'] = "Network Name"
-            sheet['A42'] = "Member Website"
-            sheet['A43'] = "Customer Service Phone"
-        
-        # Find the next available plan column (D, G, J, etc.)
-        next_plan_col = None
-        for col_idx in range(4, sheet.max_column + 1, 3):  # Start from column D (index 4)
-            col_letter = openpyxl.utils.get_column_letter(col_idx)
-            if not sheet[f'{col_letter}4'].value:  # Check carrier name cell
-                next_plan_col = col_idx
-                break
-        
-        if next_plan_col is None:
-            # All slots are full, add a new plan column
-            next_plan_col = sheet.max_column + 1
-            
-            # Add header for the new plan
-            plan_header_cell = sheet.cell(row=1, column=next_plan_col)
-            plan_header_cell.value = f"Plan {(next_plan_col - 1) // 3}"
-            
-            # Add In Network and Out of Network headers
-            in_network_cell = sheet.cell(row=1, column=next_plan_col + 1)
-            in_network_cell.value = "In Network"
-            
-            out_network_cell = sheet.cell(row=1, column=next_plan_col + 2)
-            out_network_cell.value = "Out of Network"
-        
-        # Convert column index to letter
-        col_letter = openpyxl.utils.get_column_letter(next_plan_col)
-        in_col_letter = openpyxl.utils.get_column_letter(next_plan_col + 1)
-        out_col_letter = openpyxl.utils.get_column_letter(next_plan_col + 2)
-        
-        # Get the results from the data
-        result = data
-        if "results" in data and len(data["results"]) > 0:
-            result = data["results"][0]
-        
-        # Fill in plan information
-        sheet[f'{col_letter}4'] = result.get("carrier_name", "Unknown")
-        sheet[f'{col_letter}5'] = result.get("plan_name", "Unknown")
-        sheet[f'{col_letter}6'] = "Health Insurance"
-        sheet[f'{col_letter}7'] = "Health insurance provides financial protection against medical costs. It helps employees access necessary healthcare while minimizing out-of-pocket expenses."
-        
-        # Determine if plan is HSA
-        is_hsa_plan = "HSA" in result.get("plan_name", "").upper()
-        
-        # Extract deductible values (numbers only for the spreadsheet)
-        in_deductible = result.get("deductible", {}).get("individual_in_network", "")
-        out_deductible = result.get("deductible", {}).get("individual_out_network", "")
-        
-        # Extract just the number from the deductible strings
-        in_deductible_num = re.search(r'\$?([\d,]+)', in_deductible)
-        out_deductible_num = re.search(r'\$?([\d,]+)', out_deductible)
-        
-        # Fill deductibles (numbers only)
-        sheet[f'{in_col_letter}9'] = in_deductible_num.group(1).replace(',', '') if in_deductible_num else ""
-        sheet[f'{out_col_letter}9'] = out_deductible_num.group(1).replace(',', '') if out_deductible_num else ""
-        
-        # Family deductibles
-        in_family_deductible = result.get("deductible", {}).get("family_in_network", "")
-        out_family_deductible = result.get("deductible", {}).get("family_out_network", "")
-        
-        # Extract just the number from the family deductible strings
-        in_family_deductible_num = re.search(r'\$?([\d,]+)', in_family_deductible)
-        out_family_deductible_num = re.search(r'\$?([\d,]+)', out_family_deductible)
-        
-        # Fill family deductibles (numbers only)
-        sheet[f'{in_col_letter}10'] = in_family_deductible_num.group(1).replace(',', '') if in_family_deductible_num else ""
-        sheet[f'{out_col_letter}10'] = out_family_deductible_num.group(1).replace(',', '') if out_family_deductible_num else ""
-        
-        # Coinsurance (numbers only)
-        in_coinsurance = result.get("coinsurance", {}).get("in_network", "")
-        out_coinsurance = result.get("coinsurance", {}).get("out_network", "")
-        
-        # Extract just the number from coinsurance strings
-        in_coinsurance_num = re.search(r'(\d+)%', in_coinsurance)
-        out_coinsurance_num = re.search(r'(\d+)%', out_coinsurance)
-        
-        # Fill coinsurance (numbers only)
-        sheet[f'{in_col_letter}12'] = in_coinsurance_num.group(1) if in_coinsurance_num else ""
-        sheet[f'{out_col_letter}12'] = out_coinsurance_num.group(1) if out_coinsurance_num else ""
-        
-        # Out of pocket max (numbers only)
-        in_oop = result.get("out_of_pocket", {}).get("individual_in_network", "")
-        out_oop = result.get("out_of_pocket", {}).get("individual_out_network", "")
-        
-        # Extract just the number from OOP strings
-        in_oop_num = re.search(r'\$?([\d,]+)', in_oop)
-        out_oop_num = re.search(r'\$?([\d,]+)', out_oop)
-        
-        # Fill OOP (numbers only)
-        sheet[f'{in_col_letter}14'] = in_oop_num.group(1).replace(',', '') if in_oop_num else ""
-        sheet[f'{out_col_letter}14'] = out_oop_num.group(1).replace(',', '') if out_oop_num else ""
-        
-        # Family OOP (numbers only)
-        in_family_oop = result.get("out_of_pocket", {}).get("family_in_network", "")
-        out_family_oop = result.get("out_of_pocket", {}).get("family_out_network", "")
-        
-        # Extract just the number from family OOP strings
-        in_family_oop_num = re.search(r'\$?([\d,]+)', in_family_oop)
-        out_family_oop_num = re.search(r'\$?([\d,]+)', out_family_oop)
-        
-        # Fill family OOP (numbers only)
-        sheet[f'{in_col_letter}15'] = in_family_oop_num.group(1).replace(',', '') if in_family_oop_num else ""
-        sheet[f'{out_col_letter}15'] = out_family_oop_num.group(1).replace(',', '') if out_family_oop_num else ""
-        
-        # Doctor visits - PCP
-        primary_care = result.get("office_visits", {}).get("primary_care", "Not found")
-        if primary_care != "Not found":
-            # Format according to rules
-            if re.match(r'^\$\d+$', primary_care):
-                # For HSA plans, add "after deductible" to copay amounts
-                if is_hsa_plan:
-                    primary_care = f"{primary_care} after deductible"
-            elif re.match(r'^\d+%$', primary_care):
-                # Add "after deductible" to percentage amounts
-                primary_care = f"{primary_care} after deductible"
-        
-        # Out of network PCP - usually from tables or estimated from coinsurance
-        out_network_pcp = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}17'] = primary_care
-        sheet[f'{out_col_letter}17'] = out_network_pcp
-        
-        # Specialist visits
-        specialist = result.get("office_visits", {}).get("specialist", "Not found")
-        if specialist != "Not found":
-            # Format according to rules
-            if re.match(r'^\$\d+$', specialist):
-                # For HSA plans, add "after deductible" to copay amounts
-                if is_hsa_plan:
-                    specialist = f"{specialist} after deductible"
-            elif re.match(r'^\d+%$', specialist):
-                # Add "after deductible" to percentage amounts
-                specialist = f"{specialist} after deductible"
-        
-        # Out of network specialist
-        out_network_specialist = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}18'] = specialist
-        sheet[f'{out_col_letter}18'] = out_network_specialist
-        
-        # Urgent care
-        urgent_care = result.get("office_visits", {}).get("urgent_care", "Not found")
-        if urgent_care != "Not found":
-            # Format according to rules
-            if re.match(r'^\$\d+$', urgent_care):
-                # For HSA plans, add "after deductible" to copay amounts
-                if is_hsa_plan:
-                    urgent_care = f"{urgent_care} after deductible"
-            elif re.match(r'^\d+%$', urgent_care):
-                # Add "after deductible" to percentage amounts
-                urgent_care = f"{urgent_care} after deductible"
-        
-        # Out of network urgent care
-        out_network_urgent = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}19'] = urgent_care
-        sheet[f'{out_col_letter}19'] = out_network_urgent
-        
-        # Emergency room (same for in and out of network)
-        emergency_room = result.get("emergency_room", "Not found")
-        if emergency_room != "Not found":
-            # Format according to rules
-            if re.match(r'^\$\d+$', emergency_room):
-                # For HSA plans, add "after deductible" to copay amounts
-                if is_hsa_plan:
-                    emergency_room = f"{emergency_room} after deductible"
-            elif re.match(r'^\d+%$', emergency_room):
-                # Add "after deductible" to percentage amounts
-                emergency_room = f"{emergency_room} after deductible"
-        
-        sheet[f'{in_col_letter}20'] = emergency_room
-        sheet[f'{out_col_letter}20'] = emergency_room  # Same as in-network per requirements
-        
-        # Preventive services (0% for in-network)
-        sheet[f'{in_col_letter}22'] = "0%"
-        sheet[f'{out_col_letter}22'] = "50% after deductible"  # Default if not found
-        
-        # Outpatient surgery
-        outpatient_surgery = result.get("outpatient_surgery", "Not found")
-        if outpatient_surgery != "Not found":
-            # Check for freestanding vs hospital format
-            if "Freestanding:" in outpatient_surgery:
-                # Already formatted correctly
-                pass
-            else:
-                # Format according to rules
-                if re.match(r'^\$\d+$', outpatient_surgery):
-                    # For HSA plans, add "after deductible" to copay amounts
-                    if is_hsa_plan:
-                        outpatient_surgery = f"{outpatient_surgery} after deductible"
-                elif re.match(r'^\d+%$', outpatient_surgery):
-                    # Add "after deductible" to percentage amounts
-                    outpatient_surgery = f"{outpatient_surgery} after deductible"
-        
-        # Out of network outpatient surgery
-        out_network_surgery = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}24'] = outpatient_surgery
-        sheet[f'{out_col_letter}24'] = out_network_surgery
-        
-        # Inpatient hospitalization
-        hospitalization = result.get("hospitalization", "Not found")
-        if hospitalization != "Not found":
-            # Check for per occurrence format
-            if "then" in hospitalization:
-                # Already formatted correctly
-                pass
-            else:
-                # Format according to rules
-                if re.match(r'^\$\d+$', hospitalization):
-                    # For HSA plans, add "after deductible" to copay amounts
-                    if is_hsa_plan:
-                        hospitalization = f"{hospitalization} after deductible"
-                elif re.match(r'^\d+%$', hospitalization):
-                    # Add "after deductible" to percentage amounts
-                    hospitalization = f"{hospitalization} after deductible"
-        
-        # Out of network hospitalization
-        out_network_hosp = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}25'] = hospitalization
-        sheet[f'{out_col_letter}25'] = out_network_hosp
-        
-        # CT/MRI/PT Scans
-        imaging = result.get("imaging", "Not found")
-        if imaging != "Not found":
-            # Check for freestanding vs hospital format
-            if "Freestanding:" in imaging:
-                # Already formatted correctly
-                pass
-            else:
-                # Format according to rules
-                if re.match(r'^\$\d+$', imaging):
-                    # For HSA plans, add "after deductible" to copay amounts
-                    if is_hsa_plan:
-                        imaging = f"{imaging} after deductible"
-                elif re.match(r'^\d+%$', imaging):
-                    # Add "after deductible" to percentage amounts
-                    imaging = f"{imaging} after deductible"
-        
-        # Out of network imaging
-        out_network_imaging = "50% after deductible"  # Default if not found
-        
-        sheet[f'{in_col_letter}26'] = imaging
-        sheet[f'{out_col_letter}26'] = out_network_imaging
-        
-        # Hospital newborn delivery (same as hospitalization per requirements)
-        sheet[f'{in_col_letter}27'] = hospitalization
-        sheet[f'{out_col_letter}27'] = out_network_hosp
-        
-        # Prescription benefits
-        if "prescription" in result:
-            rx_benefits = result.get("prescription", {})
-            
-            # Prescription deductible
-            rx_deductible = rx_benefits.get("deductible", "")
-            if rx_deductible:
-                sheet[f'{in_col_letter}29'] = rx_deductible
-                sheet[f'{out_col_letter}29'] = rx_deductible
-            
-            # Generic (Tier 1)
-            generic = rx_benefits.get("tier_1", "")
-            if generic:
-                if is_hsa_plan and re.match(r'^\$\d+$', generic):
-                    generic = f"{generic} after deductible"
-                sheet[f'{in_col_letter}30'] = generic
-                sheet[f'{out_col_letter}30'] = "Not covered"
-            
-            # Brand (Tier 2)
-            brand = rx_benefits.get("tier_2", "")
-            if brand:
-                if is_hsa_plan and re.match(r'^\$\d+$', brand):
-                    brand = f"{brand} after deductible"
-                sheet[f'{in_col_letter}31'] = brand
-                sheet[f'{out_col_letter}31'] = "Not covered"
-            
-            # Non-preferred (Tier 3)
-            non_preferred = rx_benefits.get("tier_3", "")
-            if non_preferred:
-                if is_hsa_plan and re.match(r'^\$\d+$', non_preferred):
-                    non_preferred = f"{non_preferred} after deductible"
-                sheet[f'{in_col_letter}32'] = non_preferred
-                sheet[f'{out_col_letter}32'] = "Not covered"
-            
-            # Specialty (Tier 4)
-            specialty = rx_benefits.get("tier_4", "")
-            if specialty:
-                if is_hsa_plan and re.match(r'^\$\d+$', specialty):
-                    specialty = f"{specialty} after deductible"
-                sheet[f'{in_col_letter}33'] = specialty
-                sheet[f'{out_col_letter}33'] = "Not covered"
-            
-            # Specialty (Tier 5)
-            specialty5 = rx_benefits.get("tier_5", "")
-            if specialty5:
-                if is_hsa_plan and re.match(r'^\$\d+$', specialty5):
-                    specialty5 = f"{specialty5} after deductible"
-                sheet[f'{in_col_letter}34'] = specialty5
-                sheet[f'{out_col_letter}34'] = "Not covered"
-            
-            # Mail order
-            mail_order = rx_benefits.get("mail_order", "")
-            if mail_order:
-                if is_hsa_plan and not "after deductible" in mail_order:
-                    # Add to each cost in the tier list
-                    mail_order_parts = mail_order.split("/")
-                    formatted_parts = []
-                    for part in mail_order_parts:
-                        part = part.strip()
-                        if re.match(r'^\$\d+$', part):
-                            formatted_parts.append(f"{part} after deductible")
-                        else:
-                            formatted_parts.append(part)
-                    mail_order = " / ".join(formatted_parts)
-                sheet[f'{in_col_letter}35'] = mail_order
-                sheet[f'{out_col_letter}35'] = "Not covered"
-        
-        # Additional plan information
-        from datetime import datetime
-        current_year = datetime.now().year
-        
-        sheet[f'{in_col_letter}37'] = str(current_year)
-        sheet[f'{in_col_letter}38'] = "Calendar Year: January 1st – December 31st"
-        
-        # Deductible explanation
-        deductible_type = "Embedded"  # Default
-        if "Aggregate" in self.text or "aggregate" in self.text:
-            deductible_type = "Aggregate"
-        sheet[f'{in_col_letter}39'] = deductible_type
-        
-        # Network type
-        network_type = "PPO"  # Default
-        for network in ["PPO", "HMO", "EPO", "POS"]:
-            if network in result.get("plan_name", "") or network in self.text:
-                network_type = network
-                break
-        sheet[f'{in_col_letter}40'] = network_type
-        
-        # Network name (often next to network type)
-        network_name_match = re.search(r'(?i)(?:network|network name|provider network)[\s:]+([A-Za-z0-9\s\-]+)', self.text)
-        network_name = network_name_match.group(1).strip() if network_name_match else ""
-        sheet[f'{in_col_letter}41'] = network_name
-        
-        # Member website
-        website_match = re.search(r'(?i)(?:website|member website|web)[\s:]+([A-Za-z0-9\s\-\.\/:]+\.[a-z]{2,})', self.text)
-        website = website_match.group(1).strip() if website_match else ""
-        if not website:
-            # Try to find URLs
-            url_match = re.search(r'(?i)((?:https?:\/\/)?(?:www\.)?[a-zA-Z0-9-]+(?:\.[a-zA-Z]{2,})+(?:\/[a-zA-Z0-9-_.]+)*)', self.text)
-            website = url_match.group(1) if url_match else ""
-        sheet[f'{in_col_letter}42'] = website
-        
-        # Customer service phone
-        phone_match = re.search(r'(?i)(?:customer service|phone|call|contact)[\s:]+(?:\d{1,2}-?)?(?:\d{3})[\s\.-]+(?:\d{3})[\s\.-]+(?:\d{4})', self.text)
-        phone = phone_match.group(0) if phone_match else ""
-        if not phone:
-            # Try a simpler pattern for phone numbers
-            phone_match = re.search(r'(?i)(?:\d{1,2}-?)?(?:\d{3})[\s\.-]+(?:\d{3})[\s\.-]+(?:\d{4})', self.text)
-            phone = phone_match.group(0) if phone_match else ""
-        
-        # Format the phone number
-        if phone:
-            # Extract just the digits
-            digits = re.findall(r'\d', phone)
-            if len(digits) >= 10:
-                # Format as XXX-XXX-XXXX
-                start_idx = 0 if len(digits) == 10 else len(digits) - 10
-                phone = f"{digits[start_idx]}{digits[start_idx+1]}{digits[start_idx+2]}-{digits[start_idx+3]}{digits[start_idx+4]}{digits[start_idx+5]}-{digits[start_idx+6]}{digits[start_idx+7]}{digits[start_idx+8]}{digits[start_idx+9]}"
-        
-        sheet[f'{in_col_letter}43'] = phone
-        
-        # Save workbook
-        workbook.save(output_path)
-        return True
-    
-    except Exception as e:
-        logger.error(f"Error creating Excel file: {str(e)}")
-        return False
+def _standard_benefit(value: Any, ctx: PlanContext) -> Any:
+    """Copays are 'after deductible' on HSA plans, percentages always; anything else as written."""
+    if not value or value == NOT_FOUND:
+        return value
+    return format_benefit(value, ctx)
+
+def _rx_tier(value: Any, ctx: PlanContext) -> Any:
+    if not value:
+        return SKIP
+    if ctx.is_hsa and COPAY_PATTERN.match(str(value)):
+        return after_deductible(value)
+    return value
+
+def _rx_mail_order(value: Any, ctx: PlanContext) -> Any:
+    """Mail order tiers, each copay 'after deductible' on HSA plans."""
+    if not value:
+        return SKIP
+    if ctx.is_hsa and "after deductible" not in str(value):
+        parts = [part.strip() for part in str(value).split("/")]
+        return " / ".join(after_deductible(part) if COPAY_PATTERN.match(part) else part for part in parts)
+    return value
+
+def _rx_value(formatter: Formatter) -> Formatter:
+    """Prescription rows are only written when the plan lists prescription benefits."""
+    def rule(value: Any, ctx: PlanContext) -> Any:
+        if not ctx.has("prescription"):
+            return SKIP
+        return formatter(value, ctx)
+    return rule
+
+def _rx_out_network(tier: str) -> Rule:
+    """Out-of-network prescriptions are not covered, for every tier the plan lists."""
+    keys = ("prescription", tier)
+    return lambda ctx: "Not covered" if ctx.has("prescription") and ctx.get(keys) else SKIP
+
+def _network_type(value: Any, ctx: PlanContext) -> str:
+    if value:
+        return value
+    plan_name = str(ctx.get(("plan_name",), "") or "")
+    for network in ("PPO", "HMO", "EPO", "POS"):
+        if network in plan_name:
+            return network
+    return "PPO"  # Default
+
+def _phone(value: Any, ctx: PlanContext) -> str:
+    """Format a phone number as XXX-XXX-XXXX, keeping the last ten digits."""
+    if not value:
+        return ""
+    digits = PHONE_DIGIT_PATTERN.findall(str(value))
+    if len(digits) < 10:
+        return value
+    digits = digits[-10:]
+    return f"{''.join(digits[:3])}-{''.join(digits[3:6])}-{''.join(digits[6:])}"
+
+_rx_deductible = _rx_value(lambda value, ctx: value if value else SKIP)
+
+# Standard benefits workbook: (row, column offset within the plan, value rule)
+STANDARD_LAYOUT = [
+    # Plan information
+    Cell(4, PLAN_COLUMN, field("carrier_name", carrier)),
+    Cell(5, PLAN_COLUMN, field("plan_name", default="Unknown")),
+    Cell(6, PLAN_COLUMN, const("Health Insurance")),
+    Cell(7, PLAN_COLUMN, const(PLAN_EXPLANATION)),
+
+    # Deductibles, coinsurance and out of pocket maximums (numbers only)
+    Cell(9, IN_NETWORK_COLUMN, field("deductible.individual_in_network", amount, default="")),
+    Cell(9, OUT_NETWORK_COLUMN, field("deductible.individual_out_network", amount, default="")),
+    Cell(10, IN_NETWORK_COLUMN, field("deductible.family_in_network", amount, default="")),
+    Cell(10, OUT_NETWORK_COLUMN, field("deductible.family_out_network", amount, default="")),
+    Cell(12, IN_NETWORK_COLUMN, field("coinsurance.in_network", percent, default="")),
+    Cell(12, OUT_NETWORK_COLUMN, field("coinsurance.out_network", percent, default="")),
+    Cell(14, IN_NETWORK_COLUMN, field("out_of_pocket.individual_in_network", amount, default="")),
+    Cell(14, OUT_NETWORK_COLUMN, field("out_of_pocket.individual_out_network", amount, default="")),
+    Cell(15, IN_NETWORK_COLUMN, field("out_of_pocket.family_in_network", amount, default="")),
+    Cell(15, OUT_NETWORK_COLUMN, field("out_of_pocket.family_out_network", amount, default="")),
+
+    # Office visits; out of network defaults when not found
+    Cell(17, IN_NETWORK_COLUMN, field("office_visits.primary_care", _standard_benefit)),
+    Cell(17, OUT_NETWORK_COLUMN, const("50% after deductible")),
+    Cell(18, IN_NETWORK_COLUMN, field("office_visits.specialist", _standard_benefit)),
+    Cell(18, OUT_NETWORK_COLUMN, const("50% after deductible")),
+    Cell(19, IN_NETWORK_COLUMN, field("office_visits.urgent_care", _standard_benefit)),
+    Cell(19, OUT_NETWORK_COLUMN, const("50% after deductible")),
+
+    # Emergency room is the same for in and out of network
+    Cell(20, IN_NETWORK_COLUMN, field("emergency_room", _standard_benefit)),
+    Cell(20, OUT_NETWORK_COLUMN, field("emergency_room", _standard_benefit)),
+
+    # Preventive services (0% for in-network)
+    Cell(22, IN_NETWORK_COLUMN, const("0%")),
+    Cell(22, OUT_NETWORK_COLUMN, const("50% after deductible")),
+
+    # Facility services; hospital newborn delivery is the same as hospitalization
+    Cell(24, IN_NETWORK_COLUMN, field("outpatient_surgery", _standard_benefit)),
+    Cell(24, OUT_NETWORK_COLUMN, const("50% after deductible")),
+    Cell(25, IN_NETWORK_COLUMN, field("hospitalization", _standard_benefit)),
+    Cell(25, OUT_NETWORK_COLUMN, const("50% after deductible")),
+    Cell(26, IN_NETWORK_COLUMN, field("imaging", _standard_benefit)),
+    Cell(26, OUT_NETWORK_COLUMN, const("50% after deductible")),
+    Cell(27, IN_NETWORK_COLUMN, field("hospitalization", _standard_benefit)),
+    Cell(27, OUT_NETWORK_COLUMN, const("50% after deductible")),
+
+    # Prescriptions, written only for the values the plan lists
+    Cell(29, IN_NETWORK_COLUMN, field("prescription.deductible", _rx_deductible, default="")),
+    Cell(29, OUT_NETWORK_COLUMN, field("prescription.deductible", _rx_deductible, default="")),
+    Cell(30, IN_NETWORK_COLUMN, field("prescription.tier_1", _rx_value(_rx_tier), default="")),
+    Cell(30, OUT_NETWORK_COLUMN, _rx_out_network("tier_1")),
+    Cell(31, IN_NETWORK_COLUMN, field("prescription.tier_2", _rx_value(_rx_tier), default="")),
+    Cell(31, OUT_NETWORK_COLUMN, _rx_out_network("tier_2")),
+    Cell(32, IN_NETWORK_COLUMN, field("prescription.tier_3", _rx_value(_rx_tier), default="")),
+    Cell(32, OUT_NETWORK_COLUMN, _rx_out_network("tier_3")),
+    Cell(33, IN_NETWORK_COLUMN, field("prescription.tier_4", _rx_value(_rx_tier), default="")),
+    Cell(33, OUT_NETWORK_COLUMN, _rx_out_network("tier_4")),
+    Cell(34, IN_NETWORK_COLUMN, field("prescription.tier_5", _rx_value(_rx_tier), default="")),
+    Cell(34, OUT_NETWORK_COLUMN, _rx_out_network("tier_5")),
+    Cell(35, IN_NETWORK_COLUMN, field("prescription.mail_order", _rx_value(_rx_mail_order), default="")),
+    Cell(35, OUT_NETWORK_COLUMN, _rx_out_network("mail_order")),
+
+    # Additional plan information, from the plan's fields when present
+    Cell(37, IN_NETWORK_COLUMN, lambda ctx: str(datetime.now().year)),
+    Cell(38, IN_NETWORK_COLUMN, const("Calendar Year: January 1st – December 31st")),
+    Cell(39, IN_NETWORK_COLUMN, field("deductible_type", lambda value, ctx: value or "Embedded", default="")),
+    Cell(40, IN_NETWORK_COLUMN, field("network_type", _network_type, default="")),
+    Cell(41, IN_NETWORK_COLUMN, field("network_name", lambda value, ctx: value or "", default="")),
+    Cell(42, IN_NETWORK_COLUMN, field("member_website", lambda value, ctx: value or "", default="")),
+    Cell(43, IN_NETWORK_COLUMN, field("customer_service", _phone, default="")),
+]
+
+def create_benefit_excel(data: Dict[str, Any], output_path: str, template_path: Optional[str] = None,
+                         template_cache: Optional[TemplateCache] = None) -> bool:
+    """Create an Excel file with the extracted benefits, in a copy of template_path if given."""
+    return render_workbook([data], output_path, STANDARD_LAYOUT, template_path, template_cache)
+
+# Anchor keywords located in a single pass over the document text. Every
+# field pattern below starts with one of these anchors and its open-ended
+# parts are [^\n]* runs, so a field only has to be resolved in the bounded
+# window from each of its anchors to the end of that line.
+ANCHOR_PATTERNS = {
+    'individual': r'Individual',
+    'family': r'Family',
+    'oop_limit': r'Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum)',
+    'coinsurance': r'Co(?:\-|\s)?insurance',
+    'primary_care': r'Primary\s*Care|PCP',
+    'specialist': r'Specialist',
+    'urgent_care': r'Urgent\s*Care',
+    'emergency': r'Emergency\s*(?:Room|Department|Care|Services)|ER\s*Visit',
+    'hospital': r'Hospital|Inpatient',
+}
+
+ANCHOR_SCANNER = re.compile(
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in ANCHOR_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+IN_NETWORK = r'(?:In[\s\-]*Network|Network)'
+OUT_NETWORK = r'(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)'
+OOP_LIMIT = r'Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum)'
+
+# Field patterns in priority order: (anchors the pattern can start at, pattern).
+# Each pattern is only ever matched at its anchor positions.
+FIELD_PATTERNS = {
+    'deductible.individual_in_network': [
+        (('individual',), r'Individual[^\n]*' + IN_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+        (('individual',), r'Individual\s*(?:Deductible|Annual\s*Deductible)[^\n]*?(\$[\d,]+)'),
+    ],
+    'deductible.family_in_network': [
+        (('family',), r'Family[^\n]*' + IN_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+        (('family',), r'Family\s*(?:Deductible|Annual\s*Deductible)[^\n]*?(\$[\d,]+)'),
+    ],
+    'deductible.individual_out_network': [
+        (('individual',), r'Individual[^\n]*' + OUT_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+    ],
+    'deductible.family_out_network': [
+        (('family',), r'Family[^\n]*' + OUT_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+    ],
+    'out_of_pocket.individual_in_network': [
+        (('individual', 'oop_limit'), r'(?:Individual|' + OOP_LIMIT + r')[^\n]*' + IN_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+        (('individual',), r'Individual\s*(?:Out[\s\-]*of[\s\-]*Pocket|OOP)[^\n]*?(\$[\d,]+)'),
+    ],
+    'out_of_pocket.family_in_network': [
+        (('family', 'oop_limit'), r'(?:Family|' + OOP_LIMIT + r')[^\n]*' + IN_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+        (('family',), r'Family\s*(?:Out[\s\-]*of[\s\-]*Pocket|OOP)[^\n]*?(\$[\d,]+)'),
+    ],
+    'out_of_pocket.individual_out_network': [
+        (('individual', 'oop_limit'), r'(?:Individual|' + OOP_LIMIT + r')[^\n]*' + OUT_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+    ],
+    'out_of_pocket.family_out_network': [
+        (('family', 'oop_limit'), r'(?:Family|' + OOP_LIMIT + r')[^\n]*' + OUT_NETWORK + r'[^\n]*?(\$[\d,]+)'),
+    ],
+    'coinsurance.in_network': [
+        (('coinsurance',), r'Co(?:\-|\s)?insurance[^\n]*' + IN_NETWORK + r'[^\n]*?(\d+(?:\.\d+)?%)'),
+        (('coinsurance',), r'Co(?:\-|\s)?insurance(?:[^\n]*?)(\d+(?:\.\d+)?%)'),
+    ],
+    'coinsurance.out_network': [
+        (('coinsurance',), r'Co(?:\-|\s)?insurance[^\n]*' + OUT_NETWORK + r'[^\n]*?(\d+(?:\.\d+)?%)'),
+    ],
+}
+
+COMPILED_FIELD_PATTERNS = {
+    field: [(anchors, re.compile(pattern, re.IGNORECASE)) for anchors, pattern in patterns]
+    for field, patterns in FIELD_PATTERNS.items()
+}
+
+COST = r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
+
+# Cost fields: the line following an anchor must contain a cost; the value is
+# then the first cost (matched case-sensitively) in that span
+COST_FIELD_PATTERNS = {
+    'office_visits.primary_care': (('primary_care',), r'(?:Primary\s*Care|PCP)[^\n]*' + COST),
+    'office_visits.specialist': (('specialist',), r'(?:Specialist)[^\n]*' + COST),
+    'office_visits.urgent_care': (('urgent_care',), r'(?:Urgent\s*Care)[^\n]*' + COST),
+    'emergency_room': (('emergency',), r'(?:Emergency\s*(?:Room|Department|Care|Services)|ER\s*Visit)[^\n]*' + COST),
+    'hospitalization': (('hospital',), r'(?:Hospital|Inpatient|Hospitalization)[^\n]*' + COST),
+}
+
+COMPILED_COST_FIELD_PATTERNS = {
+    field: (anchors, re.compile(pattern, re.IGNORECASE))
+    for field, (anchors, pattern) in COST_FIELD_PATTERNS.items()
+}
+
+COST_PATTERN = re.compile(COST)
+
+CARRIER_PATTERN = re.compile(r'(United\s*Healthcare|Aetna|Cigna|Blue\s*Cross|Blue\s*Shield|BCBS|Anthem|Humana|Kaiser|Optum)', re.IGNORECASE)
+# Per-field confidence: how a value was resolved
+CONFIDENCE_TEXT = 0.9  # Field pattern matched in the text
+CONFIDENCE_TABLE = 0.4  # Taken from a table row fallback; below the default escalation threshold
+CONFIDENCE_NOT_FOUND = 0.0
+
+# Characters of context around an anchor in a field's text window
+WINDOW_CHARS = 300
+MAX_WINDOWS_PER_FIELD = 3
+
+PLAN_PATTERNS = [
+    re.compile(r'Plan\s*(?:Name|Type):\s*([A-Za-z0-9\s\-]+)', re.IGNORECASE),
+    re.compile(r'(Choice\s*(?:Plus|Select)|PPO|HMO|EPO|POS|HDHP|HSA)', re.IGNORECASE),
+]
+
+class BenefitScanner:
+    """
+    Locates every field anchor in one pass over the text, then resolves each
+    field by matching its pattern only at its anchor positions. The cost of a
+    scan grows with the size of the text, not with the number of fields.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.anchors: Dict[str, List[int]] = {name: [] for name in ANCHOR_PATTERNS}
+        for match in ANCHOR_SCANNER.finditer(text):
+            self.anchors[match.lastgroup].append(match.start())
+
+    def _positions(self, anchors: Tuple[str, ...]) -> List[int]:
+        if len(anchors) == 1:
+            return self.anchors[anchors[0]]
+        return sorted(pos for name in anchors for pos in self.anchors[name])
+
+    def find(self, field: str) -> str:
+        """Resolve a FIELD_PATTERNS field, returning "Not found" if no pattern matches."""
+        for anchors, pattern in COMPILED_FIELD_PATTERNS[field]:
+            for start in self._positions(anchors):
+                match = pattern.match(self.text, start)
+                if match:
+                    return match.group(1)
+        return "Not found"
+
+    def find_cost(self, field: str) -> str:
+        """Resolve a COST_FIELD_PATTERNS field to the first cost following its anchor."""
+        anchors, pattern = COMPILED_COST_FIELD_PATTERNS[field]
+        for start in self._positions(anchors):
+            match = pattern.match(self.text, start)
+            if match:
+                cost_match = COST_PATTERN.search(match.group(0))
+                return cost_match.group(0) if cost_match else "Not found"
+        return "Not found"
+
+    def windows(self, field: str, window_chars: int = WINDOW_CHARS,
+                max_windows: int = MAX_WINDOWS_PER_FIELD) -> List[Tuple[int, int]]:
+        """(start, end) spans of text around the first anchors of a field."""
+        if field in COMPILED_COST_FIELD_PATTERNS:
+            anchors = COMPILED_COST_FIELD_PATTERNS[field][0]
+        elif field in COMPILED_FIELD_PATTERNS:
+            anchors = tuple(name for names, _ in COMPILED_FIELD_PATTERNS[field] for name in names)
+        else:
+            return []
+        spans = []
+        for start in sorted(set(self._positions(tuple(dict.fromkeys(anchors)))))[:max_windows]:
+            spans.append((max(0, start - window_chars // 4), min(len(self.text), start + window_chars)))
+        return spans
+
+# Terms the table fallbacks look up; matched as substrings of the row text
+TABLE_KEYWORDS = [
+    'deductible', 'individual', 'family', 'out-of-pocket', 'out of pocket', 'oop',
+    'coinsurance', 'primary care', 'pcp', 'specialist', 'urgent care', 'emergency',
+    'er visit', 'hospital', 'inpatient', 'hospitalization'
+]
+
+TABLE_AMOUNT_PATTERN = re.compile(r'(?:\$[\d,]+|\d+%)')
+
+class TableIndex:
+    """
+    Index over the rows of the extracted tables, built once per document.
+
+    Only complete rows (no empty cells) are indexed, as the table fallbacks
+    only ever consider those. Each row keeps its lowercased text and its
+    first money, percent and amount cells, and TABLE_KEYWORDS map to the
+    rows containing them, so a field lookup is a set probe instead of a walk
+    over every table.
+    """
+
+    def __init__(self, tables: List[Dict[str, Any]]):
+        self.rows: List[Dict[str, Any]] = []
+        self.keyword_rows: Dict[str, set] = {keyword: set() for keyword in TABLE_KEYWORDS}
+
+        for table in tables:
+            for row in table['data']:
+                if not all(row):
+                    continue
+                row_text = ' '.join([str(cell) for cell in row if cell]).lower()
+                string_cells = [cell for cell in row if cell and isinstance(cell, str)]
+                row_id = len(self.rows)
+                self.rows.append({
+                    'text': row_text,
+                    'money': next((cell for cell in string_cells if '$' in cell), None),
+                    'percent': next((cell for cell in string_cells if '%' in cell), None),
+                    'amount': next((cell for cell in string_cells if TABLE_AMOUNT_PATTERN.search(cell)), None)
+                })
+                for keyword in TABLE_KEYWORDS:
+                    if keyword in row_text:
+                        self.keyword_rows[keyword].add(row_id)
+
+    def _matching_rows(self, all_of: List[str], any_of: List[str]) -> List[int]:
+        row_ids = None
+        for keyword in all_of:
+            row_ids = self.keyword_rows[keyword] if row_ids is None else row_ids & self.keyword_rows[keyword]
+        if any_of:
+            any_rows = set().union(*(self.keyword_rows[keyword] for keyword in any_of))
+            row_ids = any_rows if row_ids is None else row_ids & any_rows
+        return sorted(row_ids or [])
+
+    def first_cell(self, kind: str, all_of: List[str] = (), any_of: List[str] = ()) -> Optional[str]:
+        """First 'money', 'percent' or 'amount' cell among the matching rows."""
+        for row_id in self._matching_rows(all_of, any_of):
+            cell = self.rows[row_id][kind]
+            if cell is not None:
+                return cell
+        return None
+
+    def last_cell(self, kind: str, all_of: List[str] = (), any_of: List[str] = ()) -> Optional[str]:
+        """Last 'money', 'percent' or 'amount' cell among the matching rows."""
+        for row_id in reversed(self._matching_rows(all_of, any_of)):
+            cell = self.rows[row_id][kind]
+            if cell is not None:
+                return cell
+        return None
 
 class BenefitExtractor:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, workers: Optional[int] = None, cache: Optional[ExtractionCache] = None,
+                 snapshot: bool = False):
         self.pdf_path = pdf_path
+        self.workers = workers  # Process pool size for page-parallel extraction
+        self.cache = cache  # Optional content-addressed cache of extraction results
+        self.snapshot = snapshot  # Read pages from the persisted page snapshot next to the PDF
+        self.table_stats = {'pages_scanned': 0, 'pages_skipped': 0}  # Table prefilter counters
         self.text = ""
         self.tables = []
         self.benefits = {}
+        self.scanner = None
+        self.table_index = None
+        self.confidence = {}  # Dotted field name -> confidence of its value
+        self.page_snapshot = None  # Snapshot loaded for the current extraction
     
     def extract_benefits(self) -> Dict[str, Any]:
-        """Extract all benefits information from the PDF."""
+        """
+        Extract all benefits information from the PDF.
+        Benefits, their field confidence and the table prefilter counters are
+        cached together in one entry, so a cache hit restores all three.
+        """
+        digest = None
+        if self.cache is not None:
+            try:
+                digest = file_digest(self.pdf_path)
+                cached = self.cache.get(digest, 'benefits')
+                # Entries written before confidence and table stats were stored alongside are re-extracted
+                if cached and 'benefits' in cached and cached.get('confidence') and 'table_stats' in cached:
+                    self.confidence = cached['confidence']
+                    self.table_stats = cached['table_stats']
+                    return cached['benefits']
+            except Exception as e:
+                logger.error(f"Extraction cache error: {str(e)}")
+        
+        # The text and table passes share one snapshot load
+        self.page_snapshot = None
         self._extract_text()
         self._extract_tables()
         self._extract_benefits()
+        formatted_benefits = self.get_formatted_benefits()
+        
+        if digest is not None:
+            self.cache.put(digest, 'benefits', {
+                'benefits': formatted_benefits,
+                'confidence': self.confidence,
+                'table_stats': self.table_stats
+            })
+        
+        return formatted_benefits
+    
+    def extract_benefits_from_parsed(self, text: str, tables: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Extract benefits from text and tables already parsed elsewhere, e.g. by PDFProcessor."""
+        self.text = text
+        self.tables = tables
+        self._extract_benefits()
         return self.get_formatted_benefits()
     
+    def _open_pages(self):
+        """
+        Page source for text and tables: the page snapshot when enabled, else
+        the PDF. The snapshot is hashed and loaded once, then reused.
+        """
+        if self.snapshot:
+            if self.page_snapshot is None:
+                self.page_snapshot = load_or_build_snapshot(self.pdf_path, self.workers)
+            return self.page_snapshot
+        return PDFDocument(self.pdf_path)
+    
     def _extract_text(self) -> str:
         """Extract text from the PDF."""
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
+            with self._open_pages() as document:
                 text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    text += page_text + "\n\n"
+                for page in document.iter_pages(extract_tables=False, workers=self.workers):
+                    text += page['text'] + PAGE_SEPARATOR
                 self.text = text
                 return text
         except Exception as e:
@@ -511,7 +515,7 @@ class BenefitExtractor:
                     reader = PyPDF2.PdfReader(file)
                     text = ""
                     for page in reader.pages:
-                        text += page.extract_text() + "\n\n"
+                        text += page.extract_text() + PAGE_SEPARATOR
                     self.text = text
                     return text
             except Exception as e2:
@@ -521,17 +525,12 @@ class BenefitExtractor:
     def _extract_tables(self) -> List[Dict[str, Any]]:
         """Extract tables from the PDF."""
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
+            with self._open_pages() as document:
                 tables = []
-                for i, page in enumerate(pdf.pages):
-                    page_tables = page.extract_tables()
-                    for j, table_data in enumerate(page_tables):
-                        if table_data and len(table_data) > 0:
-                            tables.append({
-                                'page': i + 1,
-                                'table_number': j + 1,
-                                'data': table_data
-                            })
+                self.table_stats = {'pages_scanned': 0, 'pages_skipped': 0}
+                for page in document.iter_pages(extract_text=False, workers=self.workers):
+                    self.table_stats['pages_scanned' if page['table_scanned'] else 'pages_skipped'] += 1
+                    tables.extend(page['tables'])
                 self.tables = tables
                 return tables
         except Exception as e:
@@ -539,8 +538,48 @@ class BenefitExtractor:
             self.tables = []
             return []
     
+    def _text_field(self, field: str) -> str:
+        """Resolve a field pattern in the text, recording its confidence."""
+        value = self.scanner.find(field)
+        self.confidence[field] = CONFIDENCE_TEXT if value != "Not found" else CONFIDENCE_NOT_FOUND
+        return value
+    
+    def _cost_field(self, field: str) -> str:
+        """Resolve a cost field in the text, recording its confidence."""
+        value = self.scanner.find_cost(field)
+        self.confidence[field] = CONFIDENCE_TEXT if value != "Not found" else CONFIDENCE_NOT_FOUND
+        return value
+    
+    def _table_field(self, field: str, cell: Optional[str], current: str) -> str:
+        """Use a table fallback cell when one was found, recording its confidence."""
+        if cell:
+            self.confidence[field] = CONFIDENCE_TABLE
+            return cell
+        return current
+    
+    def field_windows(self, field: str, window_chars: int = WINDOW_CHARS) -> List[str]:
+        """
+        Text around the anchors of a field, used to ask about just that field.
+        Carrier and plan names have no anchors and get the start of the document.
+        """
+        if self.scanner is None:
+            if not self.text:
+                self._extract_text()
+            self.scanner = BenefitScanner(self.text)
+        if field in ('carrier_name', 'plan_name'):
+            return [self.text[:window_chars * 4]]
+        return [self.text[start:end] for start, end in self.scanner.windows(field, window_chars)]
+    
     def _extract_benefits(self) -> Dict[str, Any]:
         """Extract specific benefit information from text and tables."""
+        self.confidence = {}
+        
+        # Locate every field anchor in a single pass over the text
+        self.scanner = BenefitScanner(self.text)
+        
+        # Index table rows once for the table fallbacks
+        self.table_index = TableIndex(self.tables)
+        
         # Extract carrier and plan information
         carrier_name = self._extract_carrier_name()
         plan_name = self._extract_plan_name()
@@ -579,14 +618,10 @@ class BenefitExtractor:
     
     def _extract_carrier_name(self) -> str:
         """Extract the carrier name from the PDF."""
-        carrier_patterns = [
-            r'(?i)(United\s*Healthcare|Aetna|Cigna|Blue\s*Cross|Blue\s*Shield|BCBS|Anthem|Humana|Kaiser|Optum)'
-        ]
-        
-        for pattern in carrier_patterns:
-            match = re.search(pattern, self.text)
-            if match:
-                return match.group(1)
+        match = CARRIER_PATTERN.search(self.text)
+        if match:
+            self.confidence['carrier_name'] = CONFIDENCE_TEXT
+            return match.group(1)
         
         # Check the first tables for carrier info
         if self.tables:
@@ -594,85 +629,38 @@ class BenefitExtractor:
                 for row in table['data']:
                     for cell in row:
                         if cell and isinstance(cell, str):
-                            for pattern in carrier_patterns:
-                                match = re.search(pattern, cell)
-                                if match:
-                                    return match.group(1)
+                            match = CARRIER_PATTERN.search(cell)
+                            if match:
+                                self.confidence['carrier_name'] = CONFIDENCE_TABLE
+                                return match.group(1)
         
+        self.confidence['carrier_name'] = CONFIDENCE_NOT_FOUND
         return "Unknown"
     
     def _extract_plan_name(self) -> str:
         """Extract the plan name from the PDF."""
-        plan_patterns = [
-            r'(?i)Plan\s*(?:Name|Type):\s*([A-Za-z0-9\s\-]+)',
-            r'(?i)(Choice\s*(?:Plus|Select)|PPO|HMO|EPO|POS|HDHP|HSA)'
-        ]
-        
-        for pattern in plan_patterns:
-            match = re.search(pattern, self.text)
+        for pattern in PLAN_PATTERNS:
+            match = pattern.search(self.text)
             if match:
+                self.confidence['plan_name'] = CONFIDENCE_TEXT
                 return match.group(1).strip()
         
+        self.confidence['plan_name'] = CONFIDENCE_NOT_FOUND
         return "Unknown"
     
     def _extract_deductible_info(self) -> Dict[str, str]:
         """Extract deductible information."""
-        # Regular expressions for deductible amounts
-        individual_in_pattern = r'(?i)Individual[^\n]*(?:In[\s\-]*Network|Network)[^\n]*?(\$[\d,]+)'
-        family_in_pattern = r'(?i)Family[^\n]*(?:In[\s\-]*Network|Network)[^\n]*?(\$[\d,]+)'
-        individual_out_pattern = r'(?i)Individual[^\n]*(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)[^\n]*?(\$[\d,]+)'
-        family_out_pattern = r'(?i)Family[^\n]*(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)[^\n]*?(\$[\d,]+)'
-        
-        # Simple pattern fallbacks
-        fallback_individual = r'(?i)Individual\s*(?:Deductible|Annual\s*Deductible)[^\n]*?(\$[\d,]+)'
-        fallback_family = r'(?i)Family\s*(?:Deductible|Annual\s*Deductible)[^\n]*?(\$[\d,]+)'
-        
-        # Try to match patterns
-        individual_in = "Not found"
-        match = re.search(individual_in_pattern, self.text)
-        if match:
-            individual_in = match.group(1)
-        else:
-            match = re.search(fallback_individual, self.text)
-            if match:
-                individual_in = match.group(1)
-        
-        family_in = "Not found"
-        match = re.search(family_in_pattern, self.text)
-        if match:
-            family_in = match.group(1)
-        else:
-            match = re.search(fallback_family, self.text)
-            if match:
-                family_in = match.group(1)
-        
-        individual_out = "Not found"
-        match = re.search(individual_out_pattern, self.text)
-        if match:
-            individual_out = match.group(1)
-        
-        family_out = "Not found"
-        match = re.search(family_out_pattern, self.text)
-        if match:
-            family_out = match.group(1)
+        individual_in = self._text_field('deductible.individual_in_network')
+        family_in = self._text_field('deductible.family_in_network')
+        individual_out = self._text_field('deductible.individual_out_network')
+        family_out = self._text_field('deductible.family_out_network')
         
         # Check tables if text search failed
         if individual_in == "Not found" or family_in == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    if 'deductible' in row_text.lower() and 'individual' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and '$' in cell:
-                                individual_in = cell
-                                break
-                    if 'deductible' in row_text.lower() and 'family' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and '$' in cell:
-                                family_in = cell
-                                break
+            individual_in = self._table_field('deductible.individual_in_network', self.table_index.last_cell(
+                'money', all_of=['deductible', 'individual']), individual_in)
+            family_in = self._table_field('deductible.family_in_network', self.table_index.last_cell(
+                'money', all_of=['deductible', 'family']), family_in)
         
         return {
             "individual_in_network": individual_in,
@@ -683,62 +671,18 @@ class BenefitExtractor:
     
     def _extract_out_of_pocket_info(self) -> Dict[str, str]:
         """Extract out-of-pocket information."""
-        # Regular expressions for out-of-pocket amounts
-        individual_in_pattern = r'(?i)(?:Individual|Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum))[^\n]*(?:In[\s\-]*Network|Network)[^\n]*?(\$[\d,]+)'
-        family_in_pattern = r'(?i)(?:Family|Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum))[^\n]*(?:In[\s\-]*Network|Network)[^\n]*?(\$[\d,]+)'
-        individual_out_pattern = r'(?i)(?:Individual|Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum))[^\n]*(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)[^\n]*?(\$[\d,]+)'
-        family_out_pattern = r'(?i)(?:Family|Out[\s\-]*of[\s\-]*Pocket\s*(?:Limit|Maximum))[^\n]*(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)[^\n]*?(\$[\d,]+)'
-        
-        # Simple pattern fallbacks
-        fallback_individual = r'(?i)Individual\s*(?:Out[\s\-]*of[\s\-]*Pocket|OOP)[^\n]*?(\$[\d,]+)'
-        fallback_family = r'(?i)Family\s*(?:Out[\s\-]*of[\s\-]*Pocket|OOP)[^\n]*?(\$[\d,]+)'
-        
-        # Try to match patterns
-        individual_in = "Not found"
-        match = re.search(individual_in_pattern, self.text)
-        if match:
-            individual_in = match.group(1)
-        else:
-            match = re.search(fallback_individual, self.text)
-            if match:
-                individual_in = match.group(1)
-        
-        family_in = "Not found"
-        match = re.search(family_in_pattern, self.text)
-        if match:
-            family_in = match.group(1)
-        else:
-            match = re.search(fallback_family, self.text)
-            if match:
-                family_in = match.group(1)
-        
-        individual_out = "Not found"
-        match = re.search(individual_out_pattern, self.text)
-        if match:
-            individual_out = match.group(1)
-        
-        family_out = "Not found"
-        match = re.search(family_out_pattern, self.text)
-        if match:
-            family_out = match.group(1)
+        individual_in = self._text_field('out_of_pocket.individual_in_network')
+        family_in = self._text_field('out_of_pocket.family_in_network')
+        individual_out = self._text_field('out_of_pocket.individual_out_network')
+        family_out = self._text_field('out_of_pocket.family_out_network')
         
         # Check tables
         if individual_in == "Not found" or family_in == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    if any(phrase in row_text.lower() for phrase in ['out-of-pocket', 'out of pocket', 'oop']) and 'individual' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and '$' in cell:
-                                individual_in = cell
-                                break
-                    if any(phrase in row_text.lower() for phrase in ['out-of-pocket', 'out of pocket', 'oop']) and 'family' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and '$' in cell:
-                                family_in = cell
-                                break
+            oop_terms = ['out-of-pocket', 'out of pocket', 'oop']
+            individual_in = self._table_field('out_of_pocket.individual_in_network', self.table_index.last_cell(
+                'money', all_of=['individual'], any_of=oop_terms), individual_in)
+            family_in = self._table_field('out_of_pocket.family_in_network', self.table_index.last_cell(
+                'money', all_of=['family'], any_of=oop_terms), family_in)
         
         return {
             "individual_in_network": individual_in,
@@ -749,39 +693,13 @@ class BenefitExtractor:
     
     def _extract_coinsurance_info(self) -> Dict[str, str]:
         """Extract coinsurance information."""
-        in_network_pattern = r'(?i)(?:Co(?:\-|\s)?insurance)[^\n]*(?:In[\s\-]*Network|Network)[^\n]*?(\d+(?:\.\d+)?%)'
-        out_network_pattern = r'(?i)(?:Co(?:\-|\s)?insurance)[^\n]*(?:Out[\s\-]*of[\s\-]*Network|Non[\s\-]*Network)[^\n]*?(\d+(?:\.\d+)?%)'
-        
-        # Fallback pattern
-        fallback_pattern = r'(?i)Co(?:\-|\s)?insurance(?:[^\n]*?)(\d+(?:\.\d+)?%)'
-        
-        # Try to match patterns
-        in_network = "Not found"
-        match = re.search(in_network_pattern, self.text)
-        if match:
-            in_network = match.group(1)
-        else:
-            match = re.search(fallback_pattern, self.text)
-            if match:
-                in_network = match.group(1)
-        
-        out_network = "Not found"
-        match = re.search(out_network_pattern, self.text)
-        if match:
-            out_network = match.group(1)
+        in_network = self._text_field('coinsurance.in_network')
+        out_network = self._text_field('coinsurance.out_network')
         
         # Check tables
         if in_network == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    if 'coinsurance' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and '%' in cell:
-                                in_network = cell
-                                break
+            in_network = self._table_field('coinsurance.in_network', self.table_index.last_cell(
+                'percent', all_of=['coinsurance']), in_network)
         
         return {
             "in_network": in_network,
@@ -790,59 +708,20 @@ class BenefitExtractor:
     
     def _extract_office_visit_info(self) -> Dict[str, str]:
         """Extract office visit information."""
-        primary_care_pattern = r'(?i)(?:Primary\s*Care|PCP)[^\n]*(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
-        specialist_pattern = r'(?i)(?:Specialist)[^\n]*(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
-        urgent_care_pattern = r'(?i)(?:Urgent\s*Care)[^\n]*(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
-        
-        # Extract primary care
-        primary_care = "Not found"
-        match = re.search(primary_care_pattern, self.text)
-        if match:
-            cost_match = re.search(r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)', match.group(0))
-            if cost_match:
-                primary_care = cost_match.group(0)
-        
-        # Extract specialist
-        specialist = "Not found"
-        match = re.search(specialist_pattern, self.text)
-        if match:
-            cost_match = re.search(r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)', match.group(0))
-            if cost_match:
-                specialist = cost_match.group(0)
-        
-        # Extract urgent care
-        urgent_care = "Not found"
-        match = re.search(urgent_care_pattern, self.text)
-        if match:
-            cost_match = re.search(r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)', match.group(0))
-            if cost_match:
-                urgent_care = cost_match.group(0)
+        primary_care = self._cost_field('office_visits.primary_care')
+        specialist = self._cost_field('office_visits.specialist')
+        urgent_care = self._cost_field('office_visits.urgent_care')
         
         # Check tables
-        if primary_care == "Not found" or specialist == "Not found" or urgent_care == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    
-                    if primary_care == "Not found" and any(term in row_text.lower() for term in ['primary care', 'pcp']):
-                        for cell in row:
-                            if cell and isinstance(cell, str) and re.search(r'(?:\$[\d,]+|\d+%)', cell):
-                                primary_care = cell
-                                break
-                    
-                    if specialist == "Not found" and 'specialist' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and re.search(r'(?:\$[\d,]+|\d+%)', cell):
-                                specialist = cell
-                                break
-                                
-                    if urgent_care == "Not found" and 'urgent care' in row_text.lower():
-                        for cell in row:
-                            if cell and isinstance(cell, str) and re.search(r'(?:\$[\d,]+|\d+%)', cell):
-                                urgent_care = cell
-                                break
+        if primary_care == "Not found":
+            primary_care = self._table_field('office_visits.primary_care', self.table_index.first_cell(
+                'amount', any_of=['primary care', 'pcp']), primary_care)
+        if specialist == "Not found":
+            specialist = self._table_field('office_visits.specialist', self.table_index.first_cell(
+                'amount', all_of=['specialist']), specialist)
+        if urgent_care == "Not found":
+            urgent_care = self._table_field('office_visits.urgent_care', self.table_index.first_cell(
+                'amount', all_of=['urgent care']), urgent_care)
         
         return {
             "primary_care": primary_care,
@@ -852,55 +731,23 @@ class BenefitExtractor:
     
     def _extract_emergency_room_info(self) -> str:
         """Extract emergency room information."""
-        er_pattern = r'(?i)(?:Emergency\s*(?:Room|Department|Care|Services)|ER\s*Visit)[^\n]*(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
-        
-        # Extract emergency room
-        er_cost = "Not found"
-        match = re.search(er_pattern, self.text)
-        if match:
-            cost_match = re.search(r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)', match.group(0))
-            if cost_match:
-                er_cost = cost_match.group(0)
+        er_cost = self._cost_field('emergency_room')
         
         # Check tables
         if er_cost == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    if any(term in row_text.lower() for term in ['emergency', 'er visit']):
-                        for cell in row:
-                            if cell and isinstance(cell, str) and re.search(r'(?:\$[\d,]+|\d+%)', cell):
-                                er_cost = cell
-                                break
+            er_cost = self._table_field('emergency_room', self.table_index.last_cell(
+                'amount', any_of=['emergency', 'er visit']), er_cost)
         
         return er_cost
     
     def _extract_hospitalization_info(self) -> str:
         """Extract hospitalization information."""
-        hospitalization_pattern = r'(?i)(?:Hospital|Inpatient|Hospitalization)[^\n]*(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)'
-        
-        # Extract hospitalization
-        hospitalization_cost = "Not found"
-        match = re.search(hospitalization_pattern, self.text)
-        if match:
-            cost_match = re.search(r'(?:\$[\d,]+(?:\.\d+)?|\d+%|not covered|covered 100%)', match.group(0))
-            if cost_match:
-                hospitalization_cost = cost_match.group(0)
+        hospitalization_cost = self._cost_field('hospitalization')
         
         # Check tables
         if hospitalization_cost == "Not found":
-            for table in self.tables:
-                for row in table['data']:
-                    if not all(row):
-                        continue
-                    row_text = ' '.join([str(cell) for cell in row if cell])
-                    if any(term in row_text.lower() for term in ['hospital', 'inpatient', 'hospitalization']):
-                        for cell in row:
-                            if cell and isinstance(cell, str) and re.search(r'(?:\$[\d,]+|\d+%)', cell):
-                                hospitalization_cost = cell
-                                break
+            hospitalization_cost = self._table_field('hospitalization', self.table_index.last_cell(
+                'amount', any_of=['hospital', 'inpatient', 'hospitalization']), hospitalization_cost)
         
         return hospitalization_cost
     
@@ -0,0 +1,255 @@
+import re
+import logging
+import openpyxl
+from typing import Dict, List, Any, Callable, NamedTuple, Optional, Sequence, Tuple
+
+from .template_cache import TemplateCache, load_template
+
+logger = logging.getLogger(__name__)
+
+HEALTH_SHEET = "HEALTH"
+
+# Headers of a new workbook
+HEADERS = {
+    'A1': "ITEM",
+    'B1': "FEATURE",
+    'C1': "DESCRIPTION",
+    'D1': "Plan 1",
+    'E1': "In Network",
+    'F1': "Out of Network",
+    'G1': "Plan 2",
+    'H1': "In Network",
+    'I1': "Out of Network",
+}
+
+# Template row of every line item, used as the column A labels of a new workbook
+ROW_LABELS = {
+    4: "Carrier Name",
+    5: "Plan Name",
+    6: "Page Name",
+    7: "Plan Explanation",
+    9: "Single Deductible",
+    10: "Family Deductible",
+    12: "Coinsurance",
+    14: "Single Out of Pocket Max",
+    15: "Family Out of Pocket Max",
+    17: "Primary Care Office Visit",
+    18: "Specialist Office Visit",
+    19: "Urgent Care",
+    20: "Emergency Room",
+    22: "Preventive Services",
+    24: "Outpatient Surgery",
+    25: "Inpatient Hospitalization",
+    26: "CT Scan, PT Scan, MRI",
+    27: "Hospital Newborn Delivery",
+    29: "Prescription Deductible",
+    30: "Generic (Tier 1)",
+    31: "Brand Name (Tier 2)",
+    32: "Non-Preferred (Tier 3)",
+    33: "Specialty (Tier 4)",
+    34: "Specialty (Tier 5)",
+    35: "Mail Order (90 day supply)",
+    37: "Plan Year",
+    38: "Deductible Period",
+    39: "Deductible Explanation",
+    40: "Network Type",
+    41: "Network Name",
+    42: "Member Website",
+    43: "Customer Service Phone",
+}
+
+# Plans occupy groups of three columns starting at D: plan, in network, out of network
+FIRST_PLAN_COLUMN = 4
+PLAN_COLUMN_STRIDE = 3
+PLAN_COLUMN, IN_NETWORK_COLUMN, OUT_NETWORK_COLUMN = 0, 1, 2
+
+# A free plan column has no carrier name
+CARRIER_ROW = 4
+
+NOT_FOUND = "Not found"
+
+PLAN_EXPLANATION = (
+    "Health insurance provides financial protection against medical costs. It helps employees access "
+    "necessary healthcare while minimizing out-of-pocket expenses."
+)
+
+COPAY_PATTERN = re.compile(r'^\$\d+(?:\.\d+)?$')
+PERCENT_PATTERN = re.compile(r'^\d+(?:\.\d+)?%$')
+AMOUNT_PATTERN = re.compile(r'\$?([\d,]+(?:\.\d+)?)')
+PERCENT_NUMBER_PATTERN = re.compile(r'(\d+(?:\.\d+)?)%')
+
+HSA_TERMS = ("HSA", "HEALTH SAVINGS", "HIGH DEDUCTIBLE")
+
+# Returned by a cell rule to leave the cell as it is in the template
+SKIP = object()
+
+_MISSING = object()
+
+class PlanContext:
+    """One plan's benefits plus the values several cell rules depend on."""
+
+    def __init__(self, data: Dict[str, Any]):
+        # Accept both a benefits dict and a response with nested results
+        plan = data
+        if isinstance(data, dict) and isinstance(data.get("results"), list) and data["results"]:
+            plan = data["results"][0]
+        self.plan = plan
+        plan_name = str(self.get(("plan_name",), "") or "").upper()
+        self.is_hsa = any(term in plan_name for term in HSA_TERMS)
+        self.in_coinsurance = self.get(("coinsurance", "in_network"), "")
+        self.out_coinsurance = self.get(("coinsurance", "out_network"), "")
+
+    def get(self, keys: Tuple[str, ...], default: Any = None) -> Any:
+        """Nested lookup; default when any level is missing."""
+        value = self.plan
+        for key in keys:
+            if not isinstance(value, dict):
+                return default
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+        return value
+
+    def has(self, key: str) -> bool:
+        return isinstance(self.plan, dict) and key in self.plan
+
+Rule = Callable[[PlanContext], Any]
+Formatter = Callable[[Any, PlanContext], Any]
+
+class Cell(NamedTuple):
+    """A layout entry: the value rule for one row and column offset of a plan."""
+    row: int
+    offset: int
+    rule: Rule
+
+def field(path: str, formatter: Optional[Formatter] = None, default: Any = NOT_FOUND) -> Rule:
+    """Rule reading a dotted benefits path, optionally passing it through a formatter."""
+    keys = tuple(path.split('.'))
+    if formatter is None:
+        return lambda ctx: ctx.get(keys, default)
+    return lambda ctx: formatter(ctx.get(keys, default), ctx)
+
+def const(value: Any) -> Rule:
+    return lambda ctx: value
+
+def amount(value: Any, ctx: Optional[PlanContext] = None) -> str:
+    """Numeric part of a money value: '$1,500' -> '1500'."""
+    if not value or value == NOT_FOUND:
+        return ""
+    match = AMOUNT_PATTERN.search(str(value))
+    return match.group(1).replace(',', '') if match else ""
+
+def percent(value: Any, ctx: Optional[PlanContext] = None) -> str:
+    """Numeric part of a percentage: '20%' -> '20'."""
+    if not value or value == NOT_FOUND:
+        return ""
+    match = PERCENT_NUMBER_PATTERN.search(str(value))
+    return match.group(1) if match else ""
+
+def carrier(value: Any, ctx: Optional[PlanContext] = None) -> str:
+    """
+    Carrier row value. next_plan_column treats a column with an empty carrier
+    cell as free, so a missing or blank carrier is written as 'Unknown'.
+    """
+    return str(value).strip() if value and str(value).strip() else "Unknown"
+
+def after_deductible(value: Any) -> str:
+    return f"{value} after deductible"
+
+def format_benefit(value: Any, ctx: PlanContext, is_percentage: bool = False) -> Any:
+    """
+    Apply the mass upload formatting rules to a cost: percentages, and HSA
+    plan copays, are 'after deductible'; facility splits and per-occurrence
+    deductibles are kept as written.
+    """
+    if not value or value == NOT_FOUND:
+        return ""
+    text = str(value)
+    lower = text.lower()
+
+    # Already formatted with facility differences
+    if "freestanding" in lower or "hospital" in lower:
+        return value
+
+    # Already formatted with per occurrence deductible
+    if "$" in text and "then" in lower:
+        if "after deductible" not in lower and is_percentage:
+            return after_deductible(value)
+        return value
+
+    if COPAY_PATTERN.match(text):
+        return after_deductible(value) if ctx.is_hsa else value
+
+    if PERCENT_PATTERN.match(text):
+        return after_deductible(value)
+
+    return value
+
+def next_plan_column(sheet, start: int = FIRST_PLAN_COLUMN) -> int:
+    """
+    Return the first plan column (D, G, J, ...) from start without a carrier
+    name, adding headers for a new plan group when every existing one is used.
+    """
+    for column in range(start, sheet.max_column + 1, PLAN_COLUMN_STRIDE):
+        if not sheet.cell(row=CARRIER_ROW, column=column).value:
+            return column
+
+    column = sheet.max_column + 1
+    sheet.cell(row=1, column=column).value = f"Plan {(column - 1) // PLAN_COLUMN_STRIDE}"
+    sheet.cell(row=1, column=column + IN_NETWORK_COLUMN).value = "In Network"
+    sheet.cell(row=1, column=column + OUT_NETWORK_COLUMN).value = "Out of Network"
+    return column
+
+def render_plan(sheet, data: Dict[str, Any], layout: Sequence[Cell], start: int = FIRST_PLAN_COLUMN) -> int:
+    """Write one plan into the next free plan column from start. Returns the column index."""
+    column = next_plan_column(sheet, start)
+    ctx = PlanContext(data)
+    for row, offset, rule in layout:
+        value = rule(ctx)
+        if value is not SKIP:
+            sheet.cell(row=row, column=column + offset).value = value
+    return column
+
+def load_health_sheet(output_path: str, template_path: Optional[str] = None,
+                      template_cache: Optional[TemplateCache] = None):
+    """
+    Open the HEALTH sheet of a copy of template_path, or of the existing
+    workbook at output_path, or create a new workbook with the template's
+    headers and row labels.
+    Returns a tuple of (workbook, sheet).
+    """
+    try:
+        if template_path:
+            workbook = load_template(template_path, template_cache)
+        else:
+            workbook = openpyxl.load_workbook(output_path)
+        sheet = workbook[HEALTH_SHEET]
+    except (FileNotFoundError, KeyError):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = HEALTH_SHEET
+        for cell, value in HEADERS.items():
+            sheet[cell] = value
+        for row, label in ROW_LABELS.items():
+            sheet.cell(row=row, column=1).value = label
+    return workbook, sheet
+
+def render_workbook(plans: List[Dict[str, Any]], output_path: str, layout: Sequence[Cell],
+                    template_path: Optional[str] = None, template_cache: Optional[TemplateCache] = None) -> bool:
+    """
+    Render plans into a copy of template_path saved as output_path (or into
+    the workbook already at output_path, or a new one), one plan column each,
+    with one load and one save.
+    """
+    try:
+        workbook, sheet = load_health_sheet(output_path, template_path, template_cache)
+        # Columns up to the last one written are all taken, so each search resumes after it
+        start = FIRST_PLAN_COLUMN
+        for plan in plans:
+            start = render_plan(sheet, plan, layout, start) + PLAN_COLUMN_STRIDE
+        workbook.save(output_path)
+        return True
+
+    except Exception as e:
+        logger.error(f"Error creating Excel file: {str(e)}")
+        return False
@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import tempfile
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction output changes so stale cache entries are ignored
+EXTRACTOR_VERSION = "2"
+
+DEFAULT_CACHE_FOLDER = 'cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+DEFAULT_RESPONSE_CACHE_FOLDER = os.path.join('cache', 'responses')
+DEFAULT_RESPONSE_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+DEFAULT_RESPONSE_TTL = 7 * 24 * 3600  # One week
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class ExtractionCache:
+    """
+    Persistent on-disk cache of extraction results, keyed by the SHA-256 of the
+    PDF bytes plus EXTRACTOR_VERSION.
+
+    Each entry is a JSON file. Reads refresh the file's mtime, and writes evict
+    the least recently used entries once the cache grows past max_bytes.
+    Entries are written atomically so several worker processes can share it.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_FOLDER, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, digest: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}_{kind}_v{EXTRACTOR_VERSION}.json")
+
+    def get(self, digest: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a document digest, or None on a miss."""
+        path = self._entry_path(digest, kind)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cache entry {path}: {str(e)}")
+            self.misses += 1
+            return None
+
+        if not self._is_fresh(path, value):
+            self.misses += 1
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return value
+
+    def _is_fresh(self, path: str, value: Dict[str, Any]) -> bool:
+        """Hook for subclasses to reject stale entries. Extraction results never expire."""
+        return True
+
+    def put(self, digest: str, kind: str, value: Dict[str, Any]) -> bool:
+        """Store an entry, then evict old entries if over the size cap."""
+        path = self._entry_path(digest, kind)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.error(f"Error writing cache entry {path}: {str(e)}")
+            return False
+
+        self._evict()
+        return True
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+            except OSError as e:
+                logger.error(f"Error evicting cache entry {path}: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for this process."""
+        return {"hits": self.hits, "misses": self.misses}
+
+class ResponseCache(ExtractionCache):
+    """
+    On-disk cache of external API responses (e.g. Perplexity analyses).
+
+    Works like ExtractionCache, keyed by a request hash instead of a PDF
+    digest, but entries also expire ttl seconds after they were stored.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_RESPONSE_CACHE_FOLDER,
+                 max_bytes: int = DEFAULT_RESPONSE_MAX_BYTES, ttl: float = DEFAULT_RESPONSE_TTL):
+        super().__init__(cache_dir, max_bytes)
+        self.ttl = ttl
+
+    def _is_fresh(self, path: str, value: Dict[str, Any]) -> bool:
+        if time.time() - value.get('stored_at', 0) <= self.ttl:
+            return True
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return False
+
+    def get(self, key: str, kind: str = 'response') -> Optional[Dict[str, Any]]:
+        entry = super().get(key, kind)
+        return entry['value'] if entry else None
+
+    def put(self, key: str, kind: str, value: Dict[str, Any]) -> bool:
+        return super().put(key, kind, {'stored_at': time.time(), 'value': value})
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_DB = 'jobs.db'
+DEFAULT_JOB_WORKERS = 2
+
+# Each process refreshes the lease on its unfinished jobs every heartbeat;
+# jobs whose lease has expired belong to a process that died
+DEFAULT_HEARTBEAT_SECONDS = 10
+DEFAULT_LEASE_SECONDS = 60
+
+# Job lifecycle states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+class JobStore:
+    """
+    SQLite-backed record of background jobs: their kind, parameters, status
+    and JSON result. Every call opens its own connection, so the store can
+    be shared by request threads and job workers.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_JOB_DB):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            # Job stores created before jobs had owners
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str, params: Dict[str, Any], owner: str) -> str:
+        """Record a new queued job held by owner and return its ID."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at, owner, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), datetime.now().isoformat(), owner, time.time())
+            )
+        return job_id
+
+    def mark_running(self, job_id: str, owner: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (RUNNING, datetime.now().isoformat(), time.time(), job_id, owner, QUEUED)
+            )
+
+    def mark_completed(self, job_id: str, owner: str, result: Dict[str, Any]):
+        # A job already failed as abandoned stays failed, so its status never flips back
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ? AND owner = ? AND status IN (?, ?)",
+                (COMPLETED, json.dumps(result), datetime.now().isoformat(), job_id, owner, QUEUED, RUNNING)
+            )
+
+    def mark_failed(self, job_id: str, owner: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ? AND status IN (?, ?)",
+                (FAILED, error, datetime.now().isoformat(), job_id, owner, QUEUED, RUNNING)
+            )
+
+    def heartbeat(self, owner: str) -> int:
+        """Renew the lease on every unfinished job held by owner."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                (time.time(), owner, QUEUED, RUNNING)
+            )
+            return cursor.rowcount
+
+    def fail_expired(self, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                     error: str = "Interrupted: the worker running this job stopped") -> int:
+        """
+        Mark queued or running jobs whose owner has not renewed the lease
+        within lease_seconds as failed. Jobs of live processes, in this or any
+        other worker, keep being renewed and are never touched.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (FAILED, error, datetime.now().isoformat(), QUEUED, RUNNING, time.time() - lease_seconds)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a job's status (and optionally its result), or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"]
+        }
+        if include_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+class JobQueue:
+    """
+    Runs registered job handlers on a worker pool, recording progress in a JobStore.
+
+    Handlers are plain functions taking the job parameters as keyword
+    arguments and returning a JSON-serializable result:
+
+        queue.register('upload', process_upload)
+        job_id = queue.submit('upload', file_path=path, filename=name)
+
+    Several processes (e.g. gunicorn workers) can share one store. Each
+    queue owns the jobs it submits and a background thread renews their
+    lease every heartbeat_seconds; jobs left behind by a process that died
+    are failed once their lease is older than lease_seconds.
+    """
+
+    def __init__(self, store: JobStore, workers: int = DEFAULT_JOB_WORKERS,
+                 heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.store = store
+        self.handlers: Dict[str, Callable[..., Dict[str, Any]]] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='job')
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lease_seconds = max(lease_seconds, heartbeat_seconds * 2)
+        # Unique per process start, so a reused pid never inherits old jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                self.store.heartbeat(self.owner)
+                expired = self.store.fail_expired(self.lease_seconds)
+                if expired:
+                    logger.warning(f"Marked {expired} abandoned jobs as failed")
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {str(e)}")
+            time.sleep(self.heartbeat_seconds)
+
+    def register(self, kind: str, handler: Callable[..., Dict[str, Any]]):
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, **params) -> str:
+        """Queue a job and return its ID immediately."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, params, self.owner)
+        self.executor.submit(self._run, job_id, kind, params)
+        return job_id
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any]):
+        self.store.mark_running(job_id, self.owner)
+        try:
+            result = self.handlers[kind](**params)
+            self.store.mark_completed(job_id, self.owner, result)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+            self.store.mark_failed(job_id, self.owner, str(e))
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id, include_result=True)
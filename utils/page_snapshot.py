@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import tempfile
+import logging
+from typing import Dict, List, Any, Iterator, Optional
+from .pdf_document import PDFDocument
+from .extraction_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever page parsing changes so stale snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+
+# File layout: magic, big-endian uint16 version, zlib-compressed JSON body
+SNAPSHOT_MAGIC = b'PDFSNAP\x00'
+SNAPSHOT_HEADER = struct.Struct('>8sH')
+SNAPSHOT_SUFFIX = '.snapshot'
+
+def snapshot_path(pdf_path: str) -> str:
+    """Return the path of the snapshot stored next to a PDF."""
+    return pdf_path + SNAPSHOT_SUFFIX
+
+class PageSnapshot:
+    """
+    Compact record of everything pdfplumber parsed from a PDF: per-page text,
+    positioned words and raw table cells, plus the document metadata.
+
+    iter_pages() yields the same page dicts as PDFDocument.iter_pages(), so
+    extractors can run from a snapshot without touching the PDF again.
+    """
+
+    def __init__(self, digest: str, page_count: int, metadata: Dict[str, Any], pages: List[Dict[str, Any]]):
+        self.digest = digest
+        self.page_count = page_count
+        self.metadata = metadata
+        self.pages = pages
+
+    def __enter__(self) -> "PageSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    @classmethod
+    def build(cls, pdf_path: str, workers: Optional[int] = None, digest: Optional[str] = None) -> "PageSnapshot":
+        """Parse every page of a PDF once and capture the results."""
+        with PDFDocument(pdf_path) as document:
+            pages = []
+            for page in document.iter_pages(workers=workers, extract_words=True):
+                pages.append({
+                    'page': page['page'],
+                    'text': page['text'],
+                    'words': page['words'],
+                    'tables': [table['data'] for table in page['tables']],
+                    'table_scanned': page['table_scanned']
+                })
+
+            try:
+                metadata = document.extract_metadata()
+            except Exception as e:
+                logger.error(f"Metadata extraction error: {str(e)}")
+                metadata = {
+                    'error': f"Failed to extract metadata: {str(e)}"
+                }
+
+            return cls(digest or file_digest(pdf_path), document.page_count, metadata, pages)
+
+    def iter_pages(self, extract_text: bool = True, extract_tables: bool = True,
+                   workers: Optional[int] = None, pages: Optional[List[int]] = None,
+                   extract_words: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield page dicts in the PDFDocument.iter_pages() format. workers is ignored."""
+        wanted = set(pages) if pages is not None else None
+        for page in self.pages:
+            if wanted is not None and page['page'] not in wanted:
+                continue
+            yield {
+                'page': page['page'],
+                'text': page['text'] if extract_text else "",
+                'tables': [
+                    {'page': page['page'], 'table_number': j + 1, 'data': data}
+                    for j, data in enumerate(page['tables'])
+                ] if extract_tables else [],
+                'words': page['words'] if extract_words else [],
+                'table_scanned': extract_tables and page['table_scanned']
+            }
+
+    def extract_metadata(self) -> Dict[str, Any]:
+        """Return the metadata captured when the snapshot was built."""
+        return self.metadata
+
+    def save(self, path: str) -> bool:
+        """Write the snapshot atomically in the versioned binary format."""
+        body = json.dumps({
+            'digest': self.digest,
+            'page_count': self.page_count,
+            'metadata': self.metadata,
+            'pages': self.pages
+        }, separators=(',', ':')).encode('utf-8')
+
+        try:
+            # A private temp file per writer, so concurrent builds of one upload never share it
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+                    f.write(zlib.compress(body, 6))
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            return True
+        except Exception as e:
+            logger.error(f"Error writing page snapshot {path}: {str(e)}")
+            return False
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PageSnapshot"]:
+        """Read a snapshot, returning None if it is missing, corrupt or from another version."""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(SNAPSHOT_HEADER.size)
+                if len(header) != SNAPSHOT_HEADER.size:
+                    return None
+                magic, version = SNAPSHOT_HEADER.unpack(header)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    return None
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading page snapshot {path}: {str(e)}")
+            return None
+
+        return cls(data['digest'], data['page_count'], data['metadata'], data['pages'])
+
+def load_or_build_snapshot(pdf_path: str, workers: Optional[int] = None) -> PageSnapshot:
+    """
+    Return the snapshot stored next to a PDF, building and saving it first if it
+    is missing, outdated, or was taken from different PDF bytes.
+    """
+    digest = file_digest(pdf_path)
+    path = snapshot_path(pdf_path)
+
+    snapshot = PageSnapshot.load(path)
+    if snapshot is not None and snapshot.digest == digest:
+        return snapshot
+
+    snapshot = PageSnapshot.build(pdf_path, workers=workers, digest=digest)
+    snapshot.save(path)
+    return snapshot
+
+if __name__ == '__main__':
+    # Backfill snapshots for an archive: python -m utils.page_snapshot uploads/
+    logging.basicConfig(level=logging.INFO)
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'uploads'
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith('.pdf'):
+            try:
+                load_or_build_snapshot(os.path.join(folder, name))
+                logger.info(f"Snapshot ready for {name}")
+            except Exception as e:
+                logger.error(f"Failed to snapshot {name}: {str(e)}")
@@ -0,0 +1,282 @@
+import io
+import os
+import re
+import logging
+import PyPDF2
+import pdfplumber
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Documents shorter than this are not worth the process pool overhead
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 8))
+
+# Pages handed to a worker per task; keeps per-worker memory bounded
+PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 4))
+
+# Default worker count for parallel extraction (0 or 1 disables it)
+DEFAULT_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', 0))
+
+# Follows every page of extracted document text. The form feed marks the page
+# boundary, since page text itself contains blank lines
+PAGE_BREAK = "\f"
+PAGE_SEPARATOR = "\n" + PAGE_BREAK + "\n"
+
+# Thresholds used by score_page_text to decide whether PyPDF2 text is good enough
+MIN_PAGE_CHARS = 40
+MAX_GARBAGE_RATIO = 0.02
+MIN_NUMBERS_WITHOUT_MONEY = 3
+NUMBER_PATTERN = re.compile(r'\d[\d,.]*')
+
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+
+def format_metadata(metadata) -> Dict[str, str]:
+    """Convert a PyPDF2 metadata object into the dictionary used by the app."""
+    if not metadata:
+        return {
+            'author': "Not specified",
+            'creator': "Not specified",
+            'producer': "Not specified",
+            'subject': "Not specified",
+            'title': "Not specified",
+            'creation_date': "Not specified",
+            'modification_date': "Not specified"
+        }
+
+    return {
+        'author': metadata.author or "Not specified",
+        'creator': metadata.creator or "Not specified",
+        'producer': metadata.producer or "Not specified",
+        'subject': metadata.subject or "Not specified",
+        'title': metadata.title or "Not specified",
+        'creation_date': str(metadata.creation_date) if metadata.creation_date else "Not specified",
+        'modification_date': str(metadata.modification_date) if metadata.modification_date else "Not specified"
+    }
+
+def has_table_candidates(page) -> bool:
+    """
+    Cheap geometry check run before pdfplumber's table finder.
+
+    extract_tables() uses the default "lines" strategy, which can only build
+    cells from ruling lines, rect edges and curves. A page needs at least two
+    horizontal and two vertical edges to form a single cell, so pages of plain
+    prose without them are guaranteed to yield no tables.
+    """
+    if page.curves:
+        return True
+
+    horizontal = 0
+    vertical = 0
+    for line in page.lines:
+        if line['top'] == line['bottom']:
+            horizontal += 1
+        else:
+            vertical += 1
+    horizontal += 2 * len(page.rects)
+    vertical += 2 * len(page.rects)
+
+    return horizontal >= 2 and vertical >= 2
+
+def extract_page(page, page_number: int, extract_text: bool = True, extract_tables: bool = True,
+                 extract_words: bool = False) -> Dict[str, Any]:
+    """
+    Extract text and tables from a single pdfplumber page.
+    Both calls share the page's parsed layout, so the page is only parsed once.
+    The table finder is skipped on pages without table candidates.
+    With extract_words, positioned words are returned as [text, x0, top, x1, bottom].
+    """
+    text = ""
+    if extract_text:
+        text = page.extract_text() or ""
+
+    words = []
+    if extract_words:
+        for word in page.extract_words():
+            words.append([word['text'], round(word['x0'], 2), round(word['top'], 2),
+                          round(word['x1'], 2), round(word['bottom'], 2)])
+
+    tables = []
+    table_scanned = extract_tables and has_table_candidates(page)
+    if table_scanned:
+        for j, table_data in enumerate(page.extract_tables()):
+            if table_data and len(table_data) > 0:
+                tables.append({
+                    'page': page_number,
+                    'table_number': j + 1,
+                    'data': table_data
+                })
+
+    return {
+        'page': page_number,
+        'text': text,
+        'tables': tables,
+        'words': words,
+        'table_scanned': table_scanned
+    }
+
+
+def score_page_text(text: str) -> Dict[str, Any]:
+    """
+    Score the quality of a page of extracted text.
+
+    A page passes when it has enough visible characters, few garbage glyphs
+    (replacement characters, private-use glyphs, unmapped "(cid:N)" codes,
+    control characters), and - if it is full of numbers - at least one
+    "$" or "%" token, since engines that drop those glyphs mangle benefit amounts.
+    """
+    visible = [c for c in text if not c.isspace()]
+    char_count = len(visible)
+    garbage = text.count("(cid:") * 6
+    for c in visible:
+        code = ord(c)
+        if c == '\ufffd' or 0xE000 <= code <= 0xF8FF or (code < 32 and c not in '\t\r\n'):
+            garbage += 1
+    garbage_ratio = garbage / char_count if char_count else 1.0
+    money_tokens = text.count('$') + text.count('%')
+    number_tokens = len(NUMBER_PATTERN.findall(text))
+
+    passed = (
+        char_count >= MIN_PAGE_CHARS
+        and garbage_ratio <= MAX_GARBAGE_RATIO
+        and (money_tokens > 0 or number_tokens < MIN_NUMBERS_WITHOUT_MONEY)
+    )
+
+    return {
+        'chars': char_count,
+        'garbage_ratio': round(garbage_ratio, 4),
+        'money_tokens': money_tokens,
+        'passed': passed
+    }
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Return a shared process pool with the given number of workers."""
+    pool = _process_pools.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pools[workers] = pool
+    return pool
+
+def _extract_page_range(pdf_path: str, page_numbers: List[int], extract_text: bool,
+                        extract_tables: bool, extract_words: bool = False) -> List[Dict[str, Any]]:
+    """Worker entry point: extract the given 1-based page numbers from the PDF."""
+    results = []
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            try:
+                results.append(extract_page(page, page.page_number, extract_text, extract_tables, extract_words))
+            finally:
+                page.close()
+    return results
+
+def iter_pages_parallel(pdf_path: str, page_numbers: List[int], workers: int, extract_text: bool = True,
+                        extract_tables: bool = True, extract_words: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Extract pages across a process pool, yielding results in page order.
+    Each task covers at most PAGES_PER_TASK pages so no worker holds a whole booklet.
+    """
+    pool = get_process_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, pdf_path, page_numbers[start:start + PAGES_PER_TASK],
+                    extract_text, extract_tables, extract_words)
+        for start in range(0, len(page_numbers), PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+class PDFDocument:
+    """
+    A single open handle on a PDF file, shared by every extraction step.
+
+    The file is read from disk once; pdfplumber and PyPDF2 each get their own
+    in-memory stream over the same bytes. Use it as a context manager:
+
+        with PDFDocument(path) as document:
+            for page in document.iter_pages():
+                ...
+    """
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = pdf_path
+        self.data = b""
+        self._pdf = None
+        self._reader = None
+
+    def __enter__(self) -> "PDFDocument":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Read the file and open it with pdfplumber."""
+        with open(self.pdf_path, 'rb') as file:
+            self.data = file.read()
+        self._pdf = pdfplumber.open(io.BytesIO(self.data))
+
+    def close(self):
+        """Release the pdfplumber handle and the cached file bytes."""
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        self._reader = None
+        self.data = b""
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pdf.pages)
+
+    @property
+    def reader(self) -> PyPDF2.PdfReader:
+        """PyPDF2 reader over the same bytes, created on first use."""
+        if self._reader is None:
+            self._reader = PyPDF2.PdfReader(io.BytesIO(self.data))
+        return self._reader
+
+    def iter_pages(self, extract_text: bool = True, extract_tables: bool = True,
+                   workers: Optional[int] = None, pages: Optional[List[int]] = None,
+                   extract_words: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Walk every page once, yielding a dict with 'page', 'text' and 'tables'.
+        Page caches are flushed as soon as a page is done to keep memory flat.
+
+        pages restricts the walk to the given 1-based page numbers. With
+        workers > 1, walks of at least PARALLEL_MIN_PAGES pages are split into
+        page ranges and extracted on a process pool instead.
+        """
+        if workers is None:
+            workers = DEFAULT_WORKERS
+        if pages is None:
+            pages = list(range(1, self.page_count + 1))
+
+        if workers > 1 and len(pages) >= PARALLEL_MIN_PAGES:
+            yield from iter_pages_parallel(self.pdf_path, pages, workers,
+                                           extract_text, extract_tables, extract_words)
+            return
+
+        for page_number in pages:
+            page = self._pdf.pages[page_number - 1]
+            try:
+                yield extract_page(page, page_number, extract_text, extract_tables, extract_words)
+            finally:
+                page.close()
+
+    def extract_metadata(self) -> Dict[str, str]:
+        """Extract metadata using PyPDF2."""
+        return format_metadata(self.reader.metadata)
+
+    def extract_pypdf_pages(self) -> List[str]:
+        """Extract the text of every page with PyPDF2."""
+        return [page.extract_text() or "" for page in self.reader.pages]
+
+    def extract_pypdf_text(self) -> str:
+        """Extract the full text with PyPDF2, used as a fallback engine."""
+        text = ""
+        for page in self.reader.pages:
+            text += (page.extract_text() or "") + PAGE_SEPARATOR
+        return text
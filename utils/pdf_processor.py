@@ -1,17 +1,25 @@
 import os
-import re
 import PyPDF2
-import pdfplumber
-import pandas as pd
 from typing import List, Dict, Any, Tuple, Optional
 import logging
 from .perplexity_api import analyze_text_with_perplexity
+from .pdf_document import PDFDocument, format_metadata, score_page_text, PAGE_SEPARATOR
+from .extraction_cache import ExtractionCache, ResponseCache, file_digest
+from .page_snapshot import load_or_build_snapshot
+from .table_export import save_tables_xlsx
 
 logger = logging.getLogger(__name__)
 
 class PDFProcessor:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, workers: Optional[int] = None, cache: Optional[ExtractionCache] = None,
+                 text_engine: str = 'both', snapshot: bool = False):
         self.pdf_path = pdf_path
+        self.workers = workers  # Process pool size for page-parallel extraction
+        self.cache = cache  # Optional content-addressed cache of extraction results
+        self.text_engine = text_engine  # 'both' or 'adaptive'
+        self.snapshot = snapshot  # Parse from a persisted per-page snapshot next to the PDF
+        self.page_engines = []  # Text engine used for each page
+        self.table_stats = {'pages_scanned': 0, 'pages_skipped': 0}  # Table prefilter counters
         self.pypdf_text = ""
         self.pdfplumber_text = ""
         self.tables = []
@@ -19,22 +27,135 @@ class PDFProcessor:
         self.page_count = 0
     
     def extract_all(self):
-        """Extract all data from the PDF: text, tables, and metadata."""
-        self.extract_text()
-        self.extract_tables()
-        self.extract_metadata()
+        """
+        Extract all data from the PDF: text, tables, and metadata.
+        The file is opened once and every page is parsed a single time.
+        When a cache is configured, previously seen documents skip parsing entirely.
+        With snapshots enabled, pages are read from the page snapshot instead of the PDF.
+        The text always comes from pdfplumber: every page is opened for table
+        finding anyway, so text_engine only applies to extract_text().
+        """
+        digest, cached = self._cache_lookup()
+        if cached:
+            self._load_cache_entry(cached)
+            return self._all_results()
+
+        try:
+            with self._open_pages() as document:
+                self.page_count = document.page_count
+                pdfplumber_text = ""
+                tables = []
+                self.table_stats = {'pages_scanned': 0, 'pages_skipped': 0}
+                for page in document.iter_pages(workers=self.workers):
+                    pdfplumber_text += page['text'] + PAGE_SEPARATOR
+                    self.table_stats['pages_scanned' if page['table_scanned'] else 'pages_skipped'] += 1
+                    for table in page['tables']:
+                        tables.append(table)
+                self.pdfplumber_text = pdfplumber_text
+                self.tables = tables
+                self.page_engines = ['pdfplumber'] * self.page_count
+
+                try:
+                    self.metadata = document.extract_metadata()
+                except Exception as e:
+                    logger.error(f"Metadata extraction error: {str(e)}")
+                    self.metadata = {
+                        'error': f"Failed to extract metadata: {str(e)}"
+                    }
+
+            # PyPDF2 text is only needed when pdfplumber found nothing
+            if not self.pdfplumber_text.strip():
+                try:
+                    with PDFDocument(self.pdf_path) as document:
+                        self.pypdf_text = document.extract_pypdf_text()
+                except Exception as e:
+                    logger.error(f"PyPDF2 extraction error: {str(e)}")
+                    self.pypdf_text = ""
+        except Exception as e:
+            logger.error(f"Single-pass extraction error: {str(e)}")
+            # Fall back to the individual extraction steps, without caching
+            # what may be partial results
+            digest = None
+            self.extract_text()
+            self.extract_tables()
+            self.extract_metadata()
+
+        if digest is not None:
+            self.cache.put(digest, 'document', self._cache_entry())
+
+        return self._all_results()
+    
+    def _cache_lookup(self) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (file digest, cached 'document' entry); both None without a usable cache."""
+        if self.cache is None:
+            return None, None
+        try:
+            digest = file_digest(self.pdf_path)
+            return digest, self.cache.get(digest, 'document')
+        except Exception as e:
+            logger.error(f"Extraction cache error: {str(e)}")
+            return None, None
+    
+    def _open_pages(self):
+        """Page source for pdfplumber results: the page snapshot when enabled, else the PDF."""
+        if self.snapshot:
+            return load_or_build_snapshot(self.pdf_path, self.workers)
+        return PDFDocument(self.pdf_path)
+    
+    def _all_results(self) -> Dict[str, Any]:
         return {
             "text": self.pdfplumber_text if self.pdfplumber_text else self.pypdf_text,
             "tables": self.tables,
             "metadata": self.metadata,
-            "page_count": self.page_count
+            "page_count": self.page_count,
+            "table_stats": self.table_stats
         }
     
+    def _cache_entry(self) -> Dict[str, Any]:
+        """Build the JSON-serializable cache entry for this document."""
+        return {
+            'pypdf_text': self.pypdf_text,
+            'pdfplumber_text': self.pdfplumber_text,
+            'tables': [
+                {'page': table['page'], 'table_number': table['table_number'], 'data': table['data']}
+                for table in self.tables
+            ],
+            'metadata': self.metadata,
+            'page_count': self.page_count,
+            'page_engines': self.page_engines,
+            'table_stats': self.table_stats
+        }
+    
+    def _load_cache_entry(self, entry: Dict[str, Any]):
+        """Restore extraction results from a cache entry."""
+        self.pypdf_text = entry.get('pypdf_text', "")
+        self.pdfplumber_text = entry.get('pdfplumber_text', "")
+        self.tables = entry.get('tables', [])
+        self.metadata = entry.get('metadata', {})
+        self.page_count = entry.get('page_count', 0)
+        self.page_engines = entry.get('page_engines', [])
+        self.table_stats = entry.get('table_stats', {'pages_scanned': 0, 'pages_skipped': 0})
+    
     def extract_text(self) -> Tuple[str, str]:
         """
         Extract text from PDF using both PyPDF2 and pdfplumber.
         Returns a tuple of (pypdf_text, pdfplumber_text).
+
+        In 'adaptive' text engine mode, pdfplumber only runs on pages where the
+        PyPDF2 text fails the quality check, and pdfplumber_text holds the best
+        text for every page.
+
+        A document already in the cache is served from its 'document' entry,
+        which keeps the PyPDF2 text only when pdfplumber found none.
         """
+        _, cached = self._cache_lookup()
+        if cached:
+            self._load_cache_entry(cached)
+            return (self.pypdf_text, self.pdfplumber_text)
+        
+        if self.text_engine == 'adaptive':
+            return self._extract_text_adaptive()
+        
         # Extract text using PyPDF2
         try:
             with open(self.pdf_path, 'rb') as file:
@@ -42,7 +163,7 @@ class PDFProcessor:
                 self.page_count = len(reader.pages)
                 pypdf_text = ""
                 for page in reader.pages:
-                    pypdf_text += page.extract_text() + "\n\n"
+                    pypdf_text += page.extract_text() + PAGE_SEPARATOR
                 self.pypdf_text = pypdf_text
         except Exception as e:
             logger.error(f"PyPDF2 extraction error: {str(e)}")
@@ -50,49 +171,76 @@ class PDFProcessor:
         
         # Extract text using pdfplumber
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                self.page_count = len(pdf.pages)
+            with self._open_pages() as document:
+                self.page_count = document.page_count
                 pdfplumber_text = ""
-                for page in pdf.pages:
-                    text = page.extract_text() or ""
-                    pdfplumber_text += text + "\n\n"
+                for page in document.iter_pages(extract_tables=False, workers=self.workers):
+                    pdfplumber_text += page['text'] + PAGE_SEPARATOR
                 self.pdfplumber_text = pdfplumber_text
         except Exception as e:
             logger.error(f"pdfplumber extraction error: {str(e)}")
             self.pdfplumber_text = ""
         
+        self.page_engines = ['pdfplumber'] * self.page_count
+        return (self.pypdf_text, self.pdfplumber_text)
+    
+    def _extract_text_adaptive(self) -> Tuple[str, str]:
+        """
+        Extract text with PyPDF2 first and re-extract only low quality pages
+        with pdfplumber. Records the engine used for each page in page_engines.
+        With snapshots enabled, the pdfplumber text of those pages is read from
+        the snapshot instead of parsing the PDF again.
+        """
+        try:
+            with PDFDocument(self.pdf_path) as document:
+                self.page_count = document.page_count
+                
+                try:
+                    pypdf_pages = document.extract_pypdf_pages()
+                except Exception as e:
+                    logger.error(f"PyPDF2 extraction error: {str(e)}")
+                    pypdf_pages = [""] * self.page_count
+                self.pypdf_text = "".join(text + PAGE_SEPARATOR for text in pypdf_pages)
+                
+                best_pages = list(pypdf_pages)
+                engines = ['pypdf2'] * self.page_count
+                retry_pages = [i + 1 for i, text in enumerate(pypdf_pages) if not score_page_text(text)['passed']]
+                
+                retried = None
+                if self.snapshot and retry_pages:
+                    try:
+                        with self._open_pages() as snapshot:
+                            retried = list(snapshot.iter_pages(extract_tables=False, pages=retry_pages))
+                    except Exception as e:
+                        logger.error(f"Snapshot text extraction error: {str(e)}")
+                if retried is None:
+                    retried = document.iter_pages(extract_tables=False, workers=self.workers, pages=retry_pages)
+                
+                for page in retried:
+                    best_pages[page['page'] - 1] = page['text']
+                    engines[page['page'] - 1] = 'pdfplumber'
+                
+                self.pdfplumber_text = "".join(text + PAGE_SEPARATOR for text in best_pages)
+                self.page_engines = engines
+        except Exception as e:
+            logger.error(f"Adaptive text extraction error: {str(e)}")
+            self.text_engine = 'both'
+            return self.extract_text()
+        
         return (self.pypdf_text, self.pdfplumber_text)
     
     def extract_tables(self) -> List[Dict[str, Any]]:
         """
         Extract tables from PDF using pdfplumber.
-        Returns a list of tables, where each table is a dict with 'page', 'data', and 'dataframe'.
+        Returns a list of tables, where each table is a dict with 'page', 'table_number' and 'data'.
         """
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
+            with self._open_pages() as document:
                 tables = []
-                for i, page in enumerate(pdf.pages):
-                    page_tables = page.extract_tables()
-                    for j, table_data in enumerate(page_tables):
-                        if table_data and len(table_data) > 0:
-                            # Convert to dataframe for easier manipulation
-                            df = pd.DataFrame(table_data)
-                            
-                            # Use first row as header if it looks like a header
-                            if df.shape[0] > 1:
-                                df.columns = df.iloc[0]
-                                df = df.iloc[1:]
-                            
-                            # Reset index
-                            df = df.reset_index(drop=True)
-                            
-                            # Save as dict for JSON serialization
-                            tables.append({
-                                'page': i + 1,
-                                'table_number': j + 1,
-                                'data': table_data,
-                                'dataframe': df  # This won't be JSON serialized, but useful for Excel export
-                            })
+                self.table_stats = {'pages_scanned': 0, 'pages_skipped': 0}
+                for page in document.iter_pages(extract_text=False, workers=self.workers):
+                    self.table_stats['pages_scanned' if page['table_scanned'] else 'pages_skipped'] += 1
+                    tables.extend(page['tables'])
                 self.tables = tables
                 return tables
         except Exception as e:
@@ -105,26 +253,7 @@ class PDFProcessor:
         try:
             with open(self.pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                if reader.metadata:
-                    self.metadata = {
-                        'author': reader.metadata.author or "Not specified",
-                        'creator': reader.metadata.creator or "Not specified",
-                        'producer': reader.metadata.producer or "Not specified",
-                        'subject': reader.metadata.subject or "Not specified",
-                        'title': reader.metadata.title or "Not specified",
-                        'creation_date': str(reader.metadata.creation_date) if reader.metadata.creation_date else "Not specified",
-                        'modification_date': str(reader.metadata.modification_date) if reader.metadata.modification_date else "Not specified"
-                    }
-                else:
-                    self.metadata = {
-                        'author': "Not specified",
-                        'creator': "Not specified",
-                        'producer': "Not specified",
-                        'subject': "Not specified",
-                        'title': "Not specified",
-                        'creation_date': "Not specified",
-                        'modification_date': "Not specified"
-                    }
+                self.metadata = format_metadata(reader.metadata)
                 return self.metadata
         except Exception as e:
             logger.error(f"Metadata extraction error: {str(e)}")
@@ -146,35 +275,25 @@ class PDFProcessor:
             return False
     
     def save_tables_to_excel(self, output_path: str) -> bool:
-        """Save extracted tables to an Excel file."""
+        """
+        Save extracted tables to an Excel file, one sheet per table.
+        Rows are streamed from the raw table data in write-only mode.
+        """
         try:
             if not self.tables:
                 return False
             
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                for i, table in enumerate(self.tables):
-                    # Convert to dataframe if needed
-                    if 'dataframe' in table:
-                        df = table['dataframe']
-                    else:
-                        df = pd.DataFrame(table['data'])
-                    
-                    # Create a sheet name
-                    sheet_name = f"Table_{i+1}_Page_{table['page']}"
-                    if len(sheet_name) > 31:  # Excel sheet name length limitation
-                        sheet_name = f"Table_{i+1}"
-                    
-                    # Write to Excel
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
+            save_tables_xlsx(self.tables, output_path)
             return True
         except Exception as e:
             logger.error(f"Error saving Excel file: {str(e)}")
             return False
     
-    def analyze_with_perplexity(self, api_key: str, custom_query: Optional[str] = None) -> Dict[str, Any]:
+    def analyze_with_perplexity(self, api_key: str, custom_query: Optional[str] = None,
+                                response_cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
         """
         Analyze the PDF text using Perplexity API.
+        Identical analyses are served from response_cache when one is given.
         """
         # Make sure we have text
         if not self.pdfplumber_text and not self.pypdf_text:
@@ -187,7 +306,7 @@ class PDFProcessor:
             return {"error": "No text could be extracted from the PDF"}
         
         try:
-            return analyze_text_with_perplexity(api_key, text, custom_query)
+            return analyze_text_with_perplexity(api_key, text, custom_query, cache=response_cache)
         except Exception as e:
             logger.error(f"Perplexity analysis error: {str(e)}")
             return {"error": f"Analysis error: {str(e)}"}
@@ -209,5 +328,10 @@ class PDFProcessor:
             'tables': serializable_tables,
             'metadata': self.metadata,
             'page_count': self.page_count,
+            'page_engines': self.page_engines,
+            'engine_summary': {
+                engine: self.page_engines.count(engine) for engine in sorted(set(self.page_engines))
+            },
+            'table_stats': self.table_stats,
             'filename': os.path.basename(self.pdf_path)
         }
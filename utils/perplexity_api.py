@@ -1,28 +1,368 @@
+import os
+import re
 import requests
 import json
+import time
+import hashlib
+import random
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, Tuple, Iterator
+from .extraction_cache import ResponseCache
+from .section_retrieval import select_relevant_text, DEFAULT_CONTEXT_CHARS
 
 logger = logging.getLogger(__name__)
 
-def analyze_text_with_perplexity(api_key: str, text: str, query: Optional[str] = None) -> Dict[str, Any]:
+PERPLEXITY_API_URL = "https://api.perplexity.ai"
+
+# Overrides the API base URL of the shared client, e.g. to use benchmarks.perplexity_mock
+BASE_URL_ENV = 'PERPLEXITY_API_URL'
+
+# (connect, read) timeout for a single HTTP attempt, in seconds
+DEFAULT_TIMEOUT = (5.0, 60.0)
+
+# Total time budget for one call, retries and backoff included
+DEFAULT_DEADLINE = 90.0
+
+# Retry policy: transient statuses are retried with full-jitter exponential backoff
+MAX_RETRIES = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Circuit breaker: open after this many consecutive failed calls, probe again after the cooldown
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# Connections kept alive per host
+POOL_SIZE = 10
+
+# Provider rate limit shared by every call of the process, and the burst allowed above it
+DEFAULT_REQUESTS_PER_MINUTE = 50
+DEFAULT_BURST = 8
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and calls fail fast."""
+
+class CircuitBreaker:
     """
-    Use the Perplexity API to analyze the provided text.
-    
-    Args:
-        api_key: The Perplexity API key
-        text: The text to analyze
-        query: Optional custom query to use instead of the default
-        
-    Returns:
-        Dictionary containing the analysis result
+    Consecutive-failure circuit breaker.
+
+    Closed: calls go through. After failure_threshold failed calls in a row it
+    opens and every call fails fast for reset_timeout seconds. It then lets a
+    single probe call through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Perplexity circuit breaker opened")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """End a call that never reached the API without counting it either way."""
+        with self._lock:
+            self.probing = False
+
+class RateLimitTimeout(Exception):
+    """Raised when no request slot frees up before the call's deadline."""
+
+class RateLimiter:
+    """
+    Thread-safe token bucket pacing requests to requests_per_minute, with up
+    to burst requests back to back. Over any window of t seconds at most
+    burst + rate * t requests are let through. Waiters are served one at a
+    time in arrival order. pause() stops all requests, e.g. for a 429's
+    Retry-After. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE, burst: int = DEFAULT_BURST):
+        self._lock = threading.Lock()  # Guards the bucket state
+        self._queue = threading.Lock()  # Held by the waiter first in line
+        self.paused_until = 0.0
+        self.configure(requests_per_minute, burst)
+
+    def configure(self, requests_per_minute: float, burst: int = DEFAULT_BURST):
+        with self._lock:
+            self.rate = max(requests_per_minute, 0.0) / 60.0
+            self.capacity = max(burst, 1)
+            self.tokens = float(self.capacity)
+            self.updated = time.monotonic()
+
+    def pause(self, seconds: float):
+        """Let nothing through for the next seconds, and start refilling from empty afterwards."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+    def _wait_time(self) -> float:
+        """Take a token and return 0, or return the seconds until one may be available."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.rate <= 0:
+                return 0.0
+            self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0.0) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a request slot. Returns False if none frees up within timeout seconds."""
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        if not self._queue.acquire(timeout=-1 if timeout is None else max(timeout, 0)):
+            return False
+        try:
+            while True:
+                wait = self._wait_time()
+                if not wait:
+                    return True
+                if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                    return False
+                time.sleep(wait)
+        finally:
+            self._queue.release()
+
+class PerplexityClient:
+    """
+    Reusable Perplexity API client.
+
+    Keeps pooled keep-alive connections in a requests Session, bounds every
+    call by a deadline, retries 429/5xx and connection errors with jittered
+    backoff (honouring Retry-After), and fails fast through a circuit breaker
+    while the API is degraded. With a rate_limiter, every HTTP attempt,
+    retries included, first waits for a request slot. base_url can point at a
+    local stand-in server.
+    """
+
+    def __init__(self, base_url: str = PERPLEXITY_API_URL, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 deadline: float = DEFAULT_DEADLINE, max_retries: int = MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None, pool_size: int = POOL_SIZE,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Seconds to wait before the next attempt."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), BACKOFF_MAX)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def _pause_for(self, response: requests.Response):
+        """Hold every request of the rate limiter for a 429's Retry-After."""
+        try:
+            pause = min(float(response.headers.get('Retry-After') or 0), BACKOFF_MAX)
+        except ValueError:
+            pause = 0.0
+        if pause > 0:
+            self.rate_limiter.pause(pause)
+
+    def chat(self, api_key: str, payload: Dict[str, Any], deadline: Optional[float] = None,
+             stream: bool = False) -> requests.Response:
+        """
+        POST a chat completion request and return the final HTTP response.
+
+        With stream, the body is left unread so it can be consumed as it
+        arrives; retries only happen before the first byte of a response.
+
+        Raises CircuitOpenError when failing fast, RateLimitTimeout when the
+        rate limiter has no slot before the deadline, and requests exceptions
+        when every attempt failed to get a response.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Perplexity API is unavailable (circuit open)")
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        url = f"{self.base_url}/chat/completions"
+        give_up_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        connect_timeout, read_timeout = self.timeout
+
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                if self.rate_limiter is not None and not self.rate_limiter.acquire(give_up_at - time.monotonic()):
+                    # Never reached the API, so this says nothing about its health
+                    self.breaker.release()
+                    recorded = True
+                    raise RateLimitTimeout("Perplexity rate limit: no request slot before the deadline")
+
+                remaining = max(give_up_at - time.monotonic(), 0.1)
+                response = None
+                error = None
+                try:
+                    response = self.session.post(
+                        url,
+                        headers=headers,
+                        json=payload,
+                        timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)),
+                        stream=stream
+                    )
+                except requests.RequestException as e:
+                    error = e
+
+                if response is not None and response.status_code == 429 and self.rate_limiter is not None:
+                    self._pause_for(response)
+
+                if response is not None and response.status_code not in RETRY_STATUSES:
+                    # Any non-transient answer means the API itself is reachable
+                    self.breaker.record_success()
+                    recorded = True
+                    return response
+
+                delay = self._backoff(attempt, response)
+                attempt += 1
+                if (attempt > self.max_retries or time.monotonic() + delay >= give_up_at
+                        or (error is not None and not isinstance(error, RETRY_ERRORS))):
+                    self.breaker.record_failure()
+                    recorded = True
+                    if response is not None:
+                        return response
+                    raise error
+
+                if response is not None:
+                    response.close()
+                logger.warning(
+                    f"Perplexity request failed ({response.status_code if response is not None else error}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+        finally:
+            # Every call the breaker let through records an outcome, or a half-open probe would never end
+            if not recorded:
+                self.breaker.record_failure()
+
+# Every Perplexity call of the process draws from this one limiter: the shared
+# client's calls, and the batch driver's (utils.ai_batch). The limit is per
+# process, so with several server processes each one gets a share of the
+# provider's limit (see set_rate_limit).
+_rate_limiter = RateLimiter()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide Perplexity rate limiter."""
+    return _rate_limiter
+
+def set_rate_limit(requests_per_minute: float, burst: int = DEFAULT_BURST, processes: int = 1):
+    """
+    Set the process-wide Perplexity rate limit. processes is the number of
+    server processes sharing the provider's requests_per_minute; each gets
+    an equal share.
+
+    Each process may send up to burst requests at once, so concurrent calls
+    (map-reduce sections, several interactive requests) don't queue one
+    behind the other. The burst comes out of the process's share: the steady
+    rate is the share minus the burst, so no 60-second window goes over the
+    share. The burst is capped to leave at least one request a minute of
+    steady rate; shares under two requests a minute get a burst of one.
+    """
+    share = requests_per_minute / max(processes, 1)
+    burst = min(burst, int(share) - 1)
+    if share <= 0 or burst < 1:
+        _rate_limiter.configure(share, 1)
+    else:
+        _rate_limiter.configure(share - burst, burst)
+
+def get_client() -> PerplexityClient:
+    """
+    Return the process-wide shared Perplexity client, paced by the shared
+    rate limiter. Its base URL comes from the PERPLEXITY_API_URL environment
+    variable when set.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PerplexityClient(base_url=os.environ.get(BASE_URL_ENV) or PERPLEXITY_API_URL,
+                                       rate_limiter=_rate_limiter)
+        return _client
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def response_cache_key(model: str, query: str, text: str, temperature: float) -> str:
+    """
+    Cache key for an analysis: model, query, temperature and a hash of the
+    document text with whitespace normalized, so re-extracted copies of the
+    same document share an entry.
+    """
+    text_hash = hashlib.sha256(WHITESPACE_PATTERN.sub(' ', text).strip().encode('utf-8')).hexdigest()
+    key = json.dumps([model, query, text_hash, temperature])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def build_analysis_request(text: str, query: Optional[str] = None,
+                           field_queries: Optional[Dict[str, str]] = None,
+                           context_chars: int = DEFAULT_CONTEXT_CHARS,
+                           stream: bool = False) -> Tuple[Dict[str, Any], str, str]:
+    """
+    Build the chat completion payload for an analysis. Returns the payload
+    with the query and document text actually used, which key the response cache.
     """
-    if not api_key:
-        raise ValueError("Perplexity API key is required")
-    
     if not text or len(text) < 10:
         raise ValueError("Text is too short for analysis")
     
+    # Send only the sections relevant to the requested fields
+    if field_queries:
+        text = select_relevant_text(text, field_queries, max_chars=context_chars)
+    
     # Truncate text if it's too long
     max_text_length = 32000  # Reduce to avoid hitting token limits
     if len(text) > max_text_length:
@@ -39,11 +379,6 @@ def analyze_text_with_perplexity(api_key: str, text: str, query: Optional[str] =
     # Prepare the prompt that includes both the query and the document text
     prompt = f"{query}\n\nDocument text:\n\n{text}"
     
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
     payload = {
         "model": "llama-3.1-sonar-small-128k-online",
         "messages": [
@@ -59,21 +394,58 @@ def analyze_text_with_perplexity(api_key: str, text: str, query: Optional[str] =
         "temperature": 0.2,
         "top_p": 0.9,
         "max_tokens": 2000,
-        "stream": False,
+        "stream": stream,
         "presence_penalty": 0,
         "frequency_penalty": 1
     }
     
+    return payload, query, text
+
+def analyze_text_with_perplexity(api_key: str, text: str, query: Optional[str] = None,
+                                 client: Optional[PerplexityClient] = None,
+                                 cache: Optional[ResponseCache] = None,
+                                 field_queries: Optional[Dict[str, str]] = None,
+                                 context_chars: int = DEFAULT_CONTEXT_CHARS,
+                                 deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Use the Perplexity API to analyze the provided text.
+    
+    Args:
+        api_key: The Perplexity API key
+        text: The text to analyze
+        query: Optional custom query to use instead of the default
+        client: Optional client to use instead of the shared one
+        cache: Optional response cache; identical analyses are served from it
+        field_queries: Optional field name -> search terms; when given, only the
+            document sections that best match the fields (up to context_chars)
+            are sent instead of the truncated document
+        context_chars: Character budget for the selected sections
+        deadline: Optional seconds for the whole call, rate limiter wait
+            included, instead of the client's default
+        
+    Returns:
+        Dictionary containing the analysis result
+    """
+    if not api_key:
+        raise ValueError("Perplexity API key is required")
+    
+    payload, query, text = build_analysis_request(text, query, field_queries, context_chars)
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = response_cache_key(payload["model"], query, text, payload["temperature"])
+        cached = cache.get(cache_key, 'perplexity')
+        if cached:
+            cached["cached"] = True
+            return cached
+    
     try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers=headers,
-            json=payload
-        )
+        response = (client or get_client()).chat(api_key, payload, deadline)
         
         if response.status_code != 200:
             logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
-            return {"error": f"API error: {response.status_code}", "details": response.text}
+            return {"error": f"API error: {response.status_code}", "details": response.text,
+                    "status": response.status_code}
         
         result = response.json()
         
@@ -84,8 +456,105 @@ def analyze_text_with_perplexity(api_key: str, text: str, query: Optional[str] =
             "citations": result.get("citations", [])
         }
         
+        if cache_key is not None:
+            cache.put(cache_key, 'perplexity', analysis)
+        
         return analysis
     
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return {"error": str(e), "circuit_open": True}
+    
     except Exception as e:
         logger.error(f"Error calling Perplexity API: {str(e)}")
         return {"error": f"Error calling Perplexity API: {str(e)}"}
+
+def _stream_deltas(response: requests.Response, result: Dict[str, Any]) -> Iterator[str]:
+    """
+    Yield the content fragments of a streamed (server-sent events) chat
+    completion. The model and citations are recorded in result as they arrive.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+            continue
+        result["model"] = chunk.get("model", result.get("model"))
+        if chunk.get("citations"):
+            result["citations"] = chunk["citations"]
+        choices = chunk.get("choices") or [{}]
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+def stream_text_with_perplexity(api_key: str, text: str, query: Optional[str] = None,
+                                client: Optional[PerplexityClient] = None,
+                                cache: Optional[ResponseCache] = None,
+                                field_queries: Optional[Dict[str, str]] = None,
+                                context_chars: int = DEFAULT_CONTEXT_CHARS) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of analyze_text_with_perplexity().
+
+    Yields {"type": "delta", "content": ...} events as the model generates,
+    then one {"type": "done", ...} event with the full analysis (the same
+    dict analyze_text_with_perplexity() returns), or {"type": "error", ...}.
+    A cached analysis is replayed as a single delta. Complete streams are
+    stored in the cache like non-streamed analyses.
+    """
+    if not api_key:
+        raise ValueError("Perplexity API key is required")
+    
+    payload, query, text = build_analysis_request(text, query, field_queries, context_chars, stream=True)
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = response_cache_key(payload["model"], query, text, payload["temperature"])
+        cached = cache.get(cache_key, 'perplexity')
+        if cached:
+            cached["cached"] = True
+            yield {"type": "delta", "content": cached["content"]}
+            yield dict(cached, type="done")
+            return
+    
+    try:
+        response = (client or get_client()).chat(api_key, payload, stream=True)
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        yield {"type": "error", "error": str(e), "circuit_open": True}
+        return
+    except Exception as e:
+        logger.error(f"Error calling Perplexity API: {str(e)}")
+        yield {"type": "error", "error": f"Error calling Perplexity API: {str(e)}"}
+        return
+    
+    with response:
+        if response.status_code != 200:
+            logger.error(f"Perplexity API error: {response.status_code} - {response.text}")
+            yield {"type": "error", "error": f"API error: {response.status_code}", "status": response.status_code}
+            return
+        
+        result = {"model": payload["model"], "citations": []}
+        parts = []
+        try:
+            for delta in _stream_deltas(response, result):
+                parts.append(delta)
+                yield {"type": "delta", "content": delta}
+        except Exception as e:
+            logger.error(f"Perplexity stream interrupted: {str(e)}")
+            yield {"type": "error", "error": f"Stream interrupted: {str(e)}"}
+            return
+    
+    analysis = {
+        "content": "".join(parts),
+        "model": result["model"],
+        "citations": result["citations"]
+    }
+    if cache_key is not None and analysis["content"]:
+        cache.put(cache_key, 'perplexity', analysis)
+    yield dict(analysis, type="done")
@@ -0,0 +1,176 @@
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Any
+
+from .pdf_document import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+# Target size of a chunk; sections longer than this are split at line boundaries
+CHUNK_CHARS = 1200
+
+# Default character budget for the text sent to the API
+DEFAULT_CONTEXT_CHARS = 12000
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Search terms for each field requested by the /extract-benefits-ai prompt
+BENEFIT_FIELD_QUERIES = {
+    'carrier_plan': "insurance company plan name summary of benefits coverage period",
+    'deductible': "deductible individual family in-network out-of-network overall",
+    'coinsurance': "coinsurance percent in-network out-of-network",
+    'out_of_pocket': "out-of-pocket limit maximum individual family",
+    'office_visits': "primary care visit specialist visit urgent care copay",
+    'emergency_room': "emergency room care emergency medical transportation",
+    'preventive_services': "preventive care screening immunization",
+    'outpatient_surgery': "outpatient surgery facility fee ambulatory surgical center",
+    'hospitalization': "hospital stay inpatient facility fee physician surgeon",
+    'imaging': "diagnostic imaging ct pet scans mri x-ray lab",
+    'prescription': "prescription drugs generic preferred brand non-preferred specialty tier mail order",
+    'network': "network provider ppo hmo epo pos embedded aggregate",
+    'contact': "customer service phone number website www"
+}
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _is_heading(line: str) -> bool:
+    """Short all-caps lines and lines ending in ':' start a new section."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 80:
+        return False
+    letters = [c for c in stripped if c.isalpha()]
+    return stripped.endswith(':') or (len(letters) >= 4 and stripped.isupper())
+
+def chunk_document(text: str, chunk_chars: int = CHUNK_CHARS) -> List[Dict[str, Any]]:
+    """
+    Split extracted text into chunks by page and section.
+
+    Pages end at the PAGE_BREAK form feed both text engines emit after every
+    page; text without page breaks is one unnumbered page. Within a page a
+    chunk ends at a section heading or once it reaches chunk_chars. Each
+    chunk is a dict with 'page' (None when unknown), 'text' and 'index'.
+    """
+    chunks = []
+    pages = text.split(PAGE_BREAK)
+    numbered = len(pages) > 1
+    for page_number, page_text in enumerate(pages, start=1):
+        page = page_number if numbered else None
+        lines = []
+        size = 0
+        for line in page_text.strip("\n").split("\n"):
+            if lines and (size + len(line) > chunk_chars or _is_heading(line)):
+                chunks.append({'page': page, 'text': "\n".join(lines), 'index': len(chunks)})
+                lines = []
+                size = 0
+            lines.append(line)
+            size += len(line) + 1
+        if any(line.strip() for line in lines):
+            chunks.append({'page': page, 'text': "\n".join(lines), 'index': len(chunks)})
+    return chunks
+
+class BM25Index:
+    """Okapi BM25 keyword index over a list of text chunks."""
+
+    def __init__(self, chunks: List[Dict[str, Any]], k1: float = BM25_K1, b: float = BM25_B):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(chunk['text'])) for chunk in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """Return the BM25 score of every chunk for the query."""
+        terms = set(tokenize(query))
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+def rank_chunks(chunks: List[Dict[str, Any]], field_queries: Dict[str, str] = BENEFIT_FIELD_QUERIES) -> List[int]:
+    """
+    Rank chunks for a multi-field extraction: the best chunk for every field
+    first, so fields that only appear late in the document are not cut off,
+    then every other chunk matching any field, by combined score. Chunks that
+    match no field are left out. Returns chunk positions, best first, without
+    duplicates.
+    """
+    if not chunks:
+        return []
+
+    index = BM25Index(chunks)
+    field_scores = [index.scores(query) for query in field_queries.values()]
+
+    # Normalize per field so no single field dominates the overall ranking
+    combined = [0.0] * len(chunks)
+    for scores in field_scores:
+        best = max(scores)
+        if best > 0:
+            for i, score in enumerate(scores):
+                combined[i] += score / best
+
+    ranked = []
+    for scores in field_scores:
+        best = max(range(len(chunks)), key=scores.__getitem__)
+        if scores[best] > 0 and best not in ranked:
+            ranked.append(best)
+    ranked.extend(i for i in sorted(range(len(chunks)), key=lambda i: combined[i], reverse=True)
+                  if combined[i] > 0 and i not in ranked)
+    return ranked
+
+def select_relevant_text(text: str, field_queries: Dict[str, str] = BENEFIT_FIELD_QUERIES,
+                         max_chars: int = DEFAULT_CONTEXT_CHARS) -> str:
+    """
+    Build the document context for a field extraction prompt.
+
+    Text that already fits in max_chars is returned unchanged. Otherwise the
+    best chunk for every field is taken first, so fields that only appear late
+    in the document are not cut off, and the remaining budget goes to the
+    highest scoring chunks overall. Chunks are returned in document order,
+    each prefixed with its page number when the text has page breaks.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    chunks = chunk_document(text)
+    if not chunks:
+        return text[:max_chars]
+
+    ranked = rank_chunks(chunks, field_queries)
+
+    selected = set()
+    used = 0
+    for i in ranked:
+        size = len(chunks[i]['text']) + 12
+        if used + size > max_chars:
+            continue
+        selected.add(i)
+        used += size
+
+    logger.debug(f"Selected {len(selected)} of {len(chunks)} chunks ({used} of {len(text)} chars)")
+    return "\n\n".join(
+        f"[Page {chunks[i]['page']}]\n{chunks[i]['text']}" if chunks[i]['page'] else chunks[i]['text']
+        for i in sorted(selected)
+    )
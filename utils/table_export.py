@@ -0,0 +1,65 @@
+import logging
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from typing import Dict, List, Any, Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Excel sheet name length limitation
+MAX_SHEET_NAME_CHARS = 31
+
+def table_sheet_name(index: int, table: Dict[str, Any]) -> str:
+    """Sheet name of the index-th (0-based) table: Table_<n>_Page_<page>, or Table_<n> when too long."""
+    sheet_name = f"Table_{index + 1}_Page_{table['page']}"
+    if len(sheet_name) > MAX_SHEET_NAME_CHARS:
+        sheet_name = f"Table_{index + 1}"
+    return sheet_name
+
+def table_header_and_rows(data: List[List[Any]]) -> Tuple[List[Any], List[List[Any]]]:
+    """
+    Split raw table data into a header and body rows. The first row is the
+    header when there is more than one row; otherwise the columns are
+    numbered from 0.
+    """
+    if not data:
+        return [], []
+    if len(data) > 1:
+        return data[0], data[1:]
+    return list(range(len(data[0]))), data
+
+def _cell_value(value: Any) -> Any:
+    """Empty cells for None and '', and strings stripped of characters Excel rejects."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+def _sheet_rows(data: List[List[Any]]) -> Iterator[List[Any]]:
+    header, rows = table_header_and_rows(data)
+    if header:
+        yield [_cell_value(value) for value in header]
+    for row in rows:
+        yield [_cell_value(value) for value in row]
+
+def save_tables_xlsx(tables: Iterable[Dict[str, Any]], output_path: str) -> int:
+    """
+    Write each table to its own sheet, streaming rows straight from
+    table['data'] through an openpyxl write-only workbook. Rows are
+    serialized to a temporary file as they are appended and each sheet is
+    closed before the next starts, so memory use stays flat as tables
+    grow or multiply. Returns the number of sheets written.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    count = 0
+    for index, table in enumerate(tables):
+        sheet = workbook.create_sheet(title=table_sheet_name(index, table))
+        for row in _sheet_rows(table.get('data') or []):
+            sheet.append(row)
+        # Finish the sheet now so its writer is released before the next table
+        sheet.close()
+        count += 1
+
+    if count:
+        workbook.save(output_path)
+    return count
@@ -0,0 +1,74 @@
+import pickle
+import logging
+import threading
+import collections
+import openpyxl
+from typing import Dict, Optional
+
+from .extraction_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TEMPLATES = 8
+
+class TemplateCache:
+    """
+    In-memory cache of parsed Excel templates, keyed by the SHA-256 of the
+    file contents, so re-uploading the same template under any name parses
+    it only once.
+
+    Entries are the parsed workbook pickled to bytes: they can never be
+    modified by a job, and each load() unpickles a private copy, which is
+    several times cheaper than openpyxl parsing the file again. The least
+    recently used template is dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_TEMPLATES):
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, template_path: str) -> openpyxl.Workbook:
+        """Return a new workbook with the contents of the template file."""
+        digest = file_digest(template_path)
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+        if entry is not None:
+            return pickle.loads(entry)
+
+        workbook = openpyxl.load_workbook(template_path)
+        try:
+            entry = pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # Still usable, just not cached
+            logger.error(f"Error caching template {template_path}: {str(e)}")
+            return workbook
+
+        with self._lock:
+            self.misses += 1
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return workbook
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "templates": len(self._entries),
+                "bytes": sum(len(entry) for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+def load_template(template_path: str, cache: Optional[TemplateCache] = None) -> openpyxl.Workbook:
+    """Open a template through the cache when one is given."""
+    if cache is not None:
+        return cache.load(template_path)
+    return openpyxl.load_workbook(template_path)